@@ -1,97 +1,136 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, jsonify, current_app
-import sqlite3, os, json, io, datetime, csv, secrets, smtplib
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, send_file, jsonify, abort
+import sqlite3, os, sys, io, datetime, secrets
 from functools import wraps
 from flask_cors import CORS
 from dotenv import load_dotenv
-from openpyxl import Workbook
-from email.message import EmailMessage
 
 load_dotenv()
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB = os.path.join(BASE_DIR, 'alumni.db')
+DB = os.environ.get('ALUMNI_DB', os.path.join(BASE_DIR, 'alumni.db'))
+
+# shared helpers live in ../alumni_core
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+from alumni_core import admission, batch, changes, conditional, db, exports, factory, fragments, hashing, imports, ingest, insights, maintenance, matching, migrations, outbox, pagination, principals, search, snapshots
+from alumni_core.db import get_db
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY','change_this_secret_for_production')
 CORS(app)
+app.config['INSIGHTS_MAX_AGE'] = int(os.environ.get('INSIGHTS_MAX_AGE', 60))
+app.config['MENTOR_CAPACITY'] = int(os.environ.get('MENTOR_CAPACITY', 2))
+app.config['BATCH_MAX_ITEMS'] = int(os.environ.get('BATCH_MAX_ITEMS', batch.MAX_ITEMS))
+
+def load_principal(conn, username):
+    return conn.execute("SELECT id,username,role FROM users WHERE username=?", (username,)).fetchone()
+# pool, metrics, user cache, conditional GET, fragment cache, hashing, maintenance and admission (alumni_core.factory)
+factory.init_app(app, DB, load_principal, 'user')
 
 EMAIL_HOST = os.environ.get('EMAIL_HOST','localhost')
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT','25'))
 EMAIL_FROM = os.environ.get('EMAIL_FROM','no-reply@alumniconnect.local')
-
-def get_db():
-    conn = sqlite3.connect(DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+# mail is queued in email_outbox and delivered by a background sender (alumni_core.outbox)
+outbox.init_app(app, db.get_pool(app), EMAIL_HOST, EMAIL_PORT, EMAIL_FROM)
+# change feed for incremental sync and its per-worker stream hub (alumni_core.changes)
+changes.init_app(app, db.get_pool(app))
+# exports read consistent snapshots on connections of their own (alumni_core.snapshots)
+snapshots.init_app(app, db.get_pool(app))
 
 def init_db():
-    conn = get_db()
+    conn = db.connect(DB)
+    # schema lives in alumni_core.migrations, shared with the community app
+    migrations.migrate(conn)
     cur = conn.cursor()
-    # users table (admin/roles)
-    cur.execute('''CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY,
-        username TEXT UNIQUE,
-        password_hash TEXT,
-        role TEXT DEFAULT 'admin'
-    )''')
-    # alumni
-    cur.execute('''CREATE TABLE IF NOT EXISTS alumni (
-        id INTEGER PRIMARY KEY,
-        name TEXT,
-        batch TEXT,
-        email TEXT,
-        phone TEXT,
-        company TEXT,
-        bio TEXT,
-        created_at TEXT
-    )''')
-    # events
-    cur.execute('''CREATE TABLE IF NOT EXISTS events (
-        id INTEGER PRIMARY KEY,
-        title TEXT,
-        date TEXT,
-        venue TEXT,
-        description TEXT,
-        created_at TEXT
-    )''')
-    # mentorship requests
-    cur.execute('''CREATE TABLE IF NOT EXISTS mentorships (
-        id INTEGER PRIMARY KEY,
-        title TEXT,
-        student_name TEXT,
-        field TEXT,
-        note TEXT,
-        created_at TEXT
-    )''')
-    # password reset tokens
-    cur.execute('''CREATE TABLE IF NOT EXISTS pw_reset_tokens (
-        id INTEGER PRIMARY KEY,
-        user_id INTEGER,
-        token TEXT,
-        expires_at TEXT
-    )''')
-    conn.commit()
     # create default admin if not exists
     cur.execute("SELECT * FROM users WHERE username = ?", ('admin',))
     if not cur.fetchone():
         # default password: adminpass (please change)
-        pw = generate_password_hash('adminpass')
+        pw = hashing.generate('adminpass')
         cur.execute("INSERT INTO users (username,password_hash,role) VALUES (?,?,?)", ('admin', pw, 'admin'))
         conn.commit()
     conn.close()
 
+def list_page(listing, projected=False):
+    # the JSON API honours ?fields=a,b (only those columns are read and returned)
+    fields = pagination.parse_fields(listing, request.args.get('fields')) if projected else None
+    return pagination.page_from_args(get_db(), listing, request.args, app.config['PAGE_SIZE'], app.config['MAX_PAGE_SIZE'], fields)
+
+def single_insert(table, item):
+    # one object gets the same checks and defaults as an item of an array (alumni_core.batch)
+    row, reason = batch.check(table, item or {})
+    if reason:
+        return jsonify({'error': reason}), 400
+    cols = batch.TABLES[table]['columns'] + ('created_at',)
+    conn=get_db(); cur=conn.execute(f"INSERT INTO {table} ({','.join(cols)}) VALUES ({','.join('?' * len(cols))})",
+                                    row + (datetime.datetime.utcnow().isoformat(),))
+    conn.commit(); return jsonify({'status':'ok', 'id': cur.lastrowid}), 201
+
+def batch_insert(table, items):
+    # a JSON array is inserted in one transaction, see alumni_core.batch
+    result = batch.insert_many(get_db(), table, items, max_items=app.config['BATCH_MAX_ITEMS'])
+    # alumni already stored are updated instead (alumni_core.ingest): 200 when nothing new was created
+    return jsonify(result), 201 if result['created'] or not items else 400 if len(result['errors']) == len(items) else 200
+
+@app.errorhandler(pagination.InvalidCursor)
+def invalid_cursor(e):
+    if request.path.startswith('/api/'):
+        return jsonify({'error': str(e)}), 400
+    flash('That page link is no longer valid','danger'); return redirect(request.path)
+
+@app.errorhandler(pagination.InvalidFields)
+def invalid_fields(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.errorhandler(batch.TooManyItems)
+def too_many_items(e):
+    return jsonify({'error': str(e)}), 413
+
+@app.errorhandler(changes.UnknownTable)
+def unknown_change_table(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.errorhandler(changes.TableForbidden)
+def change_table_forbidden(e):
+    return jsonify({'error': str(e)}), 403
+
+@app.errorhandler(changes.CursorExpired)
+def change_cursor_expired(e):
+    # the client reloads its lists and starts again from a fresh cursor
+    return jsonify({'error': str(e)}), 410
+
+@app.errorhandler(changes.TooManyStreams)
+def too_many_streams(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+
+@app.errorhandler(admission.Refused)
+def write_refused(e):
+    # 429 past the client's rate, 503 when too many writes are in progress (see alumni_core.admission)
+    return jsonify({'error': str(e)}), e.status, e.headers()
+
+@app.errorhandler(snapshots.SnapshotsBusy)
+def snapshots_busy(e):
+    flash('Too many exports are running, please try again in a moment','danger')
+    return redirect(url_for('index'))
+
+@app.errorhandler(hashing.HashingBusy)
+def hashing_busy(e):
+    # the password hashing pool is saturated (see alumni_core.hashing)
+    flash('Too many sign-ins right now, please try again in a moment','danger')
+    return redirect(request.url)
+
 def login_required(role=None):
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
             if not session.get('user'):
+                if request.path.startswith('/api/'):
+                    return jsonify({'error': 'login required'}), 401
                 return redirect(url_for('login', next=request.path))
             if role:
-                # check role
-                conn=get_db(); cur=conn.cursor()
-                cur.execute("SELECT role FROM users WHERE username=?", (session.get('user'),))
-                row=cur.fetchone(); conn.close()
+                # check role (cached per worker, see alumni_core.principals)
+                row=principals.current_principal()
                 if not row or row['role']!=role:
+                    if request.path.startswith('/api/'):
+                        return jsonify({'error': 'forbidden: insufficient permissions'}), 403
                     flash('Forbidden: insufficient permissions','danger'); return redirect(url_for('index'))
             return f(*args, **kwargs)
         return decorated
@@ -105,8 +144,13 @@ def login():
         conn = get_db(); cur = conn.cursor()
         cur.execute("SELECT * FROM users WHERE username = ?", (username,))
         user = cur.fetchone()
-        conn.close()
-        if user and check_password_hash(user['password_hash'], password):
+        ok, new_hash = hashing.get_service().verify(user['password_hash'], password) if user else (False, None)
+        if ok:
+            if new_hash:
+                # stored with outdated parameters: upgrade now that we know the password
+                cur.execute("UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?", (new_hash, user['id'], user['password_hash']))
+                conn.commit()
+            principals.invalidate(username)
             session['user'] = username
             flash('Logged in successfully','success')
             nxt = request.args.get('next') or url_for('index')
@@ -130,8 +174,8 @@ def register_user():
             flash('Provide username and password','danger'); return redirect(url_for('register_user'))
         conn=get_db(); cur=conn.cursor()
         try:
-            cur.execute("INSERT INTO users (username,password_hash,role) VALUES (?,?,?)", (username, generate_password_hash(password), role))
-            conn.commit(); flash('User created','success'); return redirect(url_for('index'))
+            cur.execute("INSERT INTO users (username,password_hash,role) VALUES (?,?,?)", (username, hashing.get_service().hash(password), role))
+            conn.commit(); principals.invalidate(username); flash('User created','success'); return redirect(url_for('index'))
         except sqlite3.IntegrityError:
             flash('Username exists','danger'); return redirect(url_for('register_user'))
     return render_template('register.html')
@@ -153,19 +197,16 @@ def forgot_password():
                 cur.execute("SELECT * FROM users WHERE username = ?", (email,))
                 user = cur.fetchone()
         if not user:
-            flash('No user found with that email','danger'); conn.close(); return redirect(url_for('login'))
+            flash('No user found with that email','danger'); return redirect(url_for('login'))
         # create token
         token = secrets.token_urlsafe(24)
         expires = (datetime.datetime.utcnow()+datetime.timedelta(hours=2)).isoformat()
         cur.execute("INSERT INTO pw_reset_tokens (user_id,token,expires_at) VALUES (?,?,?)", (user['id'], token, expires))
-        conn.commit(); conn.close()
-        # send email (simple SMTP)
+        # queued in the same transaction as the token; delivered by the outbox sender
         reset_link = url_for('reset_password', token=token, _external=True)
-        try:
-            send_email(email, 'Password reset', f'Click the link to reset your password: {reset_link}')
-            flash('Password reset email sent (check MailHog if using dev)','info')
-        except Exception as e:
-            flash(f'Failed to send email: {e}','danger')
+        send_email(email, 'Password reset', f'Click the link to reset your password: {reset_link}')
+        conn.commit(); outbox.get_outbox().wake()
+        flash('Password reset email sent (check MailHog if using dev)','info')
         return redirect(url_for('login'))
     return render_template('forgot_password.html')
 
@@ -175,24 +216,19 @@ def reset_password(token):
     cur.execute("SELECT * FROM pw_reset_tokens WHERE token = ?", (token,))
     row = cur.fetchone()
     if not row:
-        flash('Invalid or expired token','danger'); conn.close(); return redirect(url_for('login'))
+        flash('Invalid or expired token','danger'); return redirect(url_for('login'))
     if datetime.datetime.fromisoformat(row['expires_at']) < datetime.datetime.utcnow():
-        flash('Token expired','danger'); conn.close(); return redirect(url_for('login'))
+        flash('Token expired','danger'); return redirect(url_for('login'))
     if request.method=='POST':
         new_pw = request.form.get('password')
-        cur.execute("UPDATE users SET password_hash = ? WHERE id = ?", (generate_password_hash(new_pw), row['user_id']))
+        cur.execute("UPDATE users SET password_hash = ? WHERE id = ?", (hashing.get_service().hash(new_pw), row['user_id']))
         cur.execute("DELETE FROM pw_reset_tokens WHERE id = ?", (row['id'],))
-        conn.commit(); conn.close(); flash('Password updated','success'); return redirect(url_for('login'))
-    conn.close(); return render_template('reset_password.html', token=token)
+        conn.commit(); principals.invalidate(user_id=row['user_id']); flash('Password updated','success'); return redirect(url_for('login'))
+    return render_template('reset_password.html', token=token)
 
 def send_email(to, subject, body):
-    msg = EmailMessage()
-    msg['From'] = EMAIL_FROM
-    msg['To'] = to
-    msg['Subject'] = subject
-    msg.set_content(body)
-    with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as s:
-        s.send_message(msg)
+    # enqueue only; the caller commits and wakes the sender
+    return outbox.enqueue(get_db(), to, subject, body)
 
 @app.route('/')
 @login_required()
@@ -202,68 +238,103 @@ def index():
 # ----- Alumni CRUD & CSV upload -----
 @app.route('/alumni')
 @login_required()
+@conditional.conditional('alumni', per_user=True)
 def alumni_list():
-    conn = get_db(); cur = conn.cursor()
-    cur.execute("SELECT * FROM alumni ORDER BY created_at DESC")
-    rows = cur.fetchall(); conn.close()
-    return render_template('alumni_list.html', alumni=rows)
+    q = request.args.get('q','').strip()
+    if q:
+        page = search.search_from_args(get_db(), request.args, app.config['PAGE_SIZE'], app.config['MAX_PAGE_SIZE'])
+    else:
+        page = list_page(pagination.ALUMNI)
+    return render_template('alumni_list.html', alumni=page.items, page=page, q=q)
 
 @app.route('/alumni/add', methods=['GET','POST'])
 @login_required()
 def alumni_add():
     if request.method=='POST':
         data = {k:request.form.get(k,'') for k in ('name','batch','email','phone','company','bio')}
-        data['created_at'] = datetime.datetime.utcnow().isoformat()
-        conn = get_db(); cur=conn.cursor()
-        cur.execute("INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)",
-                    (data['name'],data['batch'],data['email'],data['phone'],data['company'],data['bio'],data['created_at']))
-        conn.commit(); conn.close()
-        flash('Alumni added','success')
+        conn = get_db()
+        # somebody already listed (same email, or same name, batch and phone) is updated instead
+        outcome = ingest.outcome(ingest.upsert(conn, [data]))
+        conn.commit()
+        flash({'inserted': 'Alumni added', 'updated': 'Alumni already listed; details updated',
+               'unchanged': 'Alumni already listed'}[outcome], 'success' if outcome != 'unchanged' else 'info')
         return redirect(url_for('alumni_list'))
     return render_template('alumni_form.html', alumni=None)
 
+@app.route('/alumni/edit/<int:a_id>', methods=['GET','POST'])
+@login_required()
+def alumni_edit(a_id):
+    conn=get_db(); cur=conn.cursor()
+    cur.execute("SELECT * FROM alumni WHERE id=?", (a_id,)); a=cur.fetchone()
+    if not a:
+        flash('Alumni not found','danger'); return redirect(url_for('alumni_list'))
+    if request.method=='POST':
+        data = {k:request.form.get(k,'') for k in ('name','batch','email','phone','company','bio')}
+        try:
+            ingest.update(conn, a_id, data)
+        except ingest.DuplicateAlumni as e:
+            flash(f'Not saved: {e}','danger'); return render_template('alumni_form.html', alumni=dict(a, **data))
+        conn.commit(); flash('Alumni updated','success'); return redirect(url_for('alumni_list'))
+    return render_template('alumni_form.html', alumni=a)
+
+@app.route('/alumni/delete/<int:a_id>', methods=['POST'])
+@login_required()
+def alumni_delete(a_id):
+    conn=get_db(); conn.execute("DELETE FROM alumni WHERE id=?", (a_id,)); conn.commit()
+    flash('Alumni removed','info'); return redirect(url_for('alumni_list'))
+
 @app.route('/alumni/upload-csv', methods=['POST'])
 @login_required()
 def alumni_upload_csv():
+    # parsed and inserted in the background; progress at /api/imports/<job id>
     f = request.files.get('file')
     if not f:
         flash('No file uploaded','danger'); return redirect(url_for('alumni_list'))
-    stream = io.StringIO(f.stream.read().decode('utf-8'))
-    reader = csv.reader(stream)
-    conn=get_db(); cur=conn.cursor()
-    count=0
-    for row in reader:
-        if not row or not row[0].strip(): continue
-        name=row[0].strip(); batch=row[1].strip() if len(row)>1 else ''; email=row[2].strip() if len(row)>2 else ''; phone=row[3].strip() if len(row)>3 else ''; company=row[4].strip() if len(row)>4 else ''; bio=row[5].strip() if len(row)>5 else ''
-        cur.execute("INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)", (name,batch,email,phone,company,bio,datetime.datetime.utcnow().isoformat()))
-        count+=1
-    conn.commit(); conn.close(); flash(f'Imported {count} rows','success'); return redirect(url_for('alumni_list'))
+    job_id = imports.start_csv_import(db.get_pool(), f.stream, f.filename, session.get('user'))
+    status_url = url_for('api_import_status', job_id=job_id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'job_id': job_id, 'status_url': status_url}), 202, {'Location': status_url}
+    flash(f'Import started (job {job_id}); progress: {status_url}','success'); return redirect(url_for('alumni_list'))
+
+@app.route('/api/imports/<job_id>')
+@login_required()
+def api_import_status(job_id):
+    job = imports.job_status(get_db(), job_id)
+    if job is None:
+        return jsonify({'error': 'unknown import job'}), 404
+    return jsonify(job)
 
 # ----- Events -----
 @app.route('/events')
 @login_required()
+@conditional.conditional('events', per_user=True)
 def events_list():
-    conn=get_db(); cur=conn.cursor()
-    cur.execute("SELECT * FROM events ORDER BY date DESC")
-    rows=cur.fetchall(); conn.close()
-    return render_template('events_list.html', events=rows)
+    page = list_page(pagination.EVENTS)
+    return render_template('events_list.html', events=page.items, page=page)
 
 @app.route('/events/add', methods=['GET','POST'])
 @login_required()
 def event_add():
     if request.method=='POST':
-        t=request.form.get('title'); date=request.form.get('date'); venue=request.form.get('venue'); desc=request.form.get('description')
+        t=request.form.get('title'); date=request.form.get('date', ''); venue=request.form.get('venue'); desc=request.form.get('description')
         conn=get_db(); cur=conn.cursor()
         cur.execute("INSERT INTO events (title,date,venue,description,created_at) VALUES (?,?,?,?,?)",(t,date,venue,desc,datetime.datetime.utcnow().isoformat()))
-        conn.commit(); conn.close(); flash('Event created','success'); return redirect(url_for('events_list'))
+        conn.commit(); flash('Event created','success'); return redirect(url_for('events_list'))
     return render_template('event_form.html', event=None)
 
+@app.route('/events/delete/<int:eid>', methods=['POST'])
+@login_required()
+def event_delete(eid):
+    conn=get_db(); conn.execute("DELETE FROM events WHERE id=?", (eid,)); conn.commit()
+    flash('Event removed','info'); return redirect(url_for('events_list'))
+
 # ----- Mentorship -----
 @app.route('/mentorship')
 @login_required()
+@conditional.conditional('mentorships', per_user=True)
 def mentorship_list():
-    conn=get_db(); cur=conn.cursor(); cur.execute("SELECT * FROM mentorships ORDER BY created_at DESC"); rows=cur.fetchall(); conn.close()
-    return render_template('mentorship_list.html', requests=rows)
+    page = list_page(pagination.MENTORSHIPS)
+    return render_template('mentorship_list.html', requests=page.items, page=page)
 
 @app.route('/mentorship/add', methods=['GET','POST'])
 @login_required()
@@ -271,106 +342,205 @@ def mentorship_add():
     if request.method=='POST':
         title=request.form.get('title'); student=request.form.get('student_name'); field=request.form.get('field'); note=request.form.get('note')
         conn=get_db(); cur=conn.cursor(); cur.execute("INSERT INTO mentorships (title,student_name,field,note,created_at) VALUES (?,?,?,?,?)",(title,student,field,note,datetime.datetime.utcnow().isoformat()))
-        conn.commit(); conn.close(); flash('Request added','success'); return redirect(url_for('mentorship_list'))
+        conn.commit(); flash('Request added','success'); return redirect(url_for('mentorship_list'))
     return render_template('mentorship_form.html', req=None)
 
+@app.route('/mentorship/delete/<int:mid>', methods=['POST'])
+@login_required()
+def mentorship_delete(mid):
+    conn=get_db(); conn.execute("DELETE FROM mentorships WHERE id=?", (mid,)); conn.commit()
+    flash('Request removed','info'); return redirect(url_for('mentorship_list'))
+
 # ----- Insights & export/import -----
-@app.route('/insights')
+@app.route('/insights', endpoint='insights')
 @login_required()
-def insights():
-    conn=get_db(); cur=conn.cursor()
-    cur.execute("SELECT batch, COUNT(*) as cnt FROM alumni GROUP BY batch ORDER BY cnt DESC")
-    by_batch = cur.fetchall()
-    cur.execute("SELECT COUNT(*) as total FROM alumni"); total = cur.fetchone()['total']
-    conn.close()
-    return render_template('insights.html', by_batch=by_batch, total=total)
+def insights_page():
+    # counters are kept current by triggers (alumni_core.insights), no table scans here
+    with snapshots.read_transaction(get_db()) as conn:  # totals and breakdowns from one moment
+        return render_template('insights.html', insights=insights.summary(conn))
+
+@app.route('/api/insights')
+@login_required()
+@conditional.conditional('alumni', 'events', 'mentorships', per_user=True, max_age=app.config['INSIGHTS_MAX_AGE'])
+def api_insights():
+    with snapshots.read_transaction(get_db()) as conn:
+        return jsonify(insights.summary(conn, top=max(1, min(request.args.get('top', insights.TOP, type=int), 100))))
+
+def export_response(producer, args, filename, mimetype, gzipped):
+    if gzipped:
+        filename += '.gz'; mimetype = 'application/gzip'
+    # one read transaction for the whole download, released when the response is closed
+    snap = snapshots.get_reader().open()
+    resp = Response(exports.stream(snap.conn, producer, *args, gzip=gzipped), mimetype=mimetype)
+    resp.call_on_close(snap.close)
+    resp.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    resp.headers['X-Accel-Buffering'] = 'no'  # let nginx pass chunks through as they are produced
+    return resp
 
 @app.route('/export/json')
 @login_required()
 def export_json():
-    conn=get_db(); cur=conn.cursor()
-    cur.execute("SELECT * FROM alumni"); alumni= [dict(ix) for ix in cur.fetchall()]
-    cur.execute("SELECT * FROM events"); events=[dict(ix) for ix in cur.fetchall()]
-    cur.execute("SELECT * FROM mentorships"); mentorships=[dict(ix) for ix in cur.fetchall()]
-    conn.close()
-    data={'alumni':alumni,'events':events,'mentorships':mentorships}
-    buf = io.BytesIO(); buf.write(json.dumps(data, indent=2).encode('utf-8')); buf.seek(0)
-    return send_file(buf, as_attachment=True, download_name='alumni_connect_export.json', mimetype='application/json')
+    # ?format=json (default, one document) or ndjson (one row per line); ?gzip=1 to compress
+    fmt = request.args.get('format', 'json'); gz = request.args.get('gzip') == '1'
+    if fmt not in ('json', 'ndjson'):
+        abort(400)
+    producer = exports.json_document if fmt == 'json' else exports.ndjson_lines
+    mimetype = 'application/json' if fmt == 'json' else 'application/x-ndjson'
+    return export_response(producer, (), f'alumni_connect_export.{fmt}', mimetype, gz)
+
+@app.route('/export/csv')
+@login_required()
+def export_csv():
+    table = request.args.get('table', 'alumni'); gz = request.args.get('gzip') == '1'
+    if table not in exports.TABLES:
+        abort(400)
+    return export_response(exports.csv_lines, (table,), f'{table}.csv', 'text/csv', gz)
 
 @app.route('/export/excel')
 @login_required()
 def export_excel():
-    conn=get_db(); cur=conn.cursor()
-    cur.execute("SELECT * FROM alumni"); alumni = cur.fetchall()
-    wb = Workbook(); ws = wb.active; ws.title = "Alumni"
-    ws.append(['ID','Name','Batch','Email','Phone','Company','Bio','Created At'])
-    for a in alumni:
-        ws.append([a['id'], a['name'], a['batch'], a['email'], a['phone'], a['company'], a['bio'], a['created_at']])
-    buf = io.BytesIO(); wb.save(buf); buf.seek(0)
-    return send_file(buf, as_attachment=True, download_name='alumni.xlsx', mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    with snapshots.get_reader().open() as snap:
+        out = exports.alumni_workbook(snap.conn)
+    return send_file(out, as_attachment=True, download_name='alumni.xlsx', mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
 @app.route('/import/json', methods=['GET','POST'])
 @login_required()
 def import_json():
+    # mode=replace (default) swaps the tables in the document; mode=merge upserts by natural key
     if request.method=='POST':
         f = request.files.get('file')
+        wants_json = request.accept_mimetypes.best == 'application/json'
         if not f:
+            if wants_json: return jsonify({'error': 'no file uploaded'}), 400
             flash('No file uploaded','danger'); return redirect(url_for('index'))
-        data = json.load(f.stream)
-        conn=get_db(); cur=conn.cursor()
-        # simple import: clear and insert
-        if 'alumni' in data:
-            cur.execute("DELETE FROM alumni")
-            for a in data['alumni']:
-                cur.execute("INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)",
-                            (a.get('name'),a.get('batch'),a.get('email'),a.get('phone'),a.get('company'),a.get('bio'), a.get('created_at') or datetime.datetime.utcnow().isoformat()))
-        if 'events' in data:
-            cur.execute("DELETE FROM events")
-            for e in data['events']:
-                cur.execute("INSERT INTO events (title,date,venue,description,created_at) VALUES (?,?,?,?,?)",
-                            (e.get('title'),e.get('date'),e.get('venue'),e.get('description'), e.get('created_at') or datetime.datetime.utcnow().isoformat()))
-        if 'mentorships' in data:
-            cur.execute("DELETE FROM mentorships")
-            for m in data['mentorships']:
-                cur.execute("INSERT INTO mentorships (title,student_name,field,note,created_at) VALUES (?,?,?,?,?)",
-                            (m.get('title'),m.get('student_name'),m.get('field'),m.get('note'), m.get('created_at') or datetime.datetime.utcnow().isoformat()))
-        conn.commit(); conn.close(); flash('Import complete','success'); return redirect(url_for('index'))
+        mode = request.form.get('mode') or request.args.get('mode', 'replace')
+        try:
+            result = imports.import_json(get_db(), io.TextIOWrapper(f.stream, encoding='utf-8-sig'), mode)
+        except (ValueError, sqlite3.IntegrityError) as e:
+            if wants_json: return jsonify({'error': f'import failed: {e}'}), 400
+            flash(f'Import failed, nothing was changed: {e}','danger'); return redirect(url_for('index'))
+        if wants_json: return jsonify(result)
+        summary = '; '.join(f"{t}: {c['inserted']} inserted, {c['updated']} updated" for t, c in result['tables'].items())
+        flash(f"Import complete ({summary or 'no tables'})",'success'); return redirect(url_for('index'))
     return redirect(url_for('index'))
 
 # ----- Simple JSON API endpoints -----
 @app.route('/api/alumni', methods=['GET','POST'])
+@admission.limited()
+@conditional.conditional('alumni')
 def api_alumni():
     if request.method=='GET':
-        conn=get_db(); cur=conn.cursor(); cur.execute("SELECT * FROM alumni"); rows=[dict(r) for r in cur.fetchall()]; conn.close(); return jsonify(rows)
+        page = list_page(pagination.ALUMNI, projected=True); return jsonify(page.to_dict(page.records()))
     else:
-        data = request.get_json() or {}
-        conn=get_db(); cur=conn.cursor()
-        cur.execute("INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)",
-                    (data.get('name'),data.get('batch'),data.get('email'),data.get('phone'),data.get('company'),data.get('bio'), datetime.datetime.utcnow().isoformat()))
-        conn.commit(); conn.close(); return jsonify({'status':'ok'}), 201
+        data = request.get_json()
+        if isinstance(data, list):
+            return batch_insert('alumni', data)
+        row, reason = batch.check('alumni', data or {})
+        if reason:
+            return jsonify({'error': reason}), 400
+        conn=get_db(); result = ingest.upsert(conn, [dict(zip(batch.TABLES['alumni']['columns'], row))]); conn.commit()
+        outcome = ingest.outcome(result)
+        return jsonify({'status':'ok', 'id': result['ids'][0], 'outcome': outcome}), 201 if outcome == 'inserted' else 200
+
+@app.route('/api/alumni/search')
+@conditional.conditional('alumni', per_user=True)
+def api_alumni_search():
+    # ?q=<words>&limit=&offset= ; every word is a prefix, results ranked by bm25
+    # emails and phone numbers for signed-in users only, as on the change feed
+    page = search.search_from_args(get_db(), request.args, max_limit=app.config['MAX_PAGE_SIZE'],
+                                   contact=principals.current_principal() is not None)
+    return jsonify(page.to_dict())
 
 @app.route('/api/events', methods=['GET','POST'])
+@admission.limited()
+@conditional.conditional('events')
 def api_events():
     if request.method=='GET':
-        conn=get_db(); cur=conn.cursor(); cur.execute("SELECT * FROM events"); rows=[dict(r) for r in cur.fetchall()]; conn.close(); return jsonify(rows)
+        page = list_page(pagination.EVENTS, projected=True); return jsonify(page.to_dict(page.records()))
     else:
-        data = request.get_json() or {}
-        conn=get_db(); cur=conn.cursor()
-        cur.execute("INSERT INTO events (title,date,venue,description,created_at) VALUES (?,?,?,?,?)",
-                    (data.get('title'),data.get('date'),data.get('venue'),data.get('description'), datetime.datetime.utcnow().isoformat()))
-        conn.commit(); conn.close(); return jsonify({'status':'ok'}), 201
+        data = request.get_json()
+        if isinstance(data, list):
+            return batch_insert('events', data)
+        return single_insert('events', data)
 
 @app.route('/api/mentorships', methods=['GET','POST'])
+@admission.limited()
+@conditional.conditional('mentorships')
 def api_mentorships():
     if request.method=='GET':
-        conn=get_db(); cur=conn.cursor(); cur.execute("SELECT * FROM mentorships"); rows=[dict(r) for r in cur.fetchall()]; conn.close(); return jsonify(rows)
+        page = list_page(pagination.MENTORSHIPS, projected=True); return jsonify(page.to_dict(page.records()))
     else:
-        data = request.get_json() or {}
-        conn=get_db(); cur=conn.cursor()
-        cur.execute("INSERT INTO mentorships (title,student_name,field,note,created_at) VALUES (?,?,?,?,?)",
-                    (data.get('title'),data.get('student_name'),data.get('field'),data.get('note'), datetime.datetime.utcnow().isoformat()))
-        conn.commit(); conn.close(); return jsonify({'status':'ok'}), 201
+        data = request.get_json()
+        if isinstance(data, list):
+            return batch_insert('mentorships', data)
+        return single_insert('mentorships', data)
+
+@app.route('/api/mentorships/<int:mid>/matches')
+@login_required(role='admin')
+@conditional.conditional('mentorships', 'alumni', 'mentor_applications')
+def api_mentorship_matches(mid):
+    # ?k=<mentors> ; ranked from the mentor_index FTS table (alumni_core.matching)
+    k = max(1, min(request.args.get('k', 10, type=int), 100))
+    result = matching.matches(get_db(), mid, k)
+    if result is None:
+        return jsonify({'error': 'unknown mentorship'}), 404
+    return jsonify(result)
+
+@app.route('/api/mentorships/proposals')
+@login_required(role='admin')
+@conditional.conditional('mentorships', 'alumni', 'mentor_applications')
+def api_mentorship_proposals():
+    # a mentor for every open request; ?k=<choices per request>&capacity=<students per mentor>
+    k = max(1, min(request.args.get('k', 3, type=int), 20))
+    capacity = max(1, request.args.get('capacity', app.config['MENTOR_CAPACITY'], type=int))
+    return jsonify(matching.propose(get_db(), k, capacity))
+
+# ----- Change feed -----
+def change_tables():
+    # whole rows go out, so signed-in users only; mentor applications for admins only
+    return changes.parse_tables(request.args.get('tables'), changes.allowed_tables(principals.current_principal()))
+
+@app.route('/api/changes')
+@login_required()
+def api_changes():
+    # ?since=<cursor>&limit=&tables=alumni,events ; without since only the current cursor is returned
+    tables = change_tables(); conn = get_db()
+    if 'since' not in request.args:
+        return jsonify({'cursor': changes.head(conn), 'has_more': False, 'changes': []})
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'since must be a cursor from an earlier response'}), 400
+    limit = max(1, min(request.args.get('limit', app.config['MAX_PAGE_SIZE'], type=int), app.config['MAX_PAGE_SIZE']))
+    return jsonify(changes.read(conn, since, limit, tables))
+
+@app.route('/api/changes/stream')
+@login_required()
+def api_changes_stream():
+    # Server-Sent Events; EventSource resumes from Last-Event-ID after a reconnect
+    tables = change_tables()
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    if since is None:
+        since = changes.head(get_db())
+    hub = changes.get_hub(); hub.open()
+    resp = Response(hub.stream(since, tables), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    resp.call_on_close(hub.close)
+    return resp
+
+# ----- Operations -----
+@app.route('/admin/stats')
+@login_required(role='admin')
+def admin_stats():
+    return jsonify({'db_pool': db.get_pool().stats(), 'principals': principals.get_cache().stats(),
+                    'responses': conditional.get_cache().stats(),
+                    'fragments': fragments.get_cache().stats(), 'outbox': outbox.get_outbox().stats(get_db()),
+                    'hashing': hashing.get_service().stats(), 'changes': changes.get_hub().stats(),
+                    'snapshots': snapshots.get_reader().stats(), 'maintenance': maintenance.get_scheduler().stats(get_db()),
+                    'admission': admission.get_admission().stats()})
 
 if __name__=='__main__':
+    # development server; production runs gunicorn -c gunicorn.conf.py (see README)
     init_db()
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
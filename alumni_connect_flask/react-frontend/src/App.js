@@ -1,8 +1,57 @@
-import React, {useEffect, useState} from 'react';
+import React, {useCallback, useEffect, useRef, useState} from 'react';
 import axios from 'axios';
+
+// Apply /api/changes entries for the alumni table to the loaded rows (newest first).
+function applyChanges(rows, changes){
+  let next = rows;
+  for (const c of changes){
+    if (c.table !== 'alumni') continue;
+    const i = next.findIndex(a => a.id === c.id);
+    if (c.op === 'delete'){ if (i >= 0) next = next.filter(a => a.id !== c.id); }
+    else if (i >= 0){ next = next.slice(); next[i] = c.row; }
+    else if (c.op === 'insert'){ next = [c.row].concat(next); }
+  }
+  return next;
+}
+
+const POLL_MS = 30000; // fallback when the event stream is refused or unavailable
+
 function App(){
   const [alumni, setAlumni] = useState([]);
-  useEffect(()=>{axios.get('/api/alumni').then(r=>setAlumni(r.data))},[]);
-  return (<div style={{fontFamily:'Arial',padding:20}}><h2>AlumniConnect (React demo)</h2><ul>{alumni.map(a=>(<li key={a.id}>{a.name} — {a.company}</li>))}</ul></div>);
+  const [cursor, setCursor] = useState(null);
+  const [loading, setLoading] = useState(false);
+  const [live, setLive] = useState(false);
+  const since = useRef(null);
+  const loadPage = useCallback((after)=>{
+    setLoading(true);
+    return axios.get('/api/alumni', {params: after ? {after} : {}})
+      .then(r=>{setAlumni(prev=>after ? prev.concat(r.data.items) : r.data.items); setCursor(r.data.next_cursor);})
+      .finally(()=>setLoading(false));
+  },[]);
+  useEffect(()=>{
+    let source = null, timer = null, stopped = false;
+    const apply = (page)=>{ since.current = page.cursor; if (page.changes.length) setAlumni(prev=>applyChanges(prev, page.changes)); };
+    // take the change cursor before loading, so nothing committed in between is missed
+    const reload = ()=>axios.get('/api/changes').then(r=>{ since.current = r.data.cursor; return loadPage(null); });
+    // the change feed is for signed-in users: anybody else gets the list without updates
+    const signedOut = (e)=>e.response && e.response.status === 401;
+    const poll = ()=>axios.get('/api/changes', {params: {since: since.current, tables: 'alumni'}})
+      .then(r=>{ apply(r.data); if (r.data.has_more) return poll(); })
+      .catch(e=>{ if (e.response && e.response.status === 410) return reload(); })
+      .finally(()=>{ if (!stopped) timer = setTimeout(poll, POLL_MS); });
+    const listen = ()=>{
+      if (!window.EventSource){ timer = setTimeout(poll, POLL_MS); return; }
+      source = new EventSource(`/api/changes/stream?tables=alumni&since=${since.current}`);
+      source.onopen = ()=>setLive(true);
+      source.addEventListener('changes', ev=>apply(JSON.parse(ev.data)));
+      source.addEventListener('reset', ()=>{ source.close(); reload().then(listen); });
+      // EventSource reconnects by itself (with Last-Event-ID) unless the server refused it outright
+      source.onerror = ()=>{ if (source.readyState === EventSource.CLOSED){ setLive(false); timer = setTimeout(poll, POLL_MS); } };
+    };
+    reload().then(()=>{ if (!stopped) listen(); })
+      .catch(e=>{ if (signedOut(e)){ stopped = true; return loadPage(null); } throw e; });
+    return ()=>{ stopped = true; if (source) source.close(); clearTimeout(timer); };
+  },[loadPage]);
+  return (<div style={{fontFamily:'Arial',padding:20}}><h2>AlumniConnect (React demo)</h2><p style={{color:'#888'}}>{live ? 'Live updates on' : 'Updates every 30 s'}</p><ul>{alumni.map(a=>(<li key={a.id}>{a.name} — {a.company}</li>))}</ul>{cursor && <button disabled={loading} onClick={()=>loadPage(cursor)}>{loading ? 'Loading…' : 'Load more'}</button>}</div>);
 }
-export default App;
\ No newline at end of file
+export default App;
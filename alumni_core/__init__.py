@@ -0,0 +1,6 @@
+"""Shared building blocks for the AlumniConnect Flask apps.
+
+Both ``app.py`` (the community site) and ``alumni_connect_flask/app.py``
+(the admin console) import from here so database handling stays the same
+in each of them.
+"""
@@ -0,0 +1,245 @@
+"""Admission control for the write endpoints anybody can call.
+
+``/apply-mentor`` and ``POST /api/alumni``, ``/api/events`` and
+``/api/mentorships`` need no login, and every write they do takes SQLite's
+single write lock. One script posting in a loop used to queue enough
+writers on that lock that a logged-in user's save waited seconds, or ran
+into ``busy_timeout``. Views decorated with ``@limited()`` now pass two
+checks before they run, for writes (POST, PUT, PATCH, DELETE) only:
+
+- a token bucket per client and endpoint. A client gets ``count``
+  requests, refilled evenly over ``seconds`` (``ADMISSION_RATE``, default
+  ``60/60``; ``ADMISSION_RATE_<ENDPOINT>`` or the decorator's ``rate`` for
+  one endpoint; ``0`` turns it off). An empty bucket is answered 429 with
+  ``Retry-After`` set to when the next token arrives. Logged-in users are
+  not rate limited. Clients are told apart by address; behind a proxy
+  listed in ``ADMISSION_TRUSTED_PROXIES`` the nearest untrusted
+  ``X-Forwarded-For`` address is used instead.
+- a cap of ``ADMISSION_MAX_WRITERS`` of these writes running at once. The
+  next ``ADMISSION_MAX_QUEUE`` wait in line, for at most
+  ``ADMISSION_QUEUE_TIMEOUT`` seconds. A full line, or a wait that runs out,
+  is answered 503 with ``Retry-After: ADMISSION_RETRY_AFTER``. So a flood
+  holds at most that many writers on the lock and the rest are turned away
+  at once, instead of piling up on the lock.
+
+Both are per worker process: with ``W`` workers a client gets up to ``W``
+times its rate and up to ``W * ADMISSION_MAX_WRITERS`` of these writes
+run at once. That needs no shared store, and a refusal costs no database
+access. ``stats()`` feeds ``/admin/stats`` and ``/metrics``.
+"""
+import math, os, threading, time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from alumni_core import metrics, principals
+
+EXTENSION_KEY = 'alumni_admission'
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+OUTCOMES = ('admitted', 'rate_limited', 'queue_full', 'queue_timeout')
+
+
+class Refused(RuntimeError):
+    """A write turned away; ``status`` and ``headers()`` make the response."""
+    status = 503
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    def headers(self):
+        return {'Retry-After': str(max(1, math.ceil(self.retry_after)))}
+
+
+class RateLimited(Refused):
+    status = 429
+
+
+class Overloaded(Refused):
+    status = 503
+
+
+def parse_rate(value):
+    """``'30/60'`` -> ``(30, 60.0)`` requests per seconds; ``'0'`` or ``''`` -> None (no limit)."""
+    value = str(value or '').strip()
+    if value in ('', '0'):
+        return None
+    count, _, seconds = value.partition('/')
+    count, seconds = int(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        return None
+    return count, seconds
+
+
+class Admission:
+    """Per-worker token buckets and write slots."""
+
+    def __init__(self, rate=(60, 60.0), rates=None, max_writers=2, max_queue=16, queue_timeout=2.0,
+                 retry_after=1.0, max_clients=10000, trusted_proxies=(), clock=time.monotonic):
+        self.rate = rate
+        self.rates = dict(rates or {})  # endpoint -> (count, seconds) or None
+        self.max_writers = max_writers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.max_clients = max_clients
+        self.trusted_proxies = frozenset(trusted_proxies)
+        self._clock = clock
+        self._buckets = OrderedDict()  # (endpoint, client) -> (tokens, updated), least recently used first
+        self._lock = threading.Lock()
+        self._slots = threading.Condition(threading.Lock())
+        self._running = self._waiting = 0
+        self._counts = {}  # (endpoint, outcome) -> n
+        self._stats = {'wait_seconds': 0.0, 'evictions': 0, 'peak_running': 0, 'peak_waiting': 0}
+
+    def rate_for(self, endpoint):
+        return self.rates.get(endpoint, self.rate)
+
+    def _count(self, endpoint, outcome):
+        with self._lock:
+            self._counts[(endpoint, outcome)] = self._counts.get((endpoint, outcome), 0) + 1
+
+    def client(self):
+        """Who is asking: None for a logged-in user, otherwise their address."""
+        if principals.current_principal() is not None:
+            return None
+        addr = request.remote_addr or '-'
+        if addr in self.trusted_proxies:
+            for hop in reversed(request.headers.get('X-Forwarded-For', '').split(',')):
+                addr = hop.strip() or addr
+                if addr not in self.trusted_proxies:
+                    break
+        return addr
+
+    def take(self, endpoint, client):
+        """Spend one token of ``client``'s bucket for ``endpoint``; raises ``RateLimited``."""
+        rate = self.rate_for(endpoint)
+        if rate is None or client is None:
+            return
+        count, seconds = rate
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop((endpoint, client), (count, now))
+            tokens = min(count, tokens + (now - updated) * count / seconds)
+            self._buckets[(endpoint, client)] = (tokens - 1 if tokens >= 1 else tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)  # a forgotten client starts again with a full bucket
+                self._stats['evictions'] += 1
+        if tokens < 1:
+            self._count(endpoint, 'rate_limited')
+            raise RateLimited(f'more than {count} writes in {seconds:g}s; slow down',
+                              (1 - tokens) * seconds / count)
+
+    def acquire(self, endpoint):
+        """Wait for a write slot; raises ``Overloaded`` when the line is full or the wait runs out."""
+        if not self.max_writers:
+            return
+        with self._slots:
+            if self._running < self.max_writers and not self._waiting:
+                self._running += 1
+                self._stats['peak_running'] = max(self._stats['peak_running'], self._running)
+                return
+            if self._waiting >= self.max_queue:
+                outcome = 'queue_full'
+            else:
+                self._waiting += 1
+                self._stats['peak_waiting'] = max(self._stats['peak_waiting'], self._waiting)
+                start = time.perf_counter()
+                try:
+                    ok = self._slots.wait_for(lambda: self._running < self.max_writers, self.queue_timeout)
+                finally:
+                    self._waiting -= 1
+                    self._stats['wait_seconds'] += time.perf_counter() - start
+                if ok:
+                    self._running += 1
+                    self._stats['peak_running'] = max(self._stats['peak_running'], self._running)
+                    return
+                outcome = 'queue_timeout'
+        self._count(endpoint, outcome)
+        raise Overloaded('too many writes in progress, try again shortly', self.retry_after)
+
+    def release(self):
+        if not self.max_writers:
+            return
+        with self._slots:
+            self._running -= 1
+            self._slots.notify()
+
+    def admit(self, endpoint, view, *args, **kwargs):
+        self.take(endpoint, self.client())
+        self.acquire(endpoint)
+        try:
+            self._count(endpoint, 'admitted')
+            return view(*args, **kwargs)
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            stats = dict(self._stats, clients=len(self._buckets))
+        with self._slots:
+            stats.update(running=self._running, waiting=self._waiting)
+        endpoints = {}
+        for (endpoint, outcome), n in counts.items():
+            endpoints.setdefault(endpoint, dict.fromkeys(OUTCOMES, 0))[outcome] = n
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats.update(endpoints=endpoints, max_writers=self.max_writers, max_queue=self.max_queue,
+                     rate=self.rate and f'{self.rate[0]}/{self.rate[1]:g}',
+                     rates={e: r and f'{r[0]}/{r[1]:g}' for e, r in dict(self.rates).items()})
+        return stats
+
+
+def limited(rate=None):
+    """Rate-limit and cap the writes of a view (``rate`` like ``'5/600'``; the environment overrides it)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method not in WRITE_METHODS:
+                return view(*args, **kwargs)
+            admission, endpoint = get_admission(), request.endpoint
+            if rate is not None and endpoint not in admission.rates:
+                admission.rates[endpoint] = parse_rate(rate)
+            return admission.admit(endpoint, view, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def settings_from_env(config, environ=os.environ):
+    def get(name, default):
+        return config.get(name) or environ.get(name, default)
+    prefix = 'ADMISSION_RATE_'
+    rates = {k[len(prefix):].lower(): parse_rate(v) for k, v in environ.items() if k.startswith(prefix)}
+    return {
+        'rate': parse_rate(get('ADMISSION_RATE', '60/60')),
+        'rates': rates,
+        'max_writers': int(get('ADMISSION_MAX_WRITERS', 2)),
+        'max_queue': int(get('ADMISSION_MAX_QUEUE', 16)),
+        'queue_timeout': float(get('ADMISSION_QUEUE_TIMEOUT', 2)),
+        'retry_after': float(get('ADMISSION_RETRY_AFTER', 1)),
+        'max_clients': int(get('ADMISSION_MAX_CLIENTS', 10000)),
+        'trusted_proxies': [p.strip() for p in get('ADMISSION_TRUSTED_PROXIES', '').split(',') if p.strip()],
+    }
+
+
+def _metric_families(app):
+    a = get_admission(app).stats()
+    return [
+        ('alumni_admission_requests_total', 'counter', 'Rate-limited writes by endpoint and outcome.',
+         [((('endpoint', e), ('outcome', k)), v[k]) for e, v in a['endpoints'].items() for k in v]),
+        ('alumni_admission_writers', 'gauge', 'Rate-limited writes running or waiting for a slot.',
+         [((('state', 'running'),), a['running']), ((('state', 'waiting'),), a['waiting'])]),
+        ('alumni_admission_wait_seconds_total', 'counter', 'Time writes spent waiting for a slot.',
+         [((), a['wait_seconds'])]),
+        ('alumni_admission_clients', 'gauge', 'Client rate buckets held by this worker.', [((), a['clients'])]),
+    ]
+
+
+def init_app(app):
+    admission = Admission(**settings_from_env(app.config))
+    app.extensions[EXTENSION_KEY] = admission
+    metrics.register_collector(app, lambda: _metric_families(app))
+    return admission
+
+
+def get_admission(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
@@ -0,0 +1,105 @@
+"""Batch inserts for the JSON API.
+
+``POST /api/alumni`` (and ``/api/events``, ``/api/mentorships``) with a JSON
+array instead of a single object inserts every valid item with one
+``executemany`` in one transaction and answers with the new ids, in input
+order (``null`` for an item that was rejected), and the reason for each
+rejection::
+
+    {"created": 2, "ids": [101, null, 102],
+     "errors": [{"index": 1, "error": "missing name"}]}
+
+Items are checked before anything is written, so a rejected item never
+aborts the others. Alumni are upserted by dedup key (``alumni_core.ingest``):
+an item for somebody already stored updates that row, ``ids`` gives its
+id, and the answer adds ``updated``, ``unchanged`` and ``duplicates`` counts
+(items folded into an earlier item for the same person, whose id they
+share).
+
+Other tables are inserted with ``executemany`` and the ids worked out from
+``last_insert_rowid()`` rather than read back one round trip per row. That
+relies on the rows getting consecutive rowids, which holds because the
+transaction is ``BEGIN IMMEDIATE`` (``alumni_core.db``): it has the write
+lock before the first insert, so no other connection can insert in
+between. ``RETURNING`` would not help: ``executemany`` cannot
+return rows, and SQLite does not promise the order of a multi-row
+``INSERT ... RETURNING``.
+"""
+import datetime
+from alumni_core import ingest
+
+# columns a client may set, and the ones it must
+TABLES = {
+    'alumni': {'columns': ('name', 'batch', 'email', 'phone', 'company', 'bio'), 'required': ('name',), 'upsert': True},
+    'events': {'columns': ('title', 'date', 'venue', 'description'), 'required': ('title',)},
+    'mentorships': {'columns': ('title', 'student_name', 'field', 'note'), 'required': ('title',)},
+}
+# sort keys of the keyset listings must not be NULL (see alumni_core.pagination)
+DEFAULTS = {'date': ''}
+MAX_LENGTH = 10000
+MAX_ITEMS = 5000
+
+
+class TooManyItems(ValueError):
+    pass
+
+
+def check(table, item):
+    """Return ``(row tuple, None)`` or ``(None, reason)`` for one item."""
+    if not isinstance(item, dict):
+        return None, 'item is not an object'
+    spec = TABLES[table]
+    row = []
+    for col in spec['columns']:
+        value = item.get(col)
+        if value is None:
+            value = DEFAULTS.get(col)
+        if isinstance(value, (dict, list, bool)):
+            return None, f'{col} must be a string or a number'
+        if isinstance(value, str) and len(value) > MAX_LENGTH:
+            return None, f'{col} longer than {MAX_LENGTH} characters'
+        row.append(value)
+    for col in spec['required']:
+        if item.get(col) in (None, ''):
+            return None, f'missing {col}'
+    return tuple(row), None
+
+
+def insert_many(conn, table, items, created_at=None, max_items=MAX_ITEMS):
+    """Insert the valid ``items`` in one transaction; returns ``{'created', 'ids', 'errors'}``."""
+    if len(items) > max_items:
+        raise TooManyItems(f'at most {max_items} items per request, got {len(items)}')
+    created_at = created_at or datetime.datetime.utcnow().isoformat()
+    ids, rows, errors = [None] * len(items), [], []
+    for index, item in enumerate(items):
+        row, reason = check(table, item)
+        if reason:
+            errors.append({'index': index, 'error': reason})
+        else:
+            rows.append((index, row + (created_at,)))
+    if rows and TABLES[table].get('upsert'):
+        try:
+            result = ingest.upsert(conn, [dict(zip(TABLES[table]['columns'], row)) for _, row in rows], created_at)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        for (index, _), row_id in zip(rows, result['ids']):
+            ids[index] = row_id
+        # created + updated + unchanged + duplicates + len(errors) == len(items)
+        return {'created': result['inserted'], 'updated': result['updated'], 'unchanged': result['unchanged'],
+                'duplicates': result['duplicates'], 'ids': ids, 'errors': errors}
+    if rows:
+        cols = TABLES[table]['columns'] + ('created_at',)
+        try:
+            conn.executemany(f"INSERT INTO {table} ({','.join(cols)}) VALUES ({','.join('?' * len(cols))})",
+                             [row for _, row in rows])
+            # consecutive: the IMMEDIATE transaction has held the write lock since the first row
+            last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        for offset, (index, _) in enumerate(rows):
+            ids[index] = last - len(rows) + 1 + offset
+    return {'created': len(rows), 'ids': ids, 'errors': errors}
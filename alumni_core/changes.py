@@ -0,0 +1,245 @@
+"""Change feed for incremental sync: ``/api/changes`` and a Server-Sent Events stream.
+
+Migration 10 adds the ``changes`` table. Triggers on ``alumni``, ``events``,
+``mentorships`` and ``mentor_applications`` append ``(table, id, op)`` for
+every insert, update and delete, in the writer's own transaction. Every way
+of writing is covered: forms, the JSON API (single and batch), CSV upload,
+JSON import, mentor approval, even a script working on the database file.
+A change becomes visible exactly when its row does. The feed carries whole
+rows, emails and phone numbers included, so it is for signed-in users only,
+and ``ADMIN_TABLES`` (the applications) for admins only. Only the newest
+``CHANGE_LOG_KEEP`` entries are kept; an older cursor gets 410 and the
+client reloads.
+
+``read(conn, since)`` returns the changes after a cursor, at most ``limit``
+log entries per call. Several changes to one row within a page are folded
+into one, which carries the row as it is now (``null`` when deleted).
+``stream()`` produces the same pages as SSE events, pushed as they commit::
+
+    GET /api/changes                     -> {"cursor": 1234, "changes": []}
+    GET /api/changes?since=1234          -> the next page and its cursor
+    GET /api/changes/stream?since=1234   -> text/event-stream, event "changes"
+
+A ``ChangeHub`` per worker notices commits from any process: while at least
+one stream is open its thread reads ``max(seq)`` every
+``CHANGES_POLL_INTERVAL`` seconds and wakes the streams when it moves. A
+stream holds a request thread, so at most ``CHANGES_MAX_STREAMS`` are open
+per worker; beyond that the stream answers 503 and clients fall back to
+polling ``/api/changes``. Each stream ends after ``CHANGES_STREAM_SECONDS``
+and the browser's EventSource reconnects with ``Last-Event-ID``, so a
+thread is never held for good.
+"""
+import json, logging, os, sqlite3, threading, time
+from flask import current_app
+from alumni_core import metrics
+from alumni_core.ingest import KEY_COLUMN
+
+log = logging.getLogger(__name__)
+
+EXTENSION_KEY = 'alumni_changes'
+TABLES = ('alumni', 'events', 'mentorships', 'mentor_applications')
+ADMIN_TABLES = ('mentor_applications',)
+
+
+class CursorExpired(ValueError):
+    pass
+
+
+class TooManyStreams(RuntimeError):
+    pass
+
+
+class UnknownTable(ValueError):
+    pass
+
+
+class TableForbidden(PermissionError):
+    pass
+
+
+def allowed_tables(principal):
+    """The tables ``principal`` (a user dict, or None) may follow."""
+    if principal is None:
+        return ()
+    return TABLES if principal['role'] == 'admin' else tuple(t for t in TABLES if t not in ADMIN_TABLES)
+
+
+def head(conn):
+    """The cursor of the newest change (0 before the first one)."""
+    return conn.execute("SELECT max(seq) FROM changes").fetchone()[0] or 0
+
+
+def parse_tables(value, allowed=TABLES):
+    """The tables named in ``?tables=``, all of ``allowed`` when empty."""
+    if not value:
+        return tuple(allowed)
+    tables = tuple(t for t in (v.strip() for v in value.split(',')) if t)
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown:
+        raise UnknownTable(f"unknown table(s) {', '.join(unknown)}; expected some of {', '.join(allowed)}")
+    forbidden = [t for t in tables if t not in allowed]
+    if forbidden:
+        raise TableForbidden(f"not allowed to follow {', '.join(forbidden)}")
+    return tables
+
+
+def read(conn, since, limit=500, tables=TABLES):
+    """Changes after cursor ``since``: ``{'cursor', 'has_more', 'changes'}``."""
+    top = head(conn)
+    oldest = conn.execute("SELECT min(seq) FROM changes").fetchone()[0]
+    # seq has no gaps except where old entries were pruned
+    if oldest is not None and since + 1 < oldest:
+        raise CursorExpired(f'cursor {since} is older than the change log (starts at {oldest}); reload')
+    if since > top:
+        raise CursorExpired(f'cursor {since} is ahead of the change log (at {top}); reload')
+    sql = (f"SELECT seq, tbl, row_id, op, changed_at FROM changes WHERE seq > ? AND seq <= ? "
+           f"AND tbl IN ({','.join('?' * len(tables))}) ORDER BY seq LIMIT ?")
+    entries = conn.execute(sql, (since, top) + tuple(tables) + (limit + 1,)).fetchall()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {}
+    for entry in entries:  # a later change to the same row supersedes an earlier one
+        latest.pop((entry['tbl'], entry['row_id']), None)
+        latest[(entry['tbl'], entry['row_id'])] = entry
+    rows = {}
+    for table in {t for t, _ in latest}:
+        ids = [i for t, i in latest if t == table and latest[(t, i)]['op'] != 'delete']
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in conn.execute(f"SELECT * FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+                rows[(table, row['id'])] = {k: row[k] for k in row.keys() if k != KEY_COLUMN}
+    changes = []
+    for key, entry in latest.items():
+        row = rows.get(key)
+        changes.append({'seq': entry['seq'], 'table': entry['tbl'], 'id': entry['row_id'],
+                        # deleted by a later change that the next page will carry
+                        'op': entry['op'] if row is not None or entry['op'] == 'delete' else 'delete',
+                        'changed_at': entry['changed_at'], 'row': row})
+    cursor = entries[-1]['seq'] if has_more else max(since, top)
+    return {'cursor': cursor, 'has_more': has_more, 'changes': changes}
+
+
+def _event(name, data, event_id=None):
+    out = f'id: {event_id}\n' if event_id is not None else ''
+    return out + f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class ChangeHub:
+    """Per-worker wake-up for open streams when the change log grows."""
+
+    def __init__(self, pool, poll_interval=1.0, max_streams=2, stream_seconds=300.0, heartbeat=15.0, limit=500):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.max_streams = max_streams
+        self.stream_seconds = stream_seconds
+        self.heartbeat = heartbeat
+        self.limit = limit
+        self.head = None
+        self._cond = threading.Condition()
+        self._streams = 0
+        self._thread = None
+        self._pid = None
+        self._stats = {'streams_opened': 0, 'streams_refused': 0, 'events': 0, 'polls': 0, 'poll_errors': 0}
+
+    def _count(self, key, value=1):
+        with self._cond:
+            self._stats[key] += value
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._streams:
+                    self._cond.wait()
+            try:
+                with self.pool.connection() as conn:
+                    top = head(conn)
+                self._count('polls')
+            except sqlite3.Error as e:  # a locked or busy database must not kill the thread
+                self._count('poll_errors')
+                log.warning('change hub poll failed: %s: %s', type(e).__name__, e)
+                top = self.head
+            with self._cond:
+                if top != self.head:
+                    self.head = top
+                    self._cond.notify_all()
+            time.sleep(self.poll_interval)
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():  # a forked child starts over
+            self._pid, self._streams, self.head, self._thread = os.getpid(), 0, None, None
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='alumni-changes', daemon=True)
+            self._thread.start()
+
+    def open(self):
+        with self._cond:
+            self._ensure_started()
+            if self._streams >= self.max_streams:
+                self._stats['streams_refused'] += 1
+                raise TooManyStreams(f'{self.max_streams} change streams already open in this worker')
+            self._streams += 1
+            self._stats['streams_opened'] += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._streams = max(0, self._streams - 1)
+
+    def wait(self, cursor, timeout):
+        """Block until the log is past ``cursor`` or ``timeout`` passes; True if it moved."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.head is not None and self.head > cursor, timeout)
+
+    def stream(self, since, tables=TABLES):
+        """SSE text for one client, starting after ``since``.
+
+        Call ``open()`` first and ``close()`` when the response is closed
+        (``Response.call_on_close``): a generator that is never started
+        would not run a ``finally`` block.
+        """
+        yield 'retry: 2000\n\n'
+        deadline = time.monotonic() + self.stream_seconds
+        while time.monotonic() < deadline:
+            try:
+                with self.pool.connection() as conn:
+                    page = read(conn, since, self.limit, tables)
+            except CursorExpired as e:
+                yield _event('reset', {'error': str(e)})
+                return
+            since = page['cursor']
+            if page['changes']:
+                self._count('events')
+                yield _event('changes', page, since)
+            if page['has_more']:
+                continue
+            if not self.wait(since, min(self.heartbeat, max(0.0, deadline - time.monotonic()))):
+                yield ': keep-alive\n\n'
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, open_streams=self._streams, max_streams=self.max_streams, head=self.head)
+
+
+def _metric_families(app):
+    c = get_hub(app).stats()
+    return [
+        ('alumni_change_streams', 'gauge', 'Open change-feed event streams.', [((), c['open_streams'])]),
+        ('alumni_change_streams_refused_total', 'counter', 'Change streams refused as over the limit.',
+         [((), c['streams_refused'])]),
+    ]
+
+
+def init_app(app, pool):
+    hub = ChangeHub(
+        pool,
+        poll_interval=float(app.config.get('CHANGES_POLL_INTERVAL') or os.environ.get('CHANGES_POLL_INTERVAL', 1)),
+        max_streams=int(app.config.get('CHANGES_MAX_STREAMS') or os.environ.get('CHANGES_MAX_STREAMS', 2)),
+        stream_seconds=float(app.config.get('CHANGES_STREAM_SECONDS') or os.environ.get('CHANGES_STREAM_SECONDS', 300)),
+        limit=app.config.get('MAX_PAGE_SIZE', 500))
+    app.extensions[EXTENSION_KEY] = hub
+    metrics.register_collector(app, lambda: _metric_families(app))
+    return hub
+
+
+def get_hub(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
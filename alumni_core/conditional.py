@@ -0,0 +1,152 @@
+"""Conditional GET for list pages and JSON APIs.
+
+Every write to a tracked table bumps its row in ``table_versions`` (triggers
+from migration 7, so imports, approvals and ad-hoc SQL all count). A view
+wrapped in ``conditional('alumni', ...)`` derives a strong ETag from the
+request path, the query string and those versions, and a Last-Modified from
+their timestamps, before the view runs: a client that already has the
+current representation (``If-None-Match``) gets ``304 Not Modified`` without
+a single row of the table being read. ``If-Modified-Since`` alone never gets
+a 304, as Last-Modified cannot tell two writes in the same second apart.
+
+The same ETag keys an optional cache of rendered response bodies
+(``RESPONSE_CACHE_SIZE`` entries, 0 = off, kept for ``RESPONSE_CACHE_TTL``
+seconds), so the first poll after a change renders once per worker and the
+rest are served from memory.
+"""
+import datetime, hashlib, os, threading
+from functools import wraps
+from flask import Response, current_app, g, make_response, request, session
+from werkzeug.http import is_resource_modified
+from alumni_core import metrics, principals
+from alumni_core.db import get_db
+from alumni_core.principals import TTLCache
+
+EXTENSION_KEY = 'alumni_responses'
+
+
+class ResponseCache:
+    def __init__(self, maxsize=0, ttl=300.0):
+        self.bodies = TTLCache(maxsize, ttl) if maxsize > 0 else None
+        self._lock = threading.Lock()
+        self._stats = {'not_modified': 0, 'cached': 0, 'rendered': 0}
+
+    def count(self, what):
+        with self._lock:
+            self._stats[what] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['bodies'] = self.bodies.stats() if self.bodies is not None else None
+        return stats
+
+
+def _metric_families(app):
+    r = get_cache(app).stats()
+    return [('alumni_conditional_responses_total', 'counter', 'Conditional GETs by outcome.',
+             [((('outcome', k),), r[k]) for k in ('not_modified', 'cached', 'rendered')])]
+
+
+def init_app(app):
+    maxsize = int(app.config.get('RESPONSE_CACHE_SIZE') or os.environ.get('RESPONSE_CACHE_SIZE', 0))
+    ttl = float(app.config.get('RESPONSE_CACHE_TTL') or os.environ.get('RESPONSE_CACHE_TTL', 300))
+    cache = ResponseCache(maxsize, ttl)
+    app.extensions[EXTENSION_KEY] = cache
+    metrics.register_collector(app, lambda: _metric_families(app))
+    return cache
+
+
+def get_cache(app=None):
+    return (app or current_app).extensions.get(EXTENSION_KEY)
+
+
+def table_versions(conn, tables):
+    """``{table: (version, modified_at)}`` for the given tracked tables."""
+    rows = conn.execute(f"SELECT name, version, modified_at FROM table_versions WHERE name IN ({','.join('?' * len(tables))})",
+                        tuple(tables)).fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
+def request_versions(tables):
+    """``table_versions`` for this request, read once per GET and shared with ``alumni_core.fragments``."""
+    if request.method not in ('GET', 'HEAD'):
+        return table_versions(get_db(), tables)
+    known = g.setdefault('_table_versions', {})
+    missing = [t for t in tables if t not in known]
+    if missing:
+        found = table_versions(get_db(), missing)
+        for t in missing:
+            known[t] = found.get(t, (0, None))
+    return {t: known[t] for t in tables}
+
+
+def _last_modified(versions):
+    """The newest change, rounded up to the whole second HTTP dates carry."""
+    stamps = [m for _, m in versions.values() if m]
+    if not stamps:
+        return None
+    newest = max(stamps)
+    when = datetime.datetime.strptime(newest[:19], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=datetime.timezone.utc)
+    if newest[19:].strip('.0Z'):
+        when += datetime.timedelta(seconds=1)
+    return when
+
+
+def _validators(tables, per_user):
+    versions = request_versions(tables)
+    parts = [request.full_path] + [f'{t}={versions.get(t, (0, None))[0]}' for t in tables]
+    if per_user:
+        parts.append(f'user={session.get(principals.get_cache().session_key)}')
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest(), _last_modified(versions)
+
+
+def _headers(resp, etag, last_modified, per_user, max_age):
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    if max_age is None:
+        resp.cache_control.no_cache = True
+    else:
+        resp.cache_control.max_age = max_age
+    if per_user:
+        resp.cache_control.private = True
+    return resp
+
+
+def conditional(*tables, per_user=False, max_age=None):
+    """Answer GET/HEAD with 304 while ``tables`` are unchanged.
+
+    ``per_user`` is for HTML pages, which show who is logged in: the ETag then
+    also depends on the session user and responses are marked private.
+    Responses rendered while flash messages are pending are not tagged.
+    Without ``max_age`` clients must revalidate on every use (``no-cache``).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+                return view(*args, **kwargs)
+            cache = get_cache()
+            etag, last_modified = _validators(tables, per_user)
+            # the ETag alone decides: Last-Modified has whole seconds, and a second write within
+            # the same second would leave a client sending only If-Modified-Since with stale data
+            if not is_resource_modified(request.environ, etag):
+                if cache is not None:
+                    cache.count('not_modified')
+                return _headers(Response(status=304), etag, last_modified, per_user, max_age)
+            bodies = cache.bodies if cache is not None else None
+            hit = bodies.get(etag, None) if bodies is not None else None
+            if hit is not None:
+                cache.count('cached')
+                return _headers(Response(hit[1], mimetype=hit[0]), etag, last_modified, per_user, max_age)
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.is_streamed or '_flashes' in session:
+                return resp
+            if cache is not None:
+                cache.count('rendered')
+            if bodies is not None:
+                bodies.set(etag, (resp.mimetype, resp.get_data()))
+            return _headers(resp, etag, last_modified, per_user, max_age)
+        return wrapped
+    return decorator
@@ -0,0 +1,214 @@
+"""Pooled, request-scoped SQLite connections.
+
+Each worker process keeps a small pool of connections that are configured
+once (WAL journaling, busy timeout, cache and mmap sizes, immediate write
+transactions, incremental auto-vacuum for new files). A request borrows
+one connection on first use of ``get_db()``, keeps it on ``flask.g`` and
+hands it back to the pool in the app-context teardown.
+"""
+import os, queue, sqlite3, threading, time
+from contextlib import contextmanager
+from flask import current_app, g
+
+DEFAULT_PRAGMAS = {
+    # only takes effect on a new, empty database, and only before journal_mode=WAL;
+    # existing files keep theirs until a full VACUUM (see alumni_core.maintenance)
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -16000,          # negative = KiB, i.e. ~16 MB page cache
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'journal_size_limit': 64 * 1024 * 1024,  # truncate the WAL back to this after checkpoints
+}
+# Transactions that sqlite3 opens implicitly before INSERT/UPDATE/DELETE take
+# the write lock up front. With several worker processes a DEFERRED one that
+# has read first can fail at once with SQLITE_BUSY when another process
+# commits; an IMMEDIATE one waits up to busy_timeout instead.
+BEGIN_MODE = 'IMMEDIATE'
+
+EXTENSION_KEY = 'alumni_db'
+
+
+def pragmas_from_env(environ=os.environ):
+    """Return DEFAULT_PRAGMAS with SQLITE_<NAME> environment overrides applied."""
+    pragmas = dict(DEFAULT_PRAGMAS)
+    for name in pragmas:
+        value = environ.get('SQLITE_' + name.upper())
+        if value is not None:
+            pragmas[name] = value
+    return pragmas
+
+
+def configure_connection(conn, pragmas=None):
+    conn.row_factory = sqlite3.Row
+    conn.isolation_level = BEGIN_MODE
+    for name, value in (pragmas or DEFAULT_PRAGMAS).items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def connect(path, pragmas=None, factory=sqlite3.Connection):
+    """Open a standalone configured connection (startup, CLI and scripts)."""
+    conn = sqlite3.connect(path, check_same_thread=False, factory=factory)
+    return configure_connection(conn, pragmas)
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """A per-process pool of configured SQLite connections.
+
+    Connections are opened lazily up to ``size``; once all are borrowed,
+    ``acquire`` waits up to ``timeout`` seconds for one to be released.
+    The pool notices when it is used from a forked child (gunicorn workers)
+    and starts over instead of sharing the parent's file handles.
+    ``factory`` is the ``sqlite3.Connection`` subclass to open (see
+    ``alumni_core.metrics``).
+    """
+
+    def __init__(self, path, size=8, timeout=10.0, pragmas=None, factory=sqlite3.Connection):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas or DEFAULT_PRAGMAS
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._in_use = 0
+        self._stats = {'acquired': 0, 'created': 0, 'waits': 0, 'wait_time': 0.0,
+                       'timeouts': 0, 'discarded': 0, 'peak_in_use': 0}
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def acquire(self):
+        self._check_pid()
+        conn = None
+        with self._lock:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                if self._opened < self.size:
+                    self._opened += 1
+                    self._stats['created'] += 1
+                    create = True
+                else:
+                    create = False
+        if conn is None:
+            if create:
+                try:
+                    conn = connect(self.path, self.pragmas, self.factory)
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                start = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'no SQLite connection available after {self.timeout}s')
+                with self._lock:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time'] += time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._stats['acquired'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._in_use)
+        return conn
+
+    def release(self, conn, discard=False):
+        if self._pid != os.getpid():
+            return  # connection belongs to the parent process; let it be
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                self._opened -= 1
+                self._stats['discarded'] += 1
+        if discard:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection outside of a request (streams, threads)."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+            conn.close()
+
+    def stats(self):
+        self._check_pid()
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(size=self.size, open=self._opened, in_use=self._in_use,
+                         idle=self._idle.qsize(), pid=self._pid)
+        stats['avg_wait_ms'] = round(stats['wait_time'] * 1000 / stats['waits'], 3) if stats['waits'] else 0.0
+        stats['wait_time'] = round(stats['wait_time'], 6)
+        return stats
+
+
+def init_app(app, path):
+    """Attach a connection pool for ``path`` to ``app``.
+
+    Pool size and acquire timeout come from ``DB_POOL_SIZE`` and
+    ``DB_POOL_TIMEOUT`` (config or environment).
+    """
+    size = int(app.config.get('DB_POOL_SIZE') or os.environ.get('DB_POOL_SIZE', 8))
+    timeout = float(app.config.get('DB_POOL_TIMEOUT') or os.environ.get('DB_POOL_TIMEOUT', 10))
+    pool = ConnectionPool(path, size=size, timeout=timeout, pragmas=pragmas_from_env())
+    app.extensions[EXTENSION_KEY] = pool
+    app.teardown_appcontext(_release_request_connection)
+    return pool
+
+
+def get_pool(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
+
+
+def get_db():
+    """Return this request's connection, borrowing one from the pool on first use."""
+    if '_db_conn' not in g:
+        g._db_conn = get_pool().acquire()
+    return g._db_conn
+
+
+def _release_request_connection(exc):
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        get_pool().release(conn)
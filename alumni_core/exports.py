@@ -0,0 +1,128 @@
+"""Constant-memory exports.
+
+Every exporter walks its tables with ``fetchmany`` and yields encoded
+chunks of roughly ``CHUNK_SIZE`` bytes, so memory stays flat however large
+the tables are and the first bytes reach the client straight away. Excel is
+the exception: an .xlsx file is a zip archive and needs a seekable file, so
+it is written with openpyxl's write-only mode to a spooled temporary file.
+
+Exports read from a snapshot (``alumni_core.snapshots``) rather than the
+request's connection: they keep reading after the view function has
+returned, and every table in one export must come from the same moment.
+"""
+import csv, io, json, tempfile, zlib
+from alumni_core.ingest import KEY_COLUMN
+
+CHUNK_SIZE = 64 * 1024
+FETCH_SIZE = 500
+TABLES = ('alumni', 'events', 'mentorships')
+EXCEL_SPOOL_SIZE = 8 * 1024 * 1024
+
+ALUMNI_SHEET = [('ID', 'id'), ('Name', 'name'), ('Batch', 'batch'), ('Email', 'email'), ('Phone', 'phone'),
+                ('Company', 'company'), ('Bio', 'bio'), ('Created At', 'created_at')]
+
+
+def iter_rows(conn, sql, params=(), size=FETCH_SIZE):
+    cur = conn.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            break
+        yield from rows
+
+
+def table_columns(conn, table):
+    """The table's columns minus internal ones (``dedup_key``)."""
+    return [c[1] for c in conn.execute(f"PRAGMA table_info({table})") if c[1] != KEY_COLUMN]
+
+
+def table_rows(conn, table):
+    return iter_rows(conn, f"SELECT {', '.join(table_columns(conn, table))} FROM {table} ORDER BY id")
+
+
+def _buffered(pieces, size=CHUNK_SIZE):
+    """Join small str pieces into ~size byte chunks."""
+    buf, length = [], 0
+    for piece in pieces:
+        buf.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buf).encode('utf-8')
+            buf, length = [], 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
+
+
+def _dumps(row):
+    return json.dumps(dict(row), ensure_ascii=False)
+
+
+def json_document(conn, tables=TABLES):
+    """``{"alumni": [...], "events": [...], ...}`` - the format import_json reads."""
+    def pieces():
+        yield '{'
+        for n, table in enumerate(tables):
+            yield ('\n' if n == 0 else '\n],\n') + json.dumps(table) + ': ['
+            for i, row in enumerate(table_rows(conn, table)):
+                yield ('\n' if i == 0 else ',\n') + _dumps(row)
+        yield '\n]}\n' if tables else '}\n'
+    return _buffered(pieces())
+
+
+def ndjson_lines(conn, tables=TABLES):
+    """One ``{"table": ..., "row": {...}}`` object per line."""
+    def pieces():
+        for table in tables:
+            prefix = '{"table": ' + json.dumps(table) + ', "row": '
+            for row in table_rows(conn, table):
+                yield prefix + _dumps(row) + '}\n'
+    return _buffered(pieces())
+
+
+def csv_lines(conn, table):
+    def pieces():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        rows = table_rows(conn, table)
+        first = next(rows, None)
+        cols = table_columns(conn, table) if first is None else first.keys()
+        writer.writerow(cols)
+        if first is not None:
+            writer.writerow(tuple(first))
+        for row in rows:
+            writer.writerow(tuple(row))
+            if out.tell() >= CHUNK_SIZE:
+                yield out.getvalue()
+                out.seek(0); out.truncate()
+        yield out.getvalue()
+    return _buffered(pieces())
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte chunks on the fly."""
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def stream(conn, producer, *args, gzip=False):
+    """Run ``producer(conn, *args)``, gzipped if asked; ``conn`` must outlive the stream."""
+    chunks = producer(conn, *args)
+    yield from (gzip_chunks(chunks) if gzip else chunks)
+
+
+def alumni_workbook(conn):
+    """Write the alumni sheet to a spooled temp file and return it rewound."""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Alumni')
+    ws.append([title for title, _ in ALUMNI_SHEET])
+    for a in table_rows(conn, 'alumni'):
+        ws.append([a[col] for _, col in ALUMNI_SHEET])
+    out = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_SIZE)
+    wb.save(out)
+    out.seek(0)
+    return out
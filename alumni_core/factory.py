@@ -0,0 +1,63 @@
+"""Application setup shared by both apps, and their production entry point.
+
+``init_app`` installs the extensions every app uses, in the order they
+depend on each other (metrics first, so its request timing wraps the rest).
+
+``create_app(name)`` loads one of the apps for a WSGI server and migrates
+its database once, in the loading process. Under gunicorn with
+``preload_app`` (``gunicorn.conf.py``) that is the master, before any worker
+is forked; the pool, hashing executor, outbox sender and fragment store all
+notice the new pid in a worker and start fresh there. The apps declare their
+routes on a module-level ``app``, so "creating" one means importing its
+module under a unique name.
+"""
+import importlib.util, os, sys
+from alumni_core import admission, conditional, db, fragments, hashing, maintenance, metrics, principals
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = {
+    'community': os.path.join(ROOT, 'app.py'),
+    'console': os.path.join(ROOT, 'alumni_connect_flask', 'app.py'),
+}
+
+
+def init_app(app, db_path, loader, session_key):
+    """Pool, metrics, user cache, conditional GET, fragment cache, hashing, maintenance and admission for ``app``."""
+    app.config.setdefault('PAGE_SIZE', int(os.environ.get('PAGE_SIZE', 50)))
+    app.config.setdefault('MAX_PAGE_SIZE', int(os.environ.get('MAX_PAGE_SIZE', 500)))
+    db.init_app(app, db_path)
+    metrics.init_app(app)
+    principals.init_app(app, loader, session_key)
+    conditional.init_app(app)
+    fragments.init_app(app)
+    hashing.init_app(app)
+    maintenance.init_app(app, db.get_pool(app))
+    admission.init_app(app)
+    return app
+
+
+def load_module(name):
+    """Import the module of app ``name`` ('community' or 'console')."""
+    if name not in APPS:
+        raise ValueError(f'unknown app {name!r}; expected one of {", ".join(sorted(APPS))}')
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    module_name = f'alumni_{name}_app'
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, APPS[name])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
+
+
+def create_app(name=None):
+    """The Flask app named by ``name`` or ``ALUMNI_APP``, with its database migrated."""
+    module = load_module(name or os.environ.get('ALUMNI_APP', 'community'))
+    module.init_db()
+    return module.app
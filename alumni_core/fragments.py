@@ -0,0 +1,193 @@
+"""Cached rendering of template fragments, keyed by table version.
+
+List templates wrap their table in a call block::
+
+    {% call cached_fragment('alumni_rows', 'alumni') %} ... {% endcall %}
+
+The body is rendered once per combination of fragment name, the current
+``table_versions`` of the named tables, the request path and query string,
+the user's role, the database and the app's templates (names, sizes and
+mtimes), and served from cache after that. Every write to those tables bumps their
+version (triggers from migration 7), so a write route never has to
+invalidate anything: the next request simply looks for a new key, and
+entries for old versions age out of the LRU.
+
+Entries are kept in a per-worker LRU (``FRAGMENT_CACHE_SIZE`` entries,
+0 = off, for ``FRAGMENT_CACHE_TTL`` seconds). With ``FRAGMENT_CACHE_PATH``
+set they are also stored in a small SQLite file shared by all workers on the
+host (up to ``FRAGMENT_CACHE_DISK_SIZE`` entries), so a fragment rendered by
+one gunicorn worker is a hit in the others.
+"""
+import hashlib, os, sqlite3, threading, time
+from flask import current_app, request
+from markupsafe import Markup
+from alumni_core import db, metrics, principals
+from alumni_core.conditional import request_versions
+from alumni_core.principals import TTLCache
+
+EXTENSION_KEY = 'alumni_fragments'
+_MISSING = object()
+
+
+class DiskStore:
+    """Fragments in a SQLite file; oldest entries are pruned past ``maxsize``."""
+
+    PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'OFF', 'busy_timeout': 200}
+
+    def __init__(self, path, maxsize=5000, ttl=3600.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._stores = 0
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():  # not shared with a forked parent
+            conn = db.connect(self.path, self.PRAGMAS)
+            conn.execute("CREATE TABLE IF NOT EXISTS fragments (key TEXT PRIMARY KEY, body TEXT NOT NULL, stored_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fragments_stored_at ON fragments(stored_at)")
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection().execute("SELECT body, stored_at FROM fragments WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+        return row[0]
+
+    def set(self, key, body):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO fragments (key, body, stored_at) VALUES (?,?,?)", (key, body, time.time()))
+            self._stores += 1
+            if self._stores % 100 == 0:
+                conn.execute("DELETE FROM fragments WHERE stored_at < ?", (time.time() - self.ttl,))
+                conn.execute("DELETE FROM fragments WHERE key IN (SELECT key FROM fragments ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                             (self.maxsize,))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM fragments")
+            conn.commit()
+
+
+class FragmentCache:
+    def __init__(self, maxsize=256, ttl=3600.0, disk=None, signature=''):
+        self.enabled = maxsize > 0
+        self.memory = TTLCache(maxsize, ttl)
+        self.disk = disk
+        self.signature = signature
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'disk_errors': 0, 'render_time': 0.0}
+
+    def count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def key(self, name, tables, vary=()):
+        versions = request_versions(tables)
+        principal = principals.current_principal()
+        parts = [self.signature, name, request.script_root, request.full_path,
+                 principal['role'] if principal else '-'] + [f'{t}={versions[t][0]}' for t in tables] + [str(v) for v in vary]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        body = self.memory.get(key, _MISSING)
+        if body is not _MISSING:
+            self.count('hits')
+            return body
+        if self.disk is not None:
+            try:
+                body = self.disk.get(key)
+            except sqlite3.Error:
+                self.count('disk_errors')
+                body = None
+            if body is not None:
+                self.count('disk_hits')
+                self.memory.set(key, body)
+                return body
+        self.count('misses')
+        return None
+
+    def set(self, key, body):
+        self.count('stores')
+        self.memory.set(key, body)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, body)
+            except sqlite3.Error:  # a busy cache file must not fail the page
+                self.count('disk_errors')
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['render_time'] = round(stats['render_time'], 3)
+        stats['memory'] = self.memory.stats()
+        stats['disk'] = self.disk.path if self.disk is not None else None
+        return stats
+
+
+def cached_fragment(name, *tables, vary=(), caller=None):
+    """Jinja call-block helper: return the cached body or render it with ``caller()``."""
+    cache = get_cache()
+    if not cache.enabled or request.method not in ('GET', 'HEAD'):
+        return caller()
+    key = cache.key(name, tables, vary)
+    body = cache.get(key)
+    if body is None:
+        start = time.perf_counter()
+        body = str(caller())
+        cache.count('render_time', time.perf_counter() - start)
+        cache.set(key, body)
+    return Markup(body)
+
+
+def template_signature(app):
+    """Changes whenever a template file of ``app`` is added, removed or edited.
+
+    The database path is part of it too, so apps on different databases can
+    share one cache file without seeing each other's rows.
+    """
+    parts = [app.import_name, db.get_pool(app).path]
+    for root in getattr(app.jinja_loader, 'searchpath', ()):
+        for dirpath, _, files in os.walk(root):
+            for f in sorted(files):
+                st = os.stat(os.path.join(dirpath, f))
+                parts.append(f'{os.path.relpath(os.path.join(dirpath, f), root)}:{st.st_size}:{st.st_mtime_ns}')
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _metric_families(app):
+    f = get_cache(app).stats()
+    return [('alumni_fragment_cache_total', 'counter', 'Fragment cache lookups by outcome.',
+             [((('outcome', k),), f[k]) for k in ('hits', 'disk_hits', 'misses')])]
+
+
+def init_app(app):
+    maxsize = int(app.config.get('FRAGMENT_CACHE_SIZE') or os.environ.get('FRAGMENT_CACHE_SIZE', 256))
+    ttl = float(app.config.get('FRAGMENT_CACHE_TTL') or os.environ.get('FRAGMENT_CACHE_TTL', 3600))
+    path = app.config.get('FRAGMENT_CACHE_PATH') or os.environ.get('FRAGMENT_CACHE_PATH')
+    disk_size = int(app.config.get('FRAGMENT_CACHE_DISK_SIZE') or os.environ.get('FRAGMENT_CACHE_DISK_SIZE', 5000))
+    disk = DiskStore(path, disk_size, ttl) if path and maxsize > 0 else None
+    cache = FragmentCache(maxsize, ttl, disk, template_signature(app) if maxsize > 0 else '')
+    app.extensions[EXTENSION_KEY] = cache
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+    metrics.register_collector(app, lambda: _metric_families(app))
+    return cache
+
+
+def get_cache(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
@@ -0,0 +1,172 @@
+"""Password hashing off the request thread.
+
+Werkzeug's password hashes are deliberately slow, so a burst of logins used
+to occupy every request thread of a worker. ``HashingService`` runs hash and
+verify calls on a small pool of ``workers`` instead, which caps the CPU that
+hashing can take. At most ``max_pending`` calls may be queued or running per
+worker; beyond that, or when a call does not finish within ``timeout``
+seconds, ``HashingBusy`` is raised and the app answers "try again" rather
+than piling up threads.
+
+The default pool is threads: hashlib's scrypt and PBKDF2 release the GIL, so
+they run in parallel with request threads without forking. ``pool='process'``
+uses spawned processes instead; the entry script must then be import-safe
+(``if __name__ == '__main__'``), as multiprocessing re-imports it.
+
+The algorithm and cost come from ``PASSWORD_HASH_METHOD`` in Werkzeug's
+notation (``scrypt:32768:8:1``, ``pbkdf2:sha256:600000``). ``verify``
+reports when a stored hash was made with other parameters, together with a
+fresh hash of the password, so logins upgrade hashes as users come back.
+"""
+import hashlib, multiprocessing, os, threading, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+from alumni_core import metrics
+
+EXTENSION_KEY = 'alumni_hashing'
+DEFAULT_METHOD = 'scrypt:32768:8:1' if hasattr(hashlib, 'scrypt') else 'pbkdf2:sha256:600000'
+
+
+class HashingBusy(RuntimeError):
+    """Too many hash/verify calls queued, or one took longer than the timeout."""
+
+
+def configured_method(environ=os.environ):
+    return environ.get('PASSWORD_HASH_METHOD') or DEFAULT_METHOD
+
+
+def generate(password, method=None):
+    """Hash inline, for scripts and startup seeding."""
+    return generate_password_hash(password, method or configured_method())
+
+
+def method_of(stored):
+    return (stored or '').split('$', 1)[0]
+
+
+def _verify(stored, password, method, rehash):
+    # runs in the pool: check, and if the hash is outdated make the new one in the same trip
+    if not check_password_hash(stored, password):
+        return False, None
+    return True, (generate_password_hash(password, method) if rehash else None)
+
+
+class HashingService:
+    def __init__(self, method=None, workers=2, max_pending=32, timeout=5.0, pool='thread'):
+        if pool not in ('thread', 'process'):
+            raise ValueError("pool must be 'thread' or 'process'")
+        self.method = method or configured_method()
+        # Werkzeug fills in default costs ('scrypt' -> 'scrypt:32768:8:1'); compare against what it stores
+        self.canonical = method_of(generate_password_hash('', self.method))
+        self.workers = workers
+        self.pool = pool
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {'hashes': 0, 'verifies': 0, 'rehashed': 0, 'busy': 0, 'timeouts': 0,
+                       'pending': 0, 'time': 0.0}
+
+    def _executor(self):
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    if self.pool == 'thread':
+                        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='alumni-hashing')
+                    else:
+                        # spawn: never fork a threaded worker just to hash passwords
+                        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _call(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('busy')
+            raise HashingBusy('too many password operations in progress')
+        self._count('pending')
+        start = time.perf_counter()
+
+        def done(_=None):
+            self._count('pending', -1)
+            self._count('time', time.perf_counter() - start)
+            self._slots.release()
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                done()
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            done()
+            raise
+        # the slot is held until the work really finishes, even if we stop waiting for it
+        future.add_done_callback(done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._count('timeouts')
+            raise HashingBusy(f'password operation took longer than {self.timeout}s') from None
+
+    def hash(self, password):
+        self._count('hashes')
+        return self._call(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, stored):
+        return method_of(stored) != self.canonical
+
+    def verify(self, stored, password):
+        """Return ``(ok, new_hash)``; ``new_hash`` is set when the stored hash should be replaced."""
+        if not stored:
+            return False, None
+        self._count('verifies')
+        ok, new_hash = self._call(_verify, stored, password, self.method, self.needs_rehash(stored))
+        if new_hash:
+            self._count('rehashed')
+        return ok, new_hash
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['time'] = round(stats['time'], 3)
+        stats.update(method=self.canonical, pool=self.pool, workers=self.workers, max_pending=self.max_pending, timeout=self.timeout)
+        return stats
+
+    def shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+
+def _metric_families(app):
+    h = get_service(app).stats()
+    return [
+        ('alumni_password_operations_total', 'counter', 'Password hashes and verifications.',
+         [((('op', 'hash'),), h['hashes']), ((('op', 'verify'),), h['verifies'])]),
+        ('alumni_password_seconds_total', 'counter', 'Time in password hashing, queueing included.', [((), h['time'])]),
+        ('alumni_password_busy_total', 'counter', 'Password operations refused as busy or timed out.',
+         [((), h['busy'] + h['timeouts'])]),
+    ]
+
+
+def init_app(app):
+    service = HashingService(
+        configured_method(),
+        workers=int(app.config.get('PASSWORD_HASH_WORKERS') or os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+        max_pending=int(app.config.get('PASSWORD_HASH_QUEUE') or os.environ.get('PASSWORD_HASH_QUEUE', 32)),
+        timeout=float(app.config.get('PASSWORD_HASH_TIMEOUT') or os.environ.get('PASSWORD_HASH_TIMEOUT', 5)),
+        pool=app.config.get('PASSWORD_HASH_POOL') or os.environ.get('PASSWORD_HASH_POOL', 'thread'))
+    app.extensions[EXTENSION_KEY] = service
+    metrics.register_collector(app, lambda: _metric_families(app))
+    return service
+
+
+def get_service(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
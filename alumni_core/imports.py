@@ -0,0 +1,376 @@
+"""Bulk imports: background CSV import of alumni and atomic JSON import.
+
+The upload is spooled to a temporary file inside the request, then parsed
+as a stream on a background thread: rows are mapped by header name,
+validated and normalised in chunks of ``CHUNK_ROWS`` and upserted by
+dedup key (``alumni_core.ingest``), one short ``BEGIN IMMEDIATE``
+transaction per chunk, so the write lock is never held for the whole file
+and uploading the same file again adds nobody.
+
+Progress lives in the ``import_jobs`` table (rejected rows with their
+reasons in ``import_rejects``) so any worker can answer
+``/api/imports/<id>``, not just the one running the job.
+
+``import_json`` loads an exported ``{"alumni": [...], ...}`` document: it is
+parsed incrementally (``alumni_core.jsonstream``) into TEMP staging tables,
+then applied to the live tables in one ``BEGIN IMMEDIATE`` transaction, so
+readers see either the old data or the new data and never a half-loaded
+table. ``mode='merge'`` upserts by each table's natural key instead of
+replacing the table; for alumni that is ``dedup_key``, and in either mode
+a document listing the same person twice keeps the last entry.
+"""
+import csv, datetime, json, logging, os, re, shutil, tempfile, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from alumni_core import ingest
+from alumni_core.jsonstream import iter_tables
+
+log = logging.getLogger(__name__)
+
+CHUNK_ROWS = 1000
+MAX_STORED_REJECTS = 1000
+ALUMNI_COLUMNS = ('name', 'batch', 'email', 'phone', 'company', 'bio')
+# header spellings seen in registrar / spreadsheet exports, normalised by _norm_header
+HEADER_ALIASES = {
+    'name': ('name', 'full name', 'alumni name', 'alumnus', 'student name'),
+    'batch': ('batch', 'year', 'class', 'class of', 'graduation year', 'batch year', 'passing year'),
+    'email': ('email', 'e mail', 'email address', 'mail'),
+    'phone': ('phone', 'mobile', 'phone number', 'mobile number', 'contact', 'contact number'),
+    'company': ('company', 'employer', 'organisation', 'organization', 'company role', 'current company'),
+    'bio': ('bio', 'about', 'skills', 'bio skills', 'notes', 'description'),
+}
+_HEADER_LOOKUP = {alias: col for col, aliases in HEADER_ALIASES.items() for alias in aliases}
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+MAX_FIELD = {'name': 200, 'batch': 20, 'email': 254, 'phone': 40, 'company': 200, 'bio': 5000}
+
+# columns accepted from a JSON import, the natural key merge mode matches on
+# and columns computed from each row while it is staged
+JSON_TABLES = {
+    'alumni': {'columns': ('name', 'batch', 'email', 'phone', 'company', 'bio', 'created_at'), 'key': ('dedup_key',),
+               'derived': {'dedup_key': ingest.record_key}},
+    'events': {'columns': ('title', 'date', 'venue', 'description', 'created_at'), 'key': ('title', 'date')},
+    'mentorships': {'columns': ('title', 'alumni_id', 'student_name', 'field', 'note', 'approved', 'created_at'),
+                    'key': ('title', 'student_name')},
+}
+# applied when a row leaves a column out (NULL sort keys would drop out of keyset pages)
+JSON_DEFAULTS = {'created_at': ':now', 'date': "''", 'approved': '1'}
+IMPORT_MODES = ('replace', 'merge')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _norm_header(value):
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', (value or '').lower()).split())
+
+
+def column_mapping(header):
+    """Map CSV column positions to alumni columns from a header row.
+
+    Returns None when the row does not look like a header (no ``name``
+    column recognised), in which case the file is read positionally in the
+    legacy ``name,batch,email,phone,company,bio`` order.
+    """
+    mapping = {}
+    for pos, value in enumerate(header):
+        col = _HEADER_LOOKUP.get(_norm_header(value))
+        if col and col not in mapping.values():
+            mapping[pos] = col
+    return mapping if 'name' in mapping.values() else None
+
+
+POSITIONAL = dict(enumerate(ALUMNI_COLUMNS))
+
+
+def normalize_row(row, mapping):
+    """Return ``(record, None)`` or ``(None, reason)`` for one CSV row."""
+    rec = dict.fromkeys(ALUMNI_COLUMNS, '')
+    for pos, col in mapping.items():
+        if pos < len(row):
+            rec[col] = ' '.join(row[pos].split()) if col != 'bio' else row[pos].strip()
+    if not rec['name']:
+        return None, 'missing name'
+    if rec['email']:
+        rec['email'] = rec['email'].lower()
+        if not _EMAIL.match(rec['email']):
+            return None, f"invalid email {rec['email'][:60]!r}"
+    for col, limit in MAX_FIELD.items():
+        if len(rec[col]) > limit:
+            return None, f'{col} longer than {limit} characters'
+    return rec, None
+
+
+def parse(lines, chunk_rows=CHUNK_ROWS):
+    """Yield chunks of ``(line_no, record, reason)`` from an iterable of CSV lines."""
+    reader = csv.reader(lines)
+    mapping, chunk = None, []
+    for row in reader:
+        if mapping is None:
+            mapping = column_mapping(row)
+            if mapping is not None:
+                continue  # header row
+            mapping = POSITIONAL
+        if not row or not any(v.strip() for v in row):
+            continue
+        rec, reason = normalize_row(row, mapping)
+        chunk.append((reader.line_num, rec, reason))
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_alumni(conn, records, created_at):
+    """Upsert normalised records by dedup key; returns the ``alumni_core.ingest.upsert`` counts."""
+    return ingest.upsert(conn, records, created_at, batch=max(len(records), 1))
+
+
+def _now():
+    return datetime.datetime.utcnow().isoformat()
+
+
+def create_job(conn, kind, filename, created_by=None):
+    job_id = uuid.uuid4().hex
+    conn.execute("INSERT INTO import_jobs (id,kind,filename,status,created_by,created_at,updated_at) VALUES (?,?,?,?,?,?,?)",
+                 (job_id, kind, filename, 'queued', created_by, _now(), _now()))
+    conn.commit()
+    return job_id
+
+
+def run_csv_job(conn, job_id, path, chunk_rows=CHUNK_ROWS):
+    """Import the spooled CSV at ``path``; progress is committed with every chunk."""
+    start = time.perf_counter()
+    processed = rejected = 0
+    counts = dict.fromkeys(('inserted', 'updated', 'unchanged'), 0)
+    conn.execute("UPDATE import_jobs SET status='running', started_at=?, updated_at=? WHERE id=?", (_now(), _now(), job_id))
+    conn.commit()
+    try:
+        with open(path, encoding='utf-8-sig', errors='replace', newline='') as f:
+            for chunk in parse(f, chunk_rows):
+                created_at = _now()
+                good = [rec for _, rec, _ in chunk if rec is not None]
+                bad = [(job_id, line, reason) for line, rec, reason in chunk if rec is None]
+                conn.execute("BEGIN IMMEDIATE")
+                result = insert_alumni(conn, good, created_at)
+                for name in counts:
+                    counts[name] += result[name]
+                if bad and rejected < MAX_STORED_REJECTS:
+                    conn.executemany("INSERT INTO import_rejects (job_id,line_no,reason) VALUES (?,?,?)",
+                                     bad[:MAX_STORED_REJECTS - rejected])
+                processed += len(chunk); rejected += len(bad)
+                conn.execute("UPDATE import_jobs SET rows_processed=?, rows_inserted=?, rows_updated=?, rows_unchanged=?, "
+                             "rows_rejected=?, elapsed_s=?, updated_at=? WHERE id=?",
+                             (processed, counts['inserted'], counts['updated'], counts['unchanged'], rejected,
+                              round(time.perf_counter() - start, 3), _now(), job_id))
+                conn.commit()
+        status, error = 'done', None
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        status, error = 'failed', f'{type(e).__name__}: {e}'
+    conn.execute("UPDATE import_jobs SET status=?, error=?, elapsed_s=?, finished_at=?, updated_at=? WHERE id=?",
+                 (status, error, round(time.perf_counter() - start, 3), _now(), _now(), job_id))
+    conn.commit()
+    return status
+
+
+def spool_upload(stream, bufsize=1024 * 1024):
+    """Copy an upload stream to a temp file (the request body is gone once the view returns)."""
+    fd, path = tempfile.mkstemp(prefix='alumni-import-', suffix='.csv')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(stream, out, bufsize)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def _get_executor():
+    # one import at a time per worker process: imports queue instead of fighting over the write lock
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alumni-import')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _fail_job(pool, job_id, error):
+    """Mark a job that never got to record its own outcome as failed."""
+    try:
+        with pool.connection() as conn:
+            conn.execute("UPDATE import_jobs SET status='failed', error=?, finished_at=?, updated_at=? "
+                         "WHERE id=? AND status IN ('queued','running')",
+                         (f'{type(error).__name__}: {error}', _now(), _now(), job_id))
+            conn.commit()
+    except Exception:
+        log.exception('could not mark import job %s as failed', job_id)
+
+
+def start_csv_import(pool, stream, filename, created_by=None):
+    """Spool ``stream``, queue the import and return its job id."""
+    path = spool_upload(stream)
+    job_id = None
+
+    def work():
+        try:
+            with pool.connection() as conn:
+                run_csv_job(conn, job_id, path)
+        except Exception as e:  # the executor would keep it in a Future nobody reads
+            log.exception('import job %s', job_id)
+            _fail_job(pool, job_id, e)
+        finally:
+            os.unlink(path)
+    try:
+        with pool.connection() as conn:
+            job_id = create_job(conn, 'alumni_csv', filename, created_by)
+        _get_executor().submit(work)
+    except BaseException as e:
+        os.unlink(path)
+        if job_id is not None:
+            _fail_job(pool, job_id, e)
+        raise
+    return job_id
+
+
+def job_status(conn, job_id, max_rejects=100):
+    row = conn.execute("SELECT * FROM import_jobs WHERE id=?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job['rows_per_second'] = round(job['rows_processed'] / job['elapsed_s'], 1) if job['elapsed_s'] else None
+    # rows folded into an earlier row of the same chunk
+    job['rows_duplicate'] = job['rows_processed'] - job['rows_rejected'] - job['rows_inserted'] - \
+        (job['rows_updated'] or 0) - (job['rows_unchanged'] or 0)
+    job['rejects'] = [dict(r) for r in conn.execute(
+        "SELECT line_no, reason FROM import_rejects WHERE job_id=? ORDER BY line_no LIMIT ?", (job_id, max_rejects))]
+    return job
+
+
+# ----- JSON -----
+
+def _stage_name(table):
+    return f'temp.import_stage_{table}'
+
+
+def _scalar(value):
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+
+
+def _stage_columns(table):
+    return JSON_TABLES[table]['columns'] + tuple(JSON_TABLES[table].get('derived', ()))
+
+
+def _stage(conn, table, rows, chunk_rows):
+    """Load ``rows`` into the table's staging table; returns (rows staged, rows rejected)."""
+    cols, derived = JSON_TABLES[table]['columns'], JSON_TABLES[table].get('derived', {})
+    sql = (f"INSERT INTO {_stage_name(table)} (id,{','.join(_stage_columns(table))}) "
+           f"VALUES ({','.join('?' * (len(cols) + len(derived) + 1))})")
+    staged = rejected = 0
+    batch = []
+    for row in rows:
+        if not isinstance(row, dict):
+            rejected += 1
+            continue
+        row_id = row.get('id')
+        values = {c: _scalar(row.get(c)) for c in cols}
+        batch.append((row_id if isinstance(row_id, int) else None,) + tuple(values.values())
+                     + tuple(fn(values) for fn in derived.values()))
+        if len(batch) >= chunk_rows:
+            conn.executemany(sql, batch); staged += len(batch); batch = []
+    if batch:
+        conn.executemany(sql, batch); staged += len(batch)
+    return staged, rejected
+
+
+def _select_list(cols, alias='s'):
+    return ', '.join(f'COALESCE({alias}.{c}, {JSON_DEFAULTS[c]})' if c in JSON_DEFAULTS else f'{alias}.{c}'
+                     for c in cols)
+
+
+def _dedupe_stage(conn, table):
+    """Keep only the last staged row for each natural key, as row-by-row upserts would."""
+    key, stage = JSON_TABLES[table]['key'], _stage_name(table)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS temp.import_stage_{table}_key ON import_stage_{table} ({', '.join(key)})")
+    has_key = ' AND '.join(f"s.{k} IS NOT NULL AND s.{k} <> ''" for k in key)
+    conn.execute(f"DELETE FROM {stage} WHERE rowid IN (SELECT s.rowid FROM {stage} s WHERE {has_key} "
+                 f"AND s.rowid < (SELECT max(rowid) FROM {stage} d WHERE "
+                 f"{' AND '.join(f'd.{k} = s.{k}' for k in key)}))")
+    return has_key
+
+
+def _replace(conn, table, now):
+    cols = _stage_columns(table)
+    if 'derived' in JSON_TABLES[table]:  # the key is unique in the live table
+        _dedupe_stage(conn, table)
+    deleted = conn.execute(f"DELETE FROM {table}").rowcount
+    inserted = conn.execute(
+        f"INSERT INTO {table} (id,{','.join(cols)}) SELECT s.id, {_select_list(cols)} "
+        f"FROM {_stage_name(table)} s ORDER BY s.rowid", {'now': now}).rowcount
+    return {'deleted': deleted, 'inserted': inserted, 'updated': 0}
+
+
+def _merge(conn, table, now):
+    cols, key = _stage_columns(table), JSON_TABLES[table]['key']
+    stage = _stage_name(table)
+    has_key = _dedupe_stage(conn, table)
+    matches = ' AND '.join(f'{table}.{k} = s.{k}' for k in key)
+    assignments = ', '.join(f'{c} = COALESCE(s.{c}, {table}.{c})' if c in JSON_DEFAULTS else f'{c} = s.{c}'
+                            for c in cols if c not in key)
+    updated = conn.execute(f"UPDATE {table} SET {assignments} FROM {stage} s WHERE {has_key} AND {matches}").rowcount
+    inserted = conn.execute(
+        f"INSERT INTO {table} ({','.join(cols)}) SELECT {_select_list(cols)} FROM {stage} s "
+        f"WHERE NOT ({has_key}) OR NOT EXISTS (SELECT 1 FROM {table} WHERE {matches}) ORDER BY s.rowid",
+        {'now': now}).rowcount
+    return {'deleted': 0, 'inserted': inserted, 'updated': updated}
+
+
+def import_json(conn, f, mode='replace', chunk_rows=CHUNK_ROWS):
+    """Import the JSON document in text file ``f``; returns per-table counts and timings.
+
+    Only tables present in the document are touched. Nothing is written to the
+    live tables until the whole document has been parsed and staged, and then
+    all of them change in a single transaction; on any error nothing changes.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f'mode must be one of {", ".join(IMPORT_MODES)}')
+    start = time.perf_counter()
+    result = {'mode': mode, 'tables': {}}
+    try:
+        for table in JSON_TABLES:
+            cols = _stage_columns(table)
+            conn.execute(f"DROP TABLE IF EXISTS {_stage_name(table)}")
+            conn.execute(f"CREATE TABLE {_stage_name(table)} (id INTEGER, {', '.join(cols)})")
+        # staging writes only TEMP tables; an explicit DEFERRED transaction keeps the implicit
+        # BEGIN (IMMEDIATE on pooled connections, see alumni_core.db) from taking the write lock
+        # of the database file while the upload is parsed
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN DEFERRED")
+        for table, rows in iter_tables(f, JSON_TABLES):
+            t0 = time.perf_counter()
+            staged, rejected = _stage(conn, table, rows, chunk_rows)
+            stats = result['tables'].setdefault(table, {'rows': 0, 'rejected': 0, 'stage_s': 0.0})
+            stats['rows'] += staged; stats['rejected'] += rejected
+            stats['stage_s'] = round(stats['stage_s'] + time.perf_counter() - t0, 3)
+        conn.commit()
+        t0 = time.perf_counter()
+        now = _now()
+        conn.execute("BEGIN IMMEDIATE")
+        for table, stats in result['tables'].items():
+            t1 = time.perf_counter()
+            stats.update((_replace if mode == 'replace' else _merge)(conn, table, now))
+            stats['apply_s'] = round(time.perf_counter() - t1, 3)
+        conn.commit()
+        result['swap_s'] = round(time.perf_counter() - t0, 3)
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        for table in JSON_TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {_stage_name(table)}")
+    result['elapsed_s'] = round(time.perf_counter() - start, 3)
+    return result
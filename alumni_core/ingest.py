@@ -0,0 +1,289 @@
+"""Deduplicating alumni ingestion.
+
+Every path that adds alumni (the add form, ``POST /api/alumni``, the CSV
+import and the JSON import) goes through here, so uploading the same
+people twice updates them instead of adding them again.
+
+A person is identified by ``dedup_key``, derived from the record and backed
+by a unique index (migration 12):
+
+- ``e:<email>`` when there is an email, trimmed and lower-cased;
+- otherwise, when there is a phone number, ``n:<name>|<batch>|<phone>``:
+  the name without accents, punctuation, case or word order, the batch,
+  and the last 10 digits of the phone number;
+- NULL otherwise; such rows are never matched. A name and batch alone are
+  not enough: two classmates may share a name.
+
+``upsert()`` applies records in batches of ``BATCH``. Within a batch,
+records with the same key are folded into one first (a dict keyed by
+``dedup_key``). The rows already stored under those keys are read with one
+query, so each record is counted as inserted, updated or unchanged. Only
+the inserted and changed rows are written, with
+``INSERT ... ON CONFLICT(dedup_key) DO UPDATE``. A blank field never
+overwrites a stored value, so a sparse re-upload does not erase details.
+
+Rows stored before migration 12 have no key yet. Migration 14 keys every
+row and merges rows that turn out to be the same person into the older one
+(``backfill()``), in the migration's single transaction. On a large table
+that holds the write lock for minutes at the first start, so the same work
+can be done beforehand in ``BATCH`` rows per transaction, pausing between
+batches like ``alumni_core.maintenance`` (``dedupe()``)::
+
+    python -m alumni_core.ingest alumni.db --dedupe
+"""
+import datetime, re, sys, time, unicodedata
+
+BATCH = 1000
+BATCH_PAUSE = 0.05
+KEY_COLUMN = 'dedup_key'
+COLUMNS = ('name', 'batch', 'email', 'phone', 'company', 'bio')
+# tables pointing at alumni ids, repointed when two rows are merged
+REFERENCES = (('mentorships', 'alumni_id'),)
+PHONE_DIGITS = 10
+
+_NON_WORD = re.compile(r'[\W_]+')
+_NON_DIGIT = re.compile(r'\D+')
+_UPSERT = (
+    f"INSERT INTO alumni ({', '.join(COLUMNS)}, created_at, {KEY_COLUMN}) VALUES ({', '.join('?' * (len(COLUMNS) + 2))}) "
+    f"ON CONFLICT({KEY_COLUMN}) DO UPDATE SET "
+    + ', '.join(f"{c} = COALESCE(NULLIF(excluded.{c}, ''), {c})" for c in COLUMNS)
+    + ' WHERE ' + ' OR '.join(f"(excluded.{c} <> '' AND excluded.{c} IS NOT {c})" for c in COLUMNS))
+
+
+class DuplicateAlumni(ValueError):
+    """An edit would give a record the key of another one."""
+
+    def __init__(self, other_id):
+        super().__init__(f'alumni #{other_id} already has these details')
+        self.other_id = other_id
+
+
+def normalize_name(value):
+    text = unicodedata.normalize('NFKD', str(value or ''))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return ' '.join(sorted(_NON_WORD.sub(' ', text).split()))
+
+
+def normalize_phone(value):
+    return _NON_DIGIT.sub('', str(value or ''))[-PHONE_DIGITS:]
+
+
+def dedup_key(name, batch, email, phone):
+    email = str(email or '').strip().lower()
+    if email:
+        return 'e:' + email
+    name, phone = normalize_name(name), normalize_phone(phone)
+    if not name or not phone:
+        return None
+    return f"n:{name}|{' '.join(str(batch or '').split()).casefold()}|{phone}"
+
+
+def record_key(rec):
+    return dedup_key(rec['name'], rec['batch'], rec['email'], rec['phone'])
+
+
+def _clean(rec):
+    return {c: '' if rec.get(c) is None else str(rec[c]) for c in COLUMNS}
+
+
+def _merge(old, new):
+    """``old`` with every non-blank field of ``new``."""
+    return {c: new[c] if new[c] not in (None, '') else old[c] for c in COLUMNS}
+
+
+def _stored(conn, keys):
+    rows = {}
+    keys = list(keys)
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        for row in conn.execute(f"SELECT id, {KEY_COLUMN}, {', '.join(COLUMNS)} FROM alumni "
+                                f"WHERE {KEY_COLUMN} IN ({','.join('?' * len(chunk))})", chunk):
+            rows[row[1]] = row
+    return rows
+
+
+def _upsert_batch(conn, records, created_at):
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0}
+    keys = [record_key(r) for r in records]
+    folded = {}  # key -> the batch's records for it, merged in order
+    for key, rec in zip(keys, records):
+        if key is None:
+            continue
+        if key in folded:
+            folded[key] = _merge(folded[key], rec)
+            counts['duplicates'] += 1
+        else:
+            folded[key] = rec
+    stored = _stored(conn, folded)
+    writes = []
+    for key, rec in folded.items():
+        old = stored.get(key)
+        if old is None:
+            counts['inserted'] += 1
+        elif _merge(dict(zip(COLUMNS, old[2:])), rec) == dict(zip(COLUMNS, old[2:])):
+            counts['unchanged'] += 1
+            continue
+        else:
+            counts['updated'] += 1
+        writes.append(tuple(rec[c] for c in COLUMNS) + (created_at, key))
+    if writes:
+        conn.executemany(_UPSERT, writes)
+    ids = {}
+    new = [k for k in folded if k not in stored]
+    if new:
+        ids.update((k, row[0]) for k, row in _stored(conn, new).items())
+    ids.update((k, row[0]) for k, row in stored.items())
+    out = []
+    for key, rec in zip(keys, records):
+        if key is None:  # cannot be matched: always a new row
+            out.append(conn.execute(f"INSERT INTO alumni ({', '.join(COLUMNS)}, created_at) VALUES "
+                                    f"({', '.join('?' * (len(COLUMNS) + 1))})",
+                                    tuple(rec[c] for c in COLUMNS) + (created_at,)).lastrowid)
+            counts['inserted'] += 1
+        else:
+            out.append(ids[key])
+    return counts, out
+
+
+def upsert(conn, records, created_at=None, batch=BATCH):
+    """Insert or update alumni ``records`` (dicts of ``COLUMNS``) in the caller's transaction.
+
+    Returns ``{'inserted', 'updated', 'unchanged', 'duplicates', 'ids'}``:
+    ``duplicates`` counts records folded into an earlier one in the same
+    batch, and ``ids`` gives the stored row of every record, in order.
+    """
+    created_at = created_at or datetime.datetime.utcnow().isoformat()
+    result = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0, 'ids': []}
+    records = [_clean(r) for r in records]
+    for start in range(0, len(records), batch):
+        counts, ids = _upsert_batch(conn, records[start:start + batch], created_at)
+        for name, n in counts.items():
+            result[name] += n
+        result['ids'] += ids
+    return result
+
+
+def outcome(result):
+    """``'inserted'``, ``'updated'`` or ``'unchanged'`` for a single-record ``upsert()``."""
+    return next(name for name in ('inserted', 'updated', 'unchanged') if result[name])
+
+
+def update(conn, alumni_id, rec):
+    """Save an edit of one row, with its new key; raises ``DuplicateAlumni``."""
+    rec = _clean(rec)
+    key = record_key(rec)
+    other = conn.execute(f"SELECT id FROM alumni WHERE {KEY_COLUMN} = ? AND id <> ?", (key, alumni_id)).fetchone()
+    if other:
+        raise DuplicateAlumni(other[0])
+    conn.execute(f"UPDATE alumni SET {', '.join(f'{c}=?' for c in COLUMNS)}, {KEY_COLUMN}=? WHERE id=?",
+                 tuple(rec[c] for c in COLUMNS) + (key, alumni_id))
+
+
+def _absorb(conn, keep, drop, key):
+    """Fold row ``drop`` into row ``keep`` (dicts as stored) under ``key``; returns ``keep`` as it is now."""
+    older, newer = sorted((keep, drop), key=lambda r: r['id'])
+    merged = dict(_merge(older, newer), id=keep['id'], **{KEY_COLUMN: key},
+                  created_at=min((r['created_at'] for r in (older, newer) if r['created_at']), default=''))
+    for table, column in REFERENCES:
+        conn.execute(f"UPDATE {table} SET {column}=? WHERE {column}=?", (keep['id'], drop['id']))
+    conn.execute("DELETE FROM alumni WHERE id=?", (drop['id'],))
+    # only what differs, so merging an exact copy does not rewrite the row and its indexes
+    changed = [c for c in COLUMNS + ('created_at', KEY_COLUMN) if merged[c] != keep[c]]
+    if changed:
+        conn.execute(f"UPDATE alumni SET {', '.join(f'{c}=?' for c in changed)} WHERE id=?",
+                     tuple(merged[c] for c in changed) + (keep['id'],))
+    return merged
+
+
+def dedupe(conn, batch=BATCH, pause=BATCH_PAUSE):
+    """Key the rows that have no ``dedup_key`` and merge the duplicates among them.
+
+    When two rows are the same person the older row (lower id) is kept,
+    with the earlier ``created_at``. Each field takes the newer row's value
+    unless that is blank, and mentorships pointing at the newer row are
+    moved to the older one.
+    """
+    result = {'scanned': 0, 'keyed': 0, 'merged': 0, 'unkeyable': 0}
+    last = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last = _dedupe_batch(conn, last, batch, result)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if last is None:
+            return result
+        time.sleep(pause)
+
+
+def backfill(conn, batch=BATCH):
+    """``dedupe()`` in the caller's transaction (migration 14)."""
+    result = {'scanned': 0, 'keyed': 0, 'merged': 0, 'unkeyable': 0}
+    last = 0
+    while last is not None:
+        last = _dedupe_batch(conn, last, batch, result)
+    return result
+
+
+def _dedupe_batch(conn, last, batch, result):
+    """Key or merge up to ``batch`` unkeyed rows after id ``last``; the last id, or None when done."""
+    names = ('id',) + COLUMNS + ('created_at', KEY_COLUMN)
+    cols = ', '.join(names)
+    rows = [dict(zip(names, r)) for r in conn.execute(
+        f"SELECT {cols} FROM alumni WHERE {KEY_COLUMN} IS NULL AND id > ? ORDER BY id LIMIT ?", (last, batch))]
+    keys = {r['id']: record_key(r) for r in rows}
+    holders = {}
+    found = [k for k in set(keys.values()) if k is not None]
+    for start in range(0, len(found), 500):
+        chunk = found[start:start + 500]
+        for r in conn.execute(f"SELECT {cols} FROM alumni WHERE {KEY_COLUMN} IN ({','.join('?' * len(chunk))})", chunk):
+            holders[r[-1]] = dict(zip(names, r))
+    for row in rows:
+        key = keys[row['id']]
+        if key is None:
+            result['unkeyable'] += 1
+            continue
+        holder = holders.get(key)
+        if holder is None:
+            conn.execute(f"UPDATE alumni SET {KEY_COLUMN}=? WHERE id=?", (key, row['id']))
+            holders[key] = dict(row, **{KEY_COLUMN: key})
+            result['keyed'] += 1
+            continue
+        if holder['id'] < row['id']:
+            holders[key] = _absorb(conn, holder, row, key)
+        else:  # the keyed row is newer: it gives way and its key moves to the older one
+            holders[key] = _absorb(conn, row, holder, key)
+        result['merged'] += 1
+    result['scanned'] += len(rows)
+    return rows[-1]['id'] if len(rows) == batch else None
+
+
+def unkeyed(conn):
+    return conn.execute(f"SELECT count(*) FROM alumni WHERE {KEY_COLUMN} IS NULL").fetchone()[0]
+
+
+def main(argv=None):
+    import argparse
+    from alumni_core import db, migrations
+    parser = argparse.ArgumentParser(prog='python -m alumni_core.ingest', description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='key the rows stored before dedup keys and merge duplicates, a batch at a time')
+    args = parser.parse_args(argv)
+    conn = db.connect(args.database)
+    if args.dedupe:
+        # up to just before the backfill migration, which then has nothing left to do
+        migrations.migrate(conn, target=migrations.DEDUP_BACKFILL - 1)
+        start = time.perf_counter()
+        result = dedupe(conn)
+        print(f"{result} in {time.perf_counter() - start:.1f}s")
+    migrations.migrate(conn)
+    print(f'{unkeyed(conn)} rows without a dedup key')
+    conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
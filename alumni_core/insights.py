@@ -0,0 +1,150 @@
+"""Dashboard counts kept up to date by triggers.
+
+``insight_counts`` holds one row per (metric, key), e.g. ``('alumni_by_batch',
+'2019') -> 412``. Triggers on alumni, events and mentorships adjust the
+affected counters on every insert, delete and key-changing update, so the
+dashboard reads a handful of small index ranges instead of grouping whole
+tables on each view.
+
+The triggers are derived from ``METRICS``; ``install`` (run by migration 6)
+creates them and fills the table. If the counts ever drift, e.g. after rows
+were edited with triggers disabled, rebuild them::
+
+    python -m alumni_core.insights alumni.db --check
+    python -m alumni_core.insights alumni.db --rebuild
+"""
+import sys
+
+# (metric, table, key expression over row alias {r}, columns the key depends on)
+METRICS = (
+    ('alumni', 'alumni', "''", ()),
+    ('alumni_by_batch', 'alumni', "COALESCE({r}.batch, '')", ('batch',)),
+    ('alumni_by_company', 'alumni', "COALESCE({r}.company, '')", ('company',)),
+    ('events', 'events', "''", ()),
+    ('events_by_month', 'events', "substr(COALESCE({r}.date, ''), 1, 7)", ('date',)),
+    ('mentorships', 'mentorships', "''", ()),
+    ('mentorships_by_field', 'mentorships', "COALESCE({r}.field, '')", ('field',)),
+    ('mentorships_by_status', 'mentorships', "CASE WHEN {r}.approved = 0 THEN 'pending' ELSE 'approved' END",
+     ('approved',)),
+)
+TOTALS = ('alumni', 'events', 'mentorships')
+TOP = 10
+
+
+def _incr(metric, key):
+    return (f"INSERT INTO insight_counts (metric, key, cnt) VALUES ('{metric}', {key}, 1) "
+            f"ON CONFLICT (metric, key) DO UPDATE SET cnt = cnt + 1;")
+
+
+def _decr(metric, key):
+    return (f"UPDATE insight_counts SET cnt = cnt - 1 WHERE metric = '{metric}' AND key = {key};\n"
+            f"    DELETE FROM insight_counts WHERE metric = '{metric}' AND key = {key} AND cnt <= 0;")
+
+
+def trigger_sql():
+    """CREATE TRIGGER statements maintaining every metric in ``METRICS``."""
+    statements = []
+    for table in dict.fromkeys(t for _, t, _, _ in METRICS):
+        metrics = [(m, expr) for m, t, expr, _ in METRICS if t == table]
+        inserts = '\n    '.join(_incr(m, expr.format(r='new')) for m, expr in metrics)
+        deletes = '\n    '.join(_decr(m, expr.format(r='old')) for m, expr in metrics)
+        statements.append(f"CREATE TRIGGER insights_{table}_ai AFTER INSERT ON {table} BEGIN\n    {inserts}\nEND;")
+        statements.append(f"CREATE TRIGGER insights_{table}_ad AFTER DELETE ON {table} BEGIN\n    {deletes}\nEND;")
+    for metric, table, expr, cols in METRICS:
+        if not cols:
+            continue
+        old, new = expr.format(r='old'), expr.format(r='new')
+        statements.append(
+            f"CREATE TRIGGER insights_{metric}_au AFTER UPDATE OF {', '.join(cols)} ON {table} "
+            f"WHEN {old} IS NOT {new} BEGIN\n    {_decr(metric, old)}\n    {_incr(metric, new)}\nEND;")
+    return statements
+
+
+def install(conn):
+    """(Re)create the counts table and its triggers and fill it; runs in the caller's transaction."""
+    conn.execute("""CREATE TABLE IF NOT EXISTS insight_counts (
+        metric TEXT NOT NULL, key TEXT NOT NULL, cnt INTEGER NOT NULL,
+        PRIMARY KEY (metric, key)) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_insight_counts_top ON insight_counts(metric, cnt)")
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'insights\\_%' ESCAPE '\\'").fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+    for sql in trigger_sql():
+        conn.execute(sql)
+    _fill(conn)
+
+
+def _computed(conn):
+    rows = []
+    for metric, table, expr, _ in METRICS:
+        key = expr.format(r=table)
+        rows += conn.execute(f"SELECT ?, {key} AS k, COUNT(*) FROM {table} GROUP BY k", (metric,)).fetchall()
+    return {(m, k): c for m, k, c in rows}
+
+
+def _fill(conn):
+    conn.execute("DELETE FROM insight_counts")
+    conn.executemany("INSERT INTO insight_counts (metric, key, cnt) VALUES (?,?,?)",
+                     [(m, k, c) for (m, k), c in _computed(conn).items()])
+
+
+def rebuild(conn):
+    """Recount everything from the base tables in one transaction."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _fill(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def check(conn):
+    """Return ``[(metric, key, stored, actual)]`` for counters that have drifted."""
+    stored = {(m, k): c for m, k, c in conn.execute("SELECT metric, key, cnt FROM insight_counts")}
+    actual = _computed(conn)
+    return sorted((m, k, stored.get((m, k), 0), actual.get((m, k), 0))
+                  for m, k in set(stored) | set(actual) if stored.get((m, k), 0) != actual.get((m, k), 0))
+
+
+def summary(conn, top=TOP):
+    """Everything the dashboard shows: totals, top-N breakdowns and events per month."""
+    def ranked(metric):
+        return [{'key': k, 'count': c} for k, c in conn.execute(
+            "SELECT key, cnt FROM insight_counts WHERE metric=? ORDER BY cnt DESC, key LIMIT ?", (metric, top))]
+    totals = dict(conn.execute(
+        f"SELECT metric, cnt FROM insight_counts WHERE metric IN ({','.join('?' * len(TOTALS))}) AND key=''", TOTALS))
+    return {
+        'totals': {t: totals.get(t, 0) for t in TOTALS},
+        'alumni_by_batch': ranked('alumni_by_batch'),
+        'alumni_by_company': ranked('alumni_by_company'),
+        'events_by_month': [{'key': k, 'count': c} for k, c in conn.execute(
+            "SELECT key, cnt FROM insight_counts WHERE metric='events_by_month' ORDER BY key DESC LIMIT 24")],
+        'mentorships_by_field': ranked('mentorships_by_field'),
+        'mentorships_by_status': ranked('mentorships_by_status'),
+    }
+
+
+def main(argv=None):
+    import argparse
+    from alumni_core.db import connect
+    parser = argparse.ArgumentParser(prog='python -m alumni_core.insights', description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--rebuild', action='store_true', help='recount from the base tables')
+    parser.add_argument('--check', action='store_true', help='report counters that differ from a recount')
+    args = parser.parse_args(argv)
+    conn = connect(args.database)
+    if args.rebuild:
+        rebuild(conn)
+        print('insight counts rebuilt')
+    if args.check:
+        drift = check(conn)
+        for metric, key, stored, actual in drift:
+            print(f'DRIFT  {metric}[{key!r}]: stored {stored}, actual {actual}')
+        if drift:
+            return 1
+        print('insight counts match the base tables')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Incremental reading of ``{"table": [row, ...], ...}`` JSON documents.
+
+``iter_tables`` walks the top-level object of a file-like object without
+loading it: the text is read in blocks and each row is decoded on its own
+with ``JSONDecoder.raw_decode``, so memory is bounded by the largest single
+row rather than by the document. Keys not in ``tables`` are decoded and
+skipped::
+
+    for table, rows in iter_tables(f, ('alumni', 'events')):
+        for row in rows:
+            ...
+"""
+import json
+
+BLOCK_SIZE = 64 * 1024
+_WS = ' \t\n\r'
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class _Reader:
+    def __init__(self, f, block_size=BLOCK_SIZE):
+        self.f = f
+        self.block_size = block_size
+        self.buf = ''
+        self.pos = 0
+        self.base = 0  # characters dropped from the front of buf
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        data = self.f.read(self.block_size)
+        if isinstance(data, bytes):
+            raise TypeError('open the document in text mode')
+        if not data:
+            self.eof = True
+            return False
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the input."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        ch = self.peek()
+        if not ch or ch not in chars:
+            found = repr(ch) if ch else 'end of input'
+            raise JSONStreamError(f"expected {' or '.join(map(repr, chars))}, found {found} "
+                                  f"at character {self.base + self.pos}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise JSONStreamError(f'{e.msg} at character {self.base + e.pos}') from None
+            # a number ending exactly at the block edge may continue in the next block
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _rows(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_tables(f, tables):
+    """Yield ``(table, rows)`` for each list in ``tables``; drain ``rows`` before the next."""
+    reader = _Reader(f)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise JSONStreamError('object keys must be strings')
+        reader.expect(':')
+        if key in tables:
+            if reader.peek() != '[':
+                raise JSONStreamError(f'{key!r} must be a list of rows')
+            rows = _rows(reader)
+            yield key, rows
+            for _ in rows:
+                pass
+        else:
+            reader.value()
+        if reader.expect(',}') == '}':
+            break
+    if reader.peek():
+        raise JSONStreamError('unexpected data after the document')
@@ -0,0 +1,339 @@
+"""Background housekeeping: expired tokens, statistics, WAL checkpoints, free pages.
+
+Every worker runs a scheduler thread that looks for due jobs every
+``MAINTENANCE_TICK`` seconds. ``maintenance_jobs`` (migration 11) holds one
+row per job; a worker runs a job only after claiming that row with one
+``UPDATE``, which succeeds only if the job is due and nobody holds it. So
+each job runs once per interval however many workers and processes share
+the database. A lease that outlives ``LEASE`` seconds (a worker killed
+mid-job) is taken over. The row also records when the job last ran, how
+long it took and what it did, or the error; runs are also logged to the
+``alumni_core.maintenance`` logger (INFO, failures at ERROR with the
+traceback).
+
+- ``purge_tokens``: deletes expired password-reset tokens, ``BATCH`` rows
+  per transaction with a ``BATCH_PAUSE`` between them, so writers wait at
+  most about one batch.
+- ``checkpoint``: a PASSIVE WAL checkpoint, then a TRUNCATE if that copied
+  everything back; neither waits for readers or writers.
+- ``optimize``: ``ANALYZE`` for tables of ``ANALYZE_MIN_ROWS`` or more
+  whose statistics are missing or have drifted by 2x, sampling at most
+  ``ANALYSIS_LIMIT`` rows per index (what ``PRAGMA optimize`` does, with a
+  floor for small tables).
+- ``incremental_vacuum``: once more than ``VACUUM_MIN_FREE`` of the file is
+  free pages, hands them back to the filesystem, ``VACUUM_STEP`` pages per
+  transaction, pausing like the purge. This needs
+  ``auto_vacuum=INCREMENTAL``; new databases get it (``alumni_core.db``),
+  an existing one needs a full ``VACUUM`` once.
+
+Intervals are in seconds, ``MAINTENANCE_<JOB>_INTERVAL`` (0 turns a job
+off); ``MAINTENANCE_WORKER=0`` stops the thread, e.g. to run jobs from cron::
+
+    python -m alumni_core.maintenance alumni.db --status
+    python -m alumni_core.maintenance alumni.db --run purge_tokens,checkpoint
+    python -m alumni_core.maintenance alumni.db --vacuum
+"""
+import datetime, json, logging, os, random, socket, sys, threading, time
+from flask import current_app
+from alumni_core import metrics
+
+log = logging.getLogger(__name__)
+
+EXTENSION_KEY = 'alumni_maintenance'
+LEASE = 900
+BATCH = 1000
+# between batches: a writer waiting in SQLite's busy handler retries only every
+# few to 100 ms, and would keep missing a lock that is taken again at once
+BATCH_PAUSE = 0.05
+ANALYSIS_LIMIT = 1000
+ANALYZE_MIN_ROWS = 1000
+VACUUM_STEP = 250
+VACUUM_MIN_FREE = 0.05
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+def _iso(ts):
+    return ts.isoformat()
+
+
+def _wal_mb(conn):
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    wal = path + '-wal' if path else None
+    return round(os.path.getsize(wal) / 1e6, 2) if wal and os.path.exists(wal) else 0.0
+
+
+def purge_tokens(conn, batch=BATCH):
+    """Delete password-reset tokens that have expired."""
+    now, deleted, batches = _iso(_now()), 0, 0
+    while True:
+        n = conn.execute("DELETE FROM pw_reset_tokens WHERE id IN "
+                         "(SELECT id FROM pw_reset_tokens WHERE expires_at < ? LIMIT ?)", (now, batch)).rowcount
+        conn.commit()
+        deleted += n
+        batches += 1
+        if n < batch:
+            return {'deleted': deleted, 'batches': batches}
+        time.sleep(BATCH_PAUSE)
+
+
+def checkpoint(conn):
+    """Copy the WAL back into the database without waiting on anyone."""
+    before = _wal_mb(conn)
+    busy, wal_frames, done = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    mode = 'passive'
+    if not busy and wal_frames > 0 and wal_frames == done:
+        # everything is in the database: try to shrink the WAL file, but give up at once if it is in use
+        timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        conn.execute("PRAGMA busy_timeout=0")
+        try:
+            if not conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0]:
+                mode = 'truncate'
+        finally:
+            conn.execute(f"PRAGMA busy_timeout={timeout}")
+    return {'mode': mode, 'wal_pages': wal_frames, 'checkpointed': done, 'busy': bool(busy),
+            'wal_mb_before': before, 'wal_mb_after': _wal_mb(conn)}
+
+
+def optimize(conn, limit=ANALYSIS_LIMIT, min_rows=ANALYZE_MIN_ROWS):
+    """ANALYZE each indexed table whose statistics are missing or off by 2x or more.
+
+    Tables under ``min_rows`` are left alone: without statistics the planner
+    assumes an index pays off, which is what the hot queries are checked
+    against (``python -m alumni_core.migrations --check``), and with them it
+    would rightly scan a handful of rows instead.
+    """
+    conn.execute(f"PRAGMA analysis_limit={limit}")
+    has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+    analyzed = {}
+    tables = [r[0] for r in conn.execute("SELECT DISTINCT tbl_name FROM sqlite_master WHERE type = 'index' "
+                                         "AND tbl_name NOT LIKE 'sqlite\\_%' ESCAPE '\\' ORDER BY tbl_name")]
+    for table in tables:
+        rows = conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+        if rows < min_rows:
+            continue
+        stat = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)).fetchone() if has_stats else None
+        known = int(stat[0].split()[0]) if stat else 0
+        if known and known / 2 < rows < known * 2:
+            continue
+        conn.execute(f'ANALYZE "{table}"')
+        has_stats = True
+        analyzed[table] = rows
+    conn.commit()
+    return {'tables': len(tables), 'analyzed': analyzed}
+
+
+def incremental_vacuum(conn, step=VACUUM_STEP, min_free=VACUUM_MIN_FREE):
+    """Return free pages to the filesystem in short write transactions."""
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    result = {'free_pages': free, 'page_count': pages, 'freed_pages': 0}
+    if mode != 2:
+        result['skipped'] = 'auto_vacuum is not INCREMENTAL (run a full VACUUM once with --vacuum)'
+        return result
+    if free <= pages * min_free:
+        return result
+    while free:
+        # executescript() steps the pragma to the end; execute() stops after one page
+        try:
+            conn.executescript(f"BEGIN IMMEDIATE; PRAGMA incremental_vacuum({int(step)}); COMMIT;")
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if left >= free:
+            break
+        result['freed_pages'] += free - left
+        free = left
+        time.sleep(BATCH_PAUSE)
+    result['free_pages'] = free
+    result['freed_mb'] = round(result['freed_pages'] * page_size / 1e6, 2)
+    return result
+
+
+def full_vacuum(conn):
+    """Rebuild the file and switch it to incremental auto-vacuum; blocks writers while it runs."""
+    if conn.in_transaction:
+        conn.commit()
+    start = time.perf_counter()
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    after = conn.execute("PRAGMA page_count").fetchone()[0]
+    return {'pages_before': before, 'pages_after': after, 'seconds': round(time.perf_counter() - start, 2)}
+
+
+JOBS = {
+    'purge_tokens': (purge_tokens, 3600),
+    'checkpoint': (checkpoint, 300),
+    'optimize': (optimize, 6 * 3600),
+    'incremental_vacuum': (incremental_vacuum, 3600),
+}
+
+
+class Scheduler:
+    def __init__(self, pool, intervals=None, tick=60.0, lease=LEASE):
+        self.pool = pool
+        self.intervals = {name: every for name, (_, every) in JOBS.items()}
+        self.intervals.update(intervals or {})
+        self.tick = tick
+        self.lease = lease
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {name: {'runs': 0, 'errors': 0, 'seconds': 0.0} for name in JOBS}
+
+    def _owner(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def _claim(self, conn, name, force):
+        now = _now()
+        due = _iso(now - datetime.timedelta(seconds=self.intervals[name]))
+        conn.execute("INSERT OR IGNORE INTO maintenance_jobs (name) VALUES (?)", (name,))
+        claimed = conn.execute(
+            "UPDATE maintenance_jobs SET owner = ?, lease_until = ?, started_at = ? "
+            "WHERE name = ? AND (lease_until IS NULL OR lease_until < ?) "
+            "AND (? OR started_at IS NULL OR started_at <= ?)",
+            (self._owner(), _iso(now + datetime.timedelta(seconds=self.lease)), _iso(now),
+             name, _iso(now), int(force), due)).rowcount == 1
+        conn.commit()
+        return claimed
+
+    def run(self, name, force=False):
+        """Run job ``name`` if it is due and free (``force``: if free); returns its report or None."""
+        job = JOBS[name][0]
+        with self.pool.connection() as conn:
+            if not self._claim(conn, name, force):
+                return None
+            start = time.perf_counter()
+            result = error = None
+            try:
+                result = job(conn)
+            except Exception as e:  # recorded on the job's row; the scheduler carries on
+                conn.rollback()
+                error = f'{type(e).__name__}: {e}'
+                log.exception('maintenance job %s failed', name)
+            seconds = time.perf_counter() - start
+            conn.execute("UPDATE maintenance_jobs SET lease_until = NULL, finished_at = ?, seconds = ?, "
+                         "result = ?, error = ?, runs = runs + 1 WHERE name = ? AND owner = ?",
+                         (_iso(_now()), round(seconds, 4), json.dumps(result), error, name, self._owner()))
+            conn.commit()
+        with self._lock:
+            stats = self._stats[name]
+            stats['runs'] += 1
+            stats['errors'] += error is not None
+            stats['seconds'] += seconds
+        if error is None:
+            log.info('maintenance job %s: %.3fs %s', name, seconds, json.dumps(result))
+        return {'job': name, 'seconds': round(seconds, 4), 'result': result, 'error': error}
+
+    def run_due(self):
+        return [r for r in (self.run(name) for name, every in self.intervals.items() if every) if r]
+
+    # ----- worker thread -----
+
+    def _run(self):
+        # workers started together should not all look at the same moment
+        self._stop.wait(random.uniform(0, self.tick))
+        while not self._stop.is_set():
+            try:
+                self.run_due()
+            except Exception:  # e.g. the database is locked; try again next tick
+                log.exception('maintenance scheduler')
+            self._stop.wait(self.tick)
+
+    def ensure_started(self):
+        """Start this process's scheduler thread (again, after a fork)."""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='alumni-maintenance', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self, conn=None):
+        with self._lock:
+            stats = {'intervals': dict(self.intervals),
+                     'worker': {k: dict(v, seconds=round(v['seconds'], 3)) for k, v in self._stats.items()}}
+        if conn is not None:
+            stats['jobs'] = {r['name']: {k: (json.loads(r[k]) if k == 'result' and r[k] else r[k]) for k in r.keys() if k != 'name'}
+                             for r in conn.execute("SELECT * FROM maintenance_jobs ORDER BY name")}
+        return stats
+
+
+def settings_from_env(environ=os.environ):
+    intervals = {name: float(environ[f'MAINTENANCE_{name.upper()}_INTERVAL'])
+                 for name in JOBS if f'MAINTENANCE_{name.upper()}_INTERVAL' in environ}
+    return {'intervals': intervals, 'tick': float(environ.get('MAINTENANCE_TICK', 60))}
+
+
+def _metric_families(app):
+    jobs = get_scheduler(app).stats()['worker']
+    return [
+        ('alumni_maintenance_runs_total', 'counter', 'Maintenance jobs run by this worker, by outcome.',
+         [((('job', j), ('outcome', 'error')), v['errors']) for j, v in jobs.items()] +
+         [((('job', j), ('outcome', 'ok')), v['runs'] - v['errors']) for j, v in jobs.items()]),
+        ('alumni_maintenance_seconds_total', 'counter', 'Time spent in maintenance jobs.',
+         [((('job', j),), v['seconds']) for j, v in jobs.items()]),
+    ]
+
+
+def init_app(app, pool):
+    """Install the scheduler; its thread starts with the first request of each worker."""
+    scheduler = Scheduler(pool, **settings_from_env())
+    app.extensions[EXTENSION_KEY] = scheduler
+    metrics.register_collector(app, lambda: _metric_families(app))
+    if os.environ.get('MAINTENANCE_WORKER', '1') != '0':
+        app.before_request(scheduler.ensure_started)
+    return scheduler
+
+
+def get_scheduler(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
+
+
+def main(argv=None):
+    import argparse
+    from alumni_core.db import ConnectionPool, pragmas_from_env
+    parser = argparse.ArgumentParser(prog='python -m alumni_core.maintenance', description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--run', help=f"comma-separated jobs, or 'all' ({', '.join(JOBS)}), run now unless another process holds them")
+    parser.add_argument('--due', action='store_true', help='run the jobs that are due, as the scheduler would')
+    parser.add_argument('--vacuum', action='store_true', help='full VACUUM, switching the file to incremental auto-vacuum')
+    parser.add_argument('--status', action='store_true', help='print when each job last ran and what it did')
+    args = parser.parse_args(argv)
+    pool = ConnectionPool(args.database, size=1, pragmas=pragmas_from_env())
+    scheduler = Scheduler(pool, **settings_from_env())
+    if args.vacuum:
+        with pool.connection() as conn:
+            print(json.dumps(full_vacuum(conn)))
+    names = list(JOBS) if args.run == 'all' else [n for n in (args.run or '').split(',') if n]
+    unknown = [n for n in names if n not in JOBS]
+    if unknown:
+        parser.error(f"unknown job(s) {', '.join(unknown)}")
+    for name in names:
+        report = scheduler.run(name, force=True)
+        print(json.dumps(report) if report else f'{name}: running in another process, skipped')
+    for report in scheduler.run_due() if args.due else ():
+        print(json.dumps(report))
+    if args.status or not (names or args.due or args.vacuum):
+        with pool.connection() as conn:
+            print(json.dumps(scheduler.stats(conn)['jobs'], indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
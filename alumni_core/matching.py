@@ -0,0 +1,185 @@
+"""Ranked mentor suggestions for mentorship requests.
+
+Mentors come from the ``mentor_index`` FTS5 table (migration 9): one
+document per alumnus (company and bio) and one per *approved* mentor
+application (field and note). Triggers on ``alumni`` and
+``mentor_applications`` keep it current on every insert, edit, approval,
+rejection and delete, so there is nothing to rebuild after a write. The
+rowid says where a document came from: ``id * 2`` for an alumnus,
+``id * 2 + 1`` for an application.
+
+A request is matched by the words of its field, title and note (minus
+filler such as "looking for help with"), most specific first: mentors who
+mention the field (as a phrase) and every other word, then those who
+mention the field and one of the words or have volunteered (an approved
+application), then anyone matching any of them, until there are ``k``.
+Each step is ranked with bm25, a match in the mentor's field weighing more
+than one in the bio. Narrow steps touch few index entries, which is what
+keeps a lookup in the low milliseconds at 100k mentors.
+
+``propose(conn)`` does this for every open request at once and spreads
+the proposals so that no mentor gets more than ``capacity`` students::
+
+    python -m alumni_core.matching alumni.db --mentorship 42
+    python -m alumni_core.matching alumni.db --propose --capacity 2
+"""
+import collections, re, sys, time
+
+# bm25 column weights, in mentor_index column order: name (not indexed), kind, field, body
+WEIGHTS = (0.0, 1.0, 4.0, 1.0)
+# every query also matches approved applicants, so volunteering counts like a matching word
+VOLUNTEER = 'kind : "application"'
+MAX_TERMS = 12
+STOPWORDS = frozenset("""
+    a about an and any are as at be been by can for from get getting guidance help i in into is it looking me mentor
+    mentoring mentorship my need of on or some someone the to want with would you your
+""".split())
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def mentor_ref(rowid):
+    """``('alumni', id)`` or ``('application', id)`` for a ``mentor_index`` rowid."""
+    return ('application', rowid // 2) if rowid % 2 else ('alumni', rowid // 2)
+
+
+def _words(text):
+    return [w for w in _WORD.findall((text or '').lower()) if len(w) > 1 and w not in STOPWORDS]
+
+
+def build_queries(field, *texts):
+    """FTS5 MATCH expressions for a request, most specific first."""
+    phrase = ' '.join(_WORD.findall((field or '').lower()))
+    terms = []
+    for w in _words(' '.join(t or '' for t in texts)):
+        if w not in terms and w not in phrase.split():
+            terms.append(w)
+    terms = [f'"{w}"' for w in terms[:MAX_TERMS]]
+    if not phrase:
+        queries = [' AND '.join(terms), ' OR '.join(terms)]
+    elif not terms:
+        queries = [f'"{phrase}"']
+    else:
+        queries = [f'"{phrase}" AND ' + ' AND '.join(terms), f'"{phrase}" AND ({" OR ".join(terms + [VOLUNTEER])})',
+                   ' OR '.join([f'"{phrase}"'] + terms)]
+    return [q for i, q in enumerate(queries) if q and q not in queries[:i]]
+
+
+def rank(conn, match, k=10, exclude=()):
+    """The ``k`` best mentors for a MATCH expression, best first."""
+    if not match:
+        return []
+    sql = f"""
+        SELECT rowid, name, field,
+               bm25(mentor_index, {', '.join(map(str, WEIGHTS))}) AS score
+        FROM mentor_index WHERE mentor_index MATCH ?
+        ORDER BY score, rowid LIMIT ?"""
+    items = []
+    for row in conn.execute(sql, (match, k + len(exclude))):
+        if row['rowid'] in exclude:
+            continue
+        kind, ref = mentor_ref(row['rowid'])
+        items.append({'kind': kind, 'id': ref, 'key': row['rowid'], 'name': row['name'], 'field': row['field'],
+                      'score': round(-row['score'], 4)})
+    return items[:k]
+
+
+def candidates(conn, field, title, note, k=10):
+    items = []
+    for match in build_queries(field, title, note):
+        items += rank(conn, match, k - len(items), exclude={m['key'] for m in items})
+        if len(items) >= k:
+            break
+    return items
+
+
+def matches(conn, mentorship_id, k=10):
+    """Top ``k`` mentors for one request, or None if it does not exist."""
+    row = conn.execute("SELECT id, title, student_name, field, note FROM mentorships WHERE id = ?", (mentorship_id,)).fetchone()
+    if row is None:
+        return None
+    return {'mentorship': dict(row), 'k': k, 'matches': candidates(conn, row['field'], row['title'], row['note'], k)}
+
+
+def open_requests(conn):
+    # rows approve_mentor() files for the mentor themselves have student_name ''; requests posted
+    # without a student (NULL) are still open, and `<> ''` would leave them out as well
+    return conn.execute("SELECT id, title, field, note FROM mentorships WHERE approved = 1 AND student_name IS NOT '' "
+                        "ORDER BY created_at, id").fetchall()
+
+
+def propose(conn, k=3, capacity=2, depth=20, max_depth=1000):
+    """A mentor for every open request, oldest first, at most ``capacity`` students each.
+
+    Each request takes its best-ranked mentor who still has room; ``k - 1``
+    runners-up are returned as alternatives. Requests with the same words
+    share one index lookup of the ``depth`` best mentors, which is repeated
+    four times as deep (up to ``max_depth``) once those are all taken.
+    """
+    start = time.perf_counter()
+    load = collections.Counter()
+    looked_up = {}
+    lookups = 0
+    proposals, unmatched = [], []
+    for row in open_requests(conn):
+        words = (row['field'] or '', tuple(sorted(set(_words(f"{row['title']} {row['note']}")))))
+        found = looked_up.get(words)
+        limit = max(depth, k)
+        while True:
+            if found is None:
+                found = looked_up[words] = candidates(conn, row['field'], row['title'], row['note'], limit)
+                lookups += 1
+            free = [m for m in found if load[m['key']] < capacity][:k]
+            if len(free) >= k or len(found) < limit or limit >= max_depth:
+                break
+            limit, found = min(len(found) * 4, max_depth), None
+        if not free:
+            unmatched.append(row['id'])
+            continue
+        load[free[0]['key']] += 1
+        proposals.append({'mentorship_id': row['id'], 'mentor': free[0], 'alternatives': free[1:]})
+    return {'proposals': proposals, 'unmatched': unmatched,
+            'stats': {'open': len(proposals) + len(unmatched), 'proposed': len(proposals), 'mentors': len(load),
+                      'lookups': lookups, 'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)}}
+
+
+def rebuild(conn):
+    """Re-index every alumnus and approved application (repair after manual edits)."""
+    conn.execute("DELETE FROM mentor_index")
+    conn.execute("INSERT INTO mentor_index(rowid, name, kind, field, body) SELECT id * 2, name, 'alumni', company, bio FROM alumni")
+    conn.execute("INSERT INTO mentor_index(rowid, name, kind, field, body) "
+                 "SELECT id * 2 + 1, name, 'application', field, note FROM mentor_applications WHERE status = 'approved'")
+    # merge the segments: until then every lookup also reads the deleted entries
+    conn.execute("INSERT INTO mentor_index(mentor_index) VALUES ('optimize')")
+    conn.commit()
+
+
+def main(argv=None):
+    import argparse, json
+    from alumni_core.db import connect
+    parser = argparse.ArgumentParser(prog='python -m alumni_core.matching', description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--mentorship', type=int, metavar='ID', help='rank mentors for one request')
+    action.add_argument('--propose', action='store_true', help='propose a mentor for every open request')
+    action.add_argument('--rebuild', action='store_true', help='rebuild mentor_index from its tables')
+    parser.add_argument('-k', type=int, default=None, help='mentors per request (10 for --mentorship, 3 for --propose)')
+    parser.add_argument('--capacity', type=int, default=2, help='students per mentor for --propose')
+    args = parser.parse_args(argv)
+    conn = connect(args.database)
+    if args.rebuild:
+        rebuild(conn)
+        return 0
+    if args.propose:
+        result = propose(conn, args.k or 3, args.capacity)
+    else:
+        result = matches(conn, args.mentorship, args.k or 10)
+        if result is None:
+            print(f'no mentorship {args.mentorship}', file=sys.stderr)
+            return 1
+    json.dump(result, sys.stdout, indent=1, ensure_ascii=False)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""Request, SQL, template and JSON timings in Prometheus format.
+
+``init_app`` times every request by endpoint and the three places a request
+usually spends its time:
+
+* SQL: the pool hands out ``TimedConnection``\\ s, so every statement run with
+  ``execute``/``executemany``/``executescript`` (on the connection or a
+  cursor) is counted and timed by statement type. Rows fetched with
+  ``fetchone``/``fetchmany``/``fetchall`` add to the statement's time;
+  iterating a cursor directly (the streaming exports) is not timed.
+* templates: ``render_template``, through Flask's template signals;
+* JSON: ``jsonify`` and ``app.json.dumps``, through a timing JSON provider.
+
+The pool's counters are exported too, and other modules that keep totals
+(hashing, caches, change feed, maintenance, snapshots, admission) add their
+own with ``register_collector`` from their ``init_app``. ``/metrics`` serves
+everything in the Prometheus text format. Statements slower than
+``SLOW_QUERY_MS`` go to the ``alumni.slow_query`` logger (and to
+``SLOW_QUERY_LOG`` if set).
+
+Counters live in each worker process: with several gunicorn workers, each
+scrape sees the worker that answered it.
+"""
+import contextvars, hmac, logging, os, re, sqlite3, threading
+from bisect import bisect_left
+from time import perf_counter
+from flask import Response, before_render_template, current_app, g, has_request_context, request, template_rendered
+
+EXTENSION_KEY = 'alumni_metrics'
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENTS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH', 'BEGIN', 'COMMIT', 'ROLLBACK',
+              'CREATE', 'DROP', 'PRAGMA', 'ANALYZE'}
+LOCAL_ADDRS = {'127.0.0.1', '::1'}
+
+slow_log = logging.getLogger('alumni.slow_query')
+# [statements, sql, templates, json, start] of the request being served; cheaper than flask.g per statement
+_request_spent = contextvars.ContextVar('alumni_metrics_spent', default=None)
+
+HELP = {
+    'alumni_requests_total': ('counter', 'Requests by endpoint, method and status.'),
+    'alumni_request_duration_seconds': ('histogram', 'Time from the first before_request hook to the response (streamed bodies excluded).'),
+    'alumni_sql_statements_total': ('counter', 'SQL statements executed, by statement type.'),
+    'alumni_sql_duration_seconds': ('histogram', 'Time in SQLite per statement, executing and fetching.'),
+    'alumni_request_sql_statements_total': ('counter', 'SQL statements executed while serving each endpoint.'),
+    'alumni_request_sql_seconds_total': ('counter', 'Time in SQLite while serving each endpoint.'),
+    'alumni_slow_queries_total': ('counter', 'Statements slower than SLOW_QUERY_MS.'),
+    'alumni_template_duration_seconds': ('histogram', 'render_template time by template.'),
+    'alumni_json_duration_seconds': ('histogram', 'JSON serialization time of jsonify and app.json.dumps (session cookies included).'),
+}
+
+_KINDS = {}
+_WORD = re.compile(r'\s*(\w+)')
+
+
+def statement_kind(sql):
+    kind = _KINDS.get(sql)
+    if kind is None:
+        m = _WORD.match(sql)
+        kind = m.group(1).upper() if m else ''
+        kind = kind if kind in STATEMENTS else 'OTHER'
+        if len(_KINDS) > 2048:
+            _KINDS.clear()
+        _KINDS[sql] = kind
+    return kind
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """Counters and histograms keyed by ``(name, labels)``; labels are tuples of pairs."""
+
+    def __init__(self, slow_query_ms=0):
+        self.slow_query_s = slow_query_ms / 1000.0 if slow_query_ms else None
+        self.collectors = []
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._sql = {}  # statement kind -> Histogram; the hot path, kept apart
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = Histogram()
+            h.observe(value)
+
+    def sql(self, kind, seconds, statements=1):
+        with self._lock:
+            h = self._sql.get(kind)
+            if h is None:
+                h = self._sql[kind] = Histogram()
+            if statements:
+                h.observe(seconds)
+            else:  # rows fetched after the statement ran: time only
+                h.sum += seconds
+        spent = _request_spent.get()
+        if spent is not None:
+            spent[0] += statements
+            spent[1] += seconds
+
+    def slow(self, sql, seconds):
+        self.inc('alumni_slow_queries_total')
+        endpoint = request.endpoint if has_request_context() else None
+        slow_log.warning('%.1f ms %s: %s', seconds * 1000, endpoint or '-', ' '.join(sql.split())[:500])
+
+    def add_collector(self, fn):
+        """``fn()`` returns ``[(name, type, help, [(labels, value), ...]), ...]`` at scrape time."""
+        self.collectors.append(fn)
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(k, (list(h.counts), h.sum)) for k, h in self._histograms.items()]
+            for kind, h in self._sql.items():
+                counters.append((('alumni_sql_statements_total', (('statement', kind),)), sum(h.counts)))
+                histograms.append((('alumni_sql_duration_seconds', (('statement', kind),)), (list(h.counts), h.sum)))
+        counters.sort()
+        histograms.sort()
+        lines, seen = [], set()
+
+        def header(name, kind=None, text=None):
+            if name not in seen:
+                seen.add(name)
+                kind, text = HELP.get(name, (kind, text))
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f'{name}{_labels(labels)} {value:g}')
+        for (name, labels), (counts, total) in histograms:
+            header(name)
+            running = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                running += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {running}')
+            lines.append(f'{name}_sum{_labels(labels)} {total:.6f}')
+            lines.append(f'{name}_count{_labels(labels)} {running}')
+        for collect in self.collectors:
+            for name, kind, text, samples in collect():
+                header(name, kind, text)
+                lines.extend(f'{name}{_labels(labels)} {value:g}' for labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class TimedCursor(sqlite3.Cursor):
+    metrics = None  # set on the per-app subclass made by connection_factory()
+    _kind = _sql = _spent = None
+
+    def _executed(self, sql, seconds):
+        metrics = self.metrics
+        self._sql, self._kind, self._spent = sql, statement_kind(sql), seconds
+        metrics.sql(self._kind, seconds)
+        if metrics.slow_query_s is not None and seconds >= metrics.slow_query_s:
+            self._spent = None  # logged; don't log it again while fetching
+            metrics.slow(sql, seconds)
+
+    def _fetched(self, seconds):
+        if self._kind is None:
+            return
+        metrics = self.metrics
+        metrics.sql(self._kind, seconds, statements=0)
+        if self._spent is not None and metrics.slow_query_s is not None:
+            self._spent += seconds
+            if self._spent >= metrics.slow_query_s:
+                metrics.slow(self._sql, self._spent)
+                self._spent = None
+
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return sqlite3.Cursor.execute(self, sql, parameters)
+        finally:
+            self._executed(sql, perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return sqlite3.Cursor.executemany(self, sql, seq_of_parameters)
+        finally:
+            self._executed(sql, perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = perf_counter()
+        try:
+            return sqlite3.Cursor.executescript(self, sql_script)
+        finally:
+            self._executed(sql_script, perf_counter() - start)
+
+    def fetchone(self):
+        start = perf_counter()
+        try:
+            return sqlite3.Cursor.fetchone(self)
+        finally:
+            self._fetched(perf_counter() - start)
+
+    def fetchmany(self, size=None):
+        start = perf_counter()
+        try:
+            return sqlite3.Cursor.fetchmany(self, self.arraysize if size is None else size)
+        finally:
+            self._fetched(perf_counter() - start)
+
+    def fetchall(self):
+        start = perf_counter()
+        try:
+            return sqlite3.Cursor.fetchall(self)
+        finally:
+            self._fetched(perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    cursor_class = TimedCursor
+
+    def cursor(self, factory=None):
+        return sqlite3.Connection.cursor(self, factory or self.cursor_class)
+
+    # the C shortcuts would bypass the cursor's methods; go through them instead
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connection_factory(metrics):
+    """A ``sqlite3.Connection`` subclass that reports to ``metrics``."""
+    cursor = type('TimedCursor', (TimedCursor,), {'metrics': metrics})
+    return type('TimedConnection', (TimedConnection,), {'cursor_class': cursor})
+
+
+class _TimedJSON:
+    metrics = None  # set by init_app
+
+    def dumps(self, obj, **kwargs):
+        start = perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            seconds = perf_counter() - start
+            self.metrics.observe('alumni_json_duration_seconds', (), seconds)
+            spent = _request_spent.get()
+            if spent is not None:
+                spent[3] += seconds
+
+
+def _before_request():
+    g._metrics_token = _request_spent.set([0, 0, 0.0, 0.0, perf_counter()])  # + start
+
+
+def _after_request(resp):
+    token = g.pop('_metrics_token', None)
+    if token is None:
+        return resp
+    statements, sql, templates, json_s, start = token.var.get()
+    _request_spent.reset(token)
+    seconds = perf_counter() - start
+    metrics = get_metrics()
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+    metrics.observe('alumni_request_duration_seconds', (('endpoint', endpoint), ('method', method)), seconds)
+    metrics.inc('alumni_requests_total', (('endpoint', endpoint), ('method', method), ('status', resp.status_code)))
+    if statements:
+        metrics.inc('alumni_request_sql_statements_total', (('endpoint', endpoint),), statements)
+        metrics.inc('alumni_request_sql_seconds_total', (('endpoint', endpoint),), sql)
+    if current_app.config['METRICS_SERVER_TIMING']:
+        resp.headers['Server-Timing'] = (f'sql;dur={sql * 1000:.2f};desc="{statements} statements", '
+                                         f'tpl;dur={templates * 1000:.2f}, json;dur={json_s * 1000:.2f}, '
+                                         f'total;dur={seconds * 1000:.2f}')
+    return resp
+
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault('_metrics_templates', []).append(perf_counter())
+
+
+def _template_rendered(sender, template, context, **extra):
+    stack = g.get('_metrics_templates')
+    if not stack:
+        return
+    seconds = perf_counter() - stack.pop()
+    get_metrics(sender).observe('alumni_template_duration_seconds', (('template', template.name or '-'),), seconds)
+    spent = _request_spent.get()
+    if spent is not None:
+        spent[2] += seconds
+
+
+def _metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        given = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(given.encode(), f'Bearer {token}'.encode()):
+            return Response('forbidden\n', 403, mimetype='text/plain')
+    elif request.remote_addr not in LOCAL_ADDRS:
+        return Response('forbidden: set METRICS_TOKEN to scrape from elsewhere\n', 403, mimetype='text/plain')
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
+
+
+def _pool_collector(app):
+    def collect():
+        pool = app.extensions['alumni_db'].stats()
+        families = [
+            ('alumni_db_pool_connections', 'gauge', 'Pooled SQLite connections by state.',
+             [((('state', 'in_use'),), pool['in_use']), ((('state', 'idle'),), pool['idle']), ((('state', 'open'),), pool['open'])]),
+            ('alumni_db_pool_waits_total', 'counter', 'Acquires that had to wait for a connection.', [((), pool['waits'])]),
+            ('alumni_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.', [((), pool['wait_time'])]),
+            ('alumni_db_pool_timeouts_total', 'counter', 'Acquires that gave up.', [((), pool['timeouts'])]),
+        ]
+        return families
+    return collect
+
+
+def init_app(app):
+    """Instrument ``app``; call right after ``db.init_app`` so request timing starts first.
+
+    ``METRICS_ENABLED=0`` turns all of it off. ``SLOW_QUERY_MS`` logs slower
+    statements, ``METRICS_TOKEN`` lets ``/metrics`` be scraped from other
+    hosts and ``METRICS_SERVER_TIMING=1`` adds a Server-Timing header.
+    """
+    if str(app.config.get('METRICS_ENABLED') or os.environ.get('METRICS_ENABLED', '1')).lower() in ('0', 'false', 'no', 'off'):
+        return None
+    metrics = Metrics(float(app.config.get('SLOW_QUERY_MS') or os.environ.get('SLOW_QUERY_MS', 0)))
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+    app.config.setdefault('METRICS_SERVER_TIMING', os.environ.get('METRICS_SERVER_TIMING', '0') not in ('0', ''))
+    slow_file = app.config.get('SLOW_QUERY_LOG') or os.environ.get('SLOW_QUERY_LOG')
+    if slow_file and metrics.slow_query_s is not None:
+        handler = logging.FileHandler(slow_file)
+        handler.setFormatter(logging.Formatter('%(asctime)s pid=%(process)d %(message)s'))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.WARNING)
+    app.extensions[EXTENSION_KEY] = metrics
+    app.extensions['alumni_db'].factory = connection_factory(metrics)
+    app.json = type('TimedJSONProvider', (_TimedJSON, type(app.json)), {'metrics': metrics})(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_rendered, app)
+    metrics.add_collector(_pool_collector(app))
+    app.add_url_rule('/metrics', 'metrics', _metrics_view)
+    return metrics
+
+
+def get_metrics(app=None):
+    return (app or current_app).extensions.get(EXTENSION_KEY)
+
+
+def register_collector(app, fn):
+    """Export ``fn()``'s families (see ``Metrics.add_collector``) on ``app``'s ``/metrics``; a no-op when metrics are off."""
+    metrics = get_metrics(app)
+    if metrics is not None:
+        metrics.add_collector(fn)
@@ -0,0 +1,474 @@
+"""Versioned schema migrations shared by both apps.
+
+The schema version is kept in SQLite's ``PRAGMA user_version``. ``migrate()``
+applies every registered migration above that version in order, each in its
+own ``BEGIN IMMEDIATE`` transaction, so concurrent workers starting at the
+same time apply each step exactly once.
+
+``check_query_plans()`` runs ``EXPLAIN QUERY PLAN`` over ``HOT_QUERIES`` and
+reports any that fall back to a full table scan::
+
+    python -m alumni_core.migrations alumni.db --check
+"""
+import re, sqlite3, sys
+from alumni_core import ingest
+
+MIGRATIONS = []
+HOT_QUERIES = {}
+
+
+class QueryPlanError(AssertionError):
+    pass
+
+
+def migration(version, name):
+    def register(fn):
+        if any(m[0] == version for m in MIGRATIONS):
+            raise ValueError(f'duplicate migration version {version}')
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def hot_query(name, sql, params=()):
+    """Register a query that must be served by an index."""
+    HOT_QUERIES[name] = (sql, tuple(params))
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def run_script(conn, script):
+    """Execute a multi-statement script inside the caller's transaction.
+
+    Unlike ``executescript`` this does not commit first, so a failing
+    migration rolls back completely.
+    """
+    buf = ''
+    for line in script.splitlines(True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                conn.execute(buf)
+            buf = ''
+    if buf.strip():
+        raise sqlite3.ProgrammingError(f'incomplete SQL statement: {buf.strip()[:80]}')
+
+
+def columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_column(conn, table, name, decl):
+    """ALTER TABLE ADD COLUMN unless the column already exists; True if added."""
+    if name in columns(conn, table):
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+    return True
+
+
+def require_columns(conn, table, defaults):
+    """Make the columns in ``defaults`` (``{column: SQL default}``) NOT NULL; NULLs get the default.
+
+    SQLite cannot add a constraint to a column, so the table is copied into a
+    new one and renamed, as its ALTER TABLE documentation describes. Ids,
+    indexes and triggers are kept.
+    """
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    decls = []
+    for _, name, decl_type, notnull, default, pk in info:
+        if name in defaults:
+            notnull, default = 1, defaults[name]
+        decls.append(' '.join(filter(None, (name, decl_type, 'PRIMARY KEY' if pk else '', 'NOT NULL' if notnull else '',
+                                            f'DEFAULT {default}' if default is not None else ''))))
+    names = [r[1] for r in info]
+    saved = [r[0] for r in conn.execute("SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+                                        "AND sql IS NOT NULL", (table,))]
+    conn.execute(f"CREATE TABLE {table}_rebuild ({', '.join(decls)})")
+    conn.execute(f"INSERT INTO {table}_rebuild ({', '.join(names)}) SELECT "
+                 + ', '.join(f'COALESCE({c}, {defaults[c]})' if c in defaults else c for c in names) + f" FROM {table}")
+    conn.execute(f"DROP TABLE {table}")  # with its indexes and triggers; none of them fire
+    conn.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+    for sql in saved:
+        conn.execute(sql)
+
+
+def migrate(conn, target=None):
+    """Bring the database up to ``target`` (default: latest); returns applied versions."""
+    applied = []
+    for version, name, fn in list(MIGRATIONS):
+        if target is not None and version > target:
+            break
+        if version <= current_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # another process may have migrated while we waited for the lock
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            fn(conn)
+            conn.execute(f"PRAGMA user_version={int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, name))
+    return applied
+
+
+_TABLE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def check_query_plans(conn, queries=None):
+    """Return ``[(name, plan detail)]`` for hot queries that scan a whole table."""
+    problems = []
+    for name, (sql, params) in sorted((queries or HOT_QUERIES).items()):
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            detail = row[3]
+            if _TABLE_SCAN.match(detail):
+                problems.append((name, detail))
+    return problems
+
+
+def assert_query_plans(conn, queries=None):
+    problems = check_query_plans(conn, queries)
+    if problems:
+        raise QueryPlanError('hot queries without an index: ' +
+                             '; '.join(f'{name}: {detail}' for name, detail in problems))
+
+
+# ----- migrations -----
+
+@migration(1, 'reconcile app schemas')
+def _baseline(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE,
+        password_hash TEXT,
+        role TEXT DEFAULT 'user',
+        email TEXT
+    );
+    CREATE TABLE IF NOT EXISTS alumni (
+        id INTEGER PRIMARY KEY,
+        name TEXT, batch TEXT, email TEXT, phone TEXT, company TEXT, bio TEXT, created_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY,
+        title TEXT, date TEXT, venue TEXT, description TEXT, created_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS mentorships (
+        id INTEGER PRIMARY KEY,
+        title TEXT, alumni_id INTEGER, student_name TEXT, field TEXT, note TEXT, approved INTEGER DEFAULT 1, created_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS mentor_applications (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER, name TEXT, email TEXT, field TEXT, note TEXT, status TEXT DEFAULT 'pending', created_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS pw_reset_tokens (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER, token TEXT, expires_at TEXT
+    );
+    """)
+    # The admin console originally created users without a role column and
+    # every account there was an administrator.
+    if add_column(conn, 'users', 'role', "TEXT DEFAULT 'user'"):
+        conn.execute("UPDATE users SET role='admin'")
+    add_column(conn, 'users', 'email', 'TEXT')
+    add_column(conn, 'mentorships', 'alumni_id', 'INTEGER')
+    add_column(conn, 'mentorships', 'approved', 'INTEGER DEFAULT 1')
+    # keyset pagination compares (sort key, id); NULL keys would drop out of it
+    conn.execute("UPDATE alumni SET created_at='' WHERE created_at IS NULL")
+    conn.execute("UPDATE mentorships SET created_at='' WHERE created_at IS NULL")
+    conn.execute("UPDATE mentor_applications SET created_at='' WHERE created_at IS NULL")
+    conn.execute("UPDATE events SET date='' WHERE date IS NULL")
+
+
+@migration(2, 'indexes for hot lookups')
+def _hot_indexes(conn):
+    run_script(conn, """
+    CREATE INDEX IF NOT EXISTS idx_alumni_created ON alumni(created_at);
+    CREATE INDEX IF NOT EXISTS idx_alumni_batch_created ON alumni(batch, created_at);
+    CREATE INDEX IF NOT EXISTS idx_alumni_company_created ON alumni(company, created_at);
+    CREATE INDEX IF NOT EXISTS idx_alumni_email ON alumni(email);
+    CREATE INDEX IF NOT EXISTS idx_events_date ON events(date);
+    CREATE INDEX IF NOT EXISTS idx_mentorships_created ON mentorships(created_at);
+    CREATE INDEX IF NOT EXISTS idx_mentorships_field_created ON mentorships(field, created_at);
+    CREATE INDEX IF NOT EXISTS idx_mentor_applications_created ON mentor_applications(created_at);
+    CREATE INDEX IF NOT EXISTS idx_pw_reset_tokens_token ON pw_reset_tokens(token);
+    """)
+
+
+@migration(3, 'alumni full-text search')
+def _alumni_fts(conn):
+    run_script(conn, """
+    CREATE VIRTUAL TABLE IF NOT EXISTS alumni_fts USING fts5(
+        name, company, bio, batch,
+        content='alumni', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS alumni_fts_ai AFTER INSERT ON alumni BEGIN
+        INSERT INTO alumni_fts(rowid, name, company, bio, batch)
+        VALUES (new.id, new.name, new.company, new.bio, new.batch);
+    END;
+    CREATE TRIGGER IF NOT EXISTS alumni_fts_ad AFTER DELETE ON alumni BEGIN
+        INSERT INTO alumni_fts(alumni_fts, rowid, name, company, bio, batch)
+        VALUES ('delete', old.id, old.name, old.company, old.bio, old.batch);
+    END;
+    CREATE TRIGGER IF NOT EXISTS alumni_fts_au AFTER UPDATE OF name, company, bio, batch ON alumni BEGIN
+        INSERT INTO alumni_fts(alumni_fts, rowid, name, company, bio, batch)
+        VALUES ('delete', old.id, old.name, old.company, old.bio, old.batch);
+        INSERT INTO alumni_fts(rowid, name, company, bio, batch)
+        VALUES (new.id, new.name, new.company, new.bio, new.batch);
+    END;
+    INSERT INTO alumni_fts(alumni_fts) VALUES ('rebuild');
+    """)
+
+
+@migration(4, 'background import jobs')
+def _import_jobs(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS import_jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT, filename TEXT, status TEXT, error TEXT, created_by TEXT,
+        rows_processed INTEGER DEFAULT 0, rows_inserted INTEGER DEFAULT 0, rows_rejected INTEGER DEFAULT 0,
+        elapsed_s REAL, created_at TEXT, started_at TEXT, finished_at TEXT, updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS import_rejects (
+        id INTEGER PRIMARY KEY,
+        job_id TEXT, line_no INTEGER, reason TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_import_rejects_job ON import_rejects(job_id, line_no);
+    """)
+
+
+@migration(5, 'natural keys for JSON merge imports')
+def _merge_keys(conn):
+    run_script(conn, """
+    CREATE INDEX IF NOT EXISTS idx_events_title_date ON events(title, date);
+    CREATE INDEX IF NOT EXISTS idx_mentorships_title_student ON mentorships(title, student_name);
+    """)
+
+
+@migration(6, 'insight counters')
+def _insight_counts(conn):
+    from alumni_core import insights
+    insights.install(conn)
+
+
+@migration(7, 'table versions for conditional GET')
+def _table_versions(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0, modified_at TEXT
+    ) WITHOUT ROWID;
+    """)
+    for table in ('alumni', 'events', 'mentorships', 'mentor_applications'):
+        conn.execute("INSERT OR IGNORE INTO table_versions (name, version, modified_at) "
+                     "VALUES (?, 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))", (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+                UPDATE table_versions SET version = version + 1, modified_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+                WHERE name = '{table}';
+            END""")
+
+
+@migration(8, 'email outbox')
+def _email_outbox(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id INTEGER PRIMARY KEY,
+        recipient TEXT NOT NULL, subject TEXT, body TEXT,
+        status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TEXT, claimed_at TEXT, last_error TEXT,
+        created_at TEXT, sent_at TEXT, latency_ms INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(status, next_attempt_at);
+    """)
+
+
+@migration(9, 'mentor matching index')
+def _mentor_index(conn):
+    # one document per alumnus (rowid id*2) and per approved application (id*2+1), see alumni_core.matching
+    run_script(conn, """
+    CREATE VIRTUAL TABLE IF NOT EXISTS mentor_index USING fts5(
+        name UNINDEXED, kind, field, body,
+        tokenize='porter unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS mentor_index_alumni_ai AFTER INSERT ON alumni BEGIN
+        INSERT INTO mentor_index(rowid, name, kind, field, body) VALUES (new.id * 2, new.name, 'alumni', new.company, new.bio);
+    END;
+    CREATE TRIGGER IF NOT EXISTS mentor_index_alumni_ad AFTER DELETE ON alumni BEGIN
+        DELETE FROM mentor_index WHERE rowid = old.id * 2;
+    END;
+    CREATE TRIGGER IF NOT EXISTS mentor_index_alumni_au AFTER UPDATE OF name, company, bio ON alumni BEGIN
+        DELETE FROM mentor_index WHERE rowid = old.id * 2;
+        INSERT INTO mentor_index(rowid, name, kind, field, body) VALUES (new.id * 2, new.name, 'alumni', new.company, new.bio);
+    END;
+    CREATE TRIGGER IF NOT EXISTS mentor_index_applications_ai AFTER INSERT ON mentor_applications
+    WHEN new.status = 'approved' BEGIN
+        INSERT INTO mentor_index(rowid, name, kind, field, body) VALUES (new.id * 2 + 1, new.name, 'application', new.field, new.note);
+    END;
+    CREATE TRIGGER IF NOT EXISTS mentor_index_applications_ad AFTER DELETE ON mentor_applications
+    WHEN old.status = 'approved' BEGIN
+        DELETE FROM mentor_index WHERE rowid = old.id * 2 + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS mentor_index_applications_au AFTER UPDATE OF name, field, note, status ON mentor_applications BEGIN
+        DELETE FROM mentor_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO mentor_index(rowid, name, kind, field, body)
+        SELECT new.id * 2 + 1, new.name, 'application', new.field, new.note WHERE new.status = 'approved';
+    END;
+    INSERT INTO mentor_index(rowid, name, kind, field, body) SELECT id * 2, name, 'alumni', company, bio FROM alumni;
+    INSERT INTO mentor_index(rowid, name, kind, field, body)
+    SELECT id * 2 + 1, name, 'application', field, note FROM mentor_applications WHERE status = 'approved';
+    INSERT INTO mentor_index(mentor_index) VALUES ('optimize');
+    """)
+
+
+CHANGE_LOG_TABLES = ('alumni', 'events', 'mentorships', 'mentor_applications')
+CHANGE_LOG_KEEP = 100000  # newest entries kept; older cursors must reload (alumni_core.changes)
+
+
+@migration(10, 'change log')
+def _change_log(conn):
+    run_script(conn, f"""
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY,
+        tbl TEXT NOT NULL, row_id INTEGER NOT NULL, op TEXT NOT NULL, changed_at TEXT NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS changes_prune AFTER INSERT ON changes WHEN new.seq % 1000 = 0 BEGIN
+        DELETE FROM changes WHERE seq <= new.seq - {CHANGE_LOG_KEEP};
+    END;
+    """)
+    for table in CHANGE_LOG_TABLES:
+        for event, ref in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_change_{event.lower()} AFTER {event} ON {table} BEGIN
+                INSERT INTO changes (tbl, row_id, op, changed_at)
+                VALUES ('{table}', {ref}.id, '{event.lower()}', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+            END""")
+
+
+@migration(11, 'maintenance jobs')
+def _maintenance(conn):
+    # one row per job of alumni_core.maintenance: its lease and what it did last time
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS maintenance_jobs (
+        name TEXT PRIMARY KEY,
+        owner TEXT, lease_until TEXT, started_at TEXT, finished_at TEXT,
+        seconds REAL, result TEXT, error TEXT, runs INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_pw_reset_tokens_expires ON pw_reset_tokens(expires_at);
+    """)
+
+
+@migration(12, 'alumni dedup keys')
+def _dedup_keys(conn):
+    # filled by alumni_core.ingest; existing rows are keyed by migration 14
+    add_column(conn, 'alumni', 'dedup_key', 'TEXT')
+    add_column(conn, 'import_jobs', 'rows_updated', 'INTEGER DEFAULT 0')
+    add_column(conn, 'import_jobs', 'rows_unchanged', 'INTEGER DEFAULT 0')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_alumni_dedup_key ON alumni(dedup_key)")
+    # merging two alumni moves their mentorships over
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mentorships_alumni ON mentorships(alumni_id)")
+    # the key is internal: setting it is not a change clients need to see
+    visible = 'name, batch, email, phone, company, bio, created_at'
+    conn.execute("DROP TRIGGER IF EXISTS alumni_change_update")
+    conn.execute(f"""CREATE TRIGGER alumni_change_update AFTER UPDATE OF {visible} ON alumni BEGIN
+        INSERT INTO changes (tbl, row_id, op, changed_at)
+        VALUES ('alumni', new.id, 'update', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+    END""")
+    conn.execute("DROP TRIGGER IF EXISTS alumni_version_update")
+    conn.execute(f"""CREATE TRIGGER alumni_version_update AFTER UPDATE OF {visible} ON alumni BEGIN
+        UPDATE table_versions SET version = version + 1, modified_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+        WHERE name = 'alumni';
+    END""")
+
+
+@migration(13, 'alumni name keys need a phone')
+def _phone_keys(conn):
+    # keys from a name and batch alone (phone part empty) merged namesake classmates; such
+    # rows are unkeyed again and, like rows without name and email, never matched
+    conn.execute("UPDATE alumni SET dedup_key = NULL WHERE dedup_key LIKE 'n:%|'")
+
+
+DEDUP_BACKFILL = 14
+
+
+@migration(DEDUP_BACKFILL, 'alumni dedup key backfill')
+def _dedup_backfill(conn):
+    # without keys, rows stored earlier would be added again by the next upload of the same file;
+    # `python -m alumni_core.ingest --dedupe` does this beforehand in short transactions
+    ingest.backfill(conn)
+
+
+@migration(15, 'keyset sort keys not null')
+def _sort_keys_not_null(conn):
+    # a NULL sort key drops out of every keyset page after the first (alumni_core.pagination);
+    # migration 1 cleared the NULLs of that time, this keeps new ones out
+    require_columns(conn, 'alumni', {'created_at': "''"})
+    require_columns(conn, 'events', {'date': "''"})
+    require_columns(conn, 'mentorships', {'created_at': "''"})
+
+
+# ----- hot queries -----
+
+_PAGE = " ORDER BY {sort} DESC, id DESC LIMIT 50"
+hot_query('alumni_page', "SELECT * FROM alumni" + _PAGE.format(sort='created_at'))
+hot_query('alumni_page_after', "SELECT * FROM alumni WHERE (created_at, id) < (?, ?)" + _PAGE.format(sort='created_at'), ('', 0))
+hot_query('alumni_by_batch', "SELECT * FROM alumni WHERE batch=? AND (created_at, id) < (?, ?)" + _PAGE.format(sort='created_at'), ('', '', 0))
+hot_query('alumni_by_company', "SELECT * FROM alumni WHERE company=?" + _PAGE.format(sort='created_at'), ('',))
+hot_query('alumni_by_email', "SELECT * FROM alumni WHERE email = ?", ('',))
+hot_query('alumni_by_dedup_key', "SELECT id FROM alumni WHERE dedup_key IN (?, ?)", ('', ''))
+hot_query('alumni_unkeyed', "SELECT id FROM alumni WHERE dedup_key IS NULL AND id > ? ORDER BY id LIMIT 1000", (0,))
+hot_query('events_page', "SELECT * FROM events WHERE (date, id) < (?, ?)" + _PAGE.format(sort='date'), ('', 0))
+hot_query('mentorships_page', "SELECT * FROM mentorships WHERE (created_at, id) < (?, ?)" + _PAGE.format(sort='created_at'), ('', 0))
+hot_query('mentorships_by_alumni', "SELECT id FROM mentorships WHERE alumni_id = ?", (0,))
+hot_query('mentorships_by_field', "SELECT * FROM mentorships WHERE field=?" + _PAGE.format(sort='created_at'), ('',))
+hot_query('mentor_applications_list', "SELECT * FROM mentor_applications ORDER BY created_at DESC")
+hot_query('reset_token', "SELECT * FROM pw_reset_tokens WHERE token = ?", ('',))
+hot_query('user_by_username', "SELECT * FROM users WHERE username = ?", ('',))
+hot_query('alumni_search', "SELECT a.* FROM alumni_fts JOIN alumni a ON a.id = alumni_fts.rowid WHERE alumni_fts MATCH ? ORDER BY bm25(alumni_fts) LIMIT 20", ('x*',))
+hot_query('import_rejects', "SELECT line_no, reason FROM import_rejects WHERE job_id=? ORDER BY line_no LIMIT 100", ('',))
+hot_query('events_by_title_date', "SELECT 1 FROM events WHERE title = ? AND date = ?", ('', ''))
+hot_query('mentorships_by_title_student', "SELECT 1 FROM mentorships WHERE title = ? AND student_name = ?", ('', ''))
+hot_query('outbox_due', "SELECT * FROM email_outbox WHERE (status='queued' AND next_attempt_at <= ?) "
+          "OR (status='sending' AND claimed_at < ?) ORDER BY next_attempt_at LIMIT 50", ('', ''))
+hot_query('insights_top', "SELECT key, cnt FROM insight_counts WHERE metric=? ORDER BY cnt DESC, key LIMIT 10", ('',))
+hot_query('mentor_matches', "SELECT rowid FROM mentor_index WHERE mentor_index MATCH ? ORDER BY bm25(mentor_index), rowid LIMIT 10", ('x',))
+hot_query('changes_since', "SELECT seq, tbl, row_id, op, changed_at FROM changes WHERE seq > ? AND seq <= ? "
+          "AND tbl IN ('alumni') ORDER BY seq LIMIT 501", (0, 0))
+hot_query('expired_tokens', "SELECT id FROM pw_reset_tokens WHERE expires_at < ? LIMIT 1000", ('',))
+hot_query('insights_by_month', "SELECT key, cnt FROM insight_counts WHERE metric='events_by_month' ORDER BY key DESC LIMIT 24")
+
+
+def main(argv=None):
+    import argparse
+    from alumni_core.db import connect
+    parser = argparse.ArgumentParser(prog='python -m alumni_core.migrations', description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--check', action='store_true', help='fail if a hot query needs a table scan')
+    args = parser.parse_args(argv)
+    conn = connect(args.database)
+    before = current_version(conn)
+    for version, name in migrate(conn):
+        print(f'applied {version}: {name}')
+    print(f'schema version {before} -> {current_version(conn)}')
+    if args.check:
+        problems = check_query_plans(conn)
+        for name, detail in problems:
+            print(f'TABLE SCAN  {name}: {detail}')
+        if problems:
+            return 1
+        print(f'{len(HOT_QUERIES)} hot queries use indexes')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Durable email outbox with a background sender.
+
+Requests never talk to the mail server. ``enqueue`` inserts a row into
+``email_outbox`` in the caller's transaction, so a reset token and its email
+are committed together, and ``wake`` nudges this worker's sender thread.
+
+The sender claims up to ``batch_size`` due messages at a time, delivers them
+over one SMTP connection that is kept open between batches until it has been
+idle for ``idle_timeout`` seconds, and records the outcome of each message.
+Temporary failures are retried with exponential backoff; permanent (5xx)
+rejections, messages that cannot be built (any error other than SMTP or
+network) and messages out of attempts are marked ``failed``. Claims carry
+a timestamp, so messages held by a worker that died are picked up again.
+
+For local testing point ``EMAIL_HOST``/``EMAIL_PORT`` at any SMTP stand-in,
+e.g. ``python -m aiosmtpd -n -l localhost:1025`` or the MailHog container::
+
+    python -m alumni_core.outbox alumni.db --status
+    python -m alumni_core.outbox alumni.db --drain
+"""
+import collections, datetime, logging, os, smtplib, sys, threading, time
+from email.message import EmailMessage
+from flask import current_app
+
+log = logging.getLogger(__name__)
+
+EXTENSION_KEY = 'alumni_outbox'
+CLAIM_TIMEOUT = 600  # seconds before a 'sending' row is considered abandoned
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+def _iso(ts):
+    return ts.isoformat()
+
+
+def enqueue(conn, to, subject, body):
+    """Queue a message; the caller commits. Returns the outbox id."""
+    now = _iso(_now())
+    cur = conn.execute("INSERT INTO email_outbox (recipient, subject, body, status, attempts, next_attempt_at, created_at) "
+                       "VALUES (?,?,?,'queued',0,?,?)", (to, subject, body, now, now))
+    return cur.lastrowid
+
+
+def _permanent(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    code = getattr(exc, 'smtp_code', None)
+    return code is not None and 500 <= code < 600
+
+
+class Outbox:
+    def __init__(self, pool, host='localhost', port=25, sender='no-reply@localhost', batch_size=50,
+                 max_attempts=6, retry_base=30.0, retry_max=3600.0, idle_timeout=30.0, poll_interval=5.0,
+                 smtp_timeout=10.0):
+        self.pool = pool
+        self.host, self.port, self.sender = host, port, sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base, self.retry_max = retry_base, retry_max
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.smtp_timeout = smtp_timeout
+        self._smtp = None
+        self._smtp_used = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=1000)
+        self._stats = {'sent': 0, 'failed': 0, 'retried': 0, 'batches': 0, 'connections': 0, 'send_time': 0.0}
+
+    # ----- delivery -----
+
+    def _connection(self):
+        if self._smtp is not None and time.monotonic() - self._smtp_used > self.idle_timeout:
+            self._close()
+        if self._smtp is None:
+            self._smtp = smtplib.SMTP(self.host, self.port, timeout=self.smtp_timeout)
+            self._stats['connections'] += 1
+        self._smtp_used = time.monotonic()
+        return self._smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+    def _message(self, row):
+        msg = EmailMessage()
+        msg['From'] = self.sender
+        msg['To'] = row['recipient']
+        msg['Subject'] = row['subject']
+        msg.set_content(row['body'])
+        return msg
+
+    def _send(self, row):
+        msg = self._message(row)
+        try:
+            self._connection().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # the server dropped an idle connection; one fresh attempt
+            self._close()
+            self._connection().send_message(msg)
+
+    def _claim(self, conn, now):
+        stale = _iso(now - datetime.timedelta(seconds=CLAIM_TIMEOUT))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT * FROM email_outbox WHERE (status='queued' AND next_attempt_at <= ?) "
+                "OR (status='sending' AND claimed_at < ?) ORDER BY next_attempt_at LIMIT ?",
+                (_iso(now), stale, self.batch_size)).fetchall()
+            conn.executemany("UPDATE email_outbox SET status='sending', claimed_at=? WHERE id=?",
+                             [(_iso(now), r['id']) for r in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return rows
+
+    def _backoff(self, attempts):
+        return min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+
+    def _deliver(self, row, broken):
+        """Send one claimed message; returns ``(result row, connection error or None)``.
+
+        ``broken`` is an earlier connection-level error of this batch: the
+        message is not tried and is retried later with the rest.
+        """
+        attempts = row['attempts'] + 1
+        error = broken
+        if broken is None:
+            start = time.perf_counter()
+            try:
+                self._send(row)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                error = e  # this message only
+            except (smtplib.SMTPException, OSError) as e:
+                error = broken = e  # connection-level: keep the rest of the batch for the retry
+                self._close()
+            except Exception as e:  # e.g. a header that cannot be encoded: it will never send
+                return ('failed', attempts, None, f'{type(e).__name__}: {e}'[:500], None, None, row['id']), None
+            else:
+                now = _now()
+                self._stats['send_time'] += time.perf_counter() - start
+                latency = (now - datetime.datetime.fromisoformat(row['created_at'])).total_seconds()
+                self._latencies.append(latency)
+                return ('sent', attempts, None, None, _iso(now), round(latency * 1000), row['id']), None
+        message = f'{type(error).__name__}: {error}'[:500]
+        if _permanent(error) or attempts >= self.max_attempts:
+            return ('failed', attempts, None, message, None, None, row['id']), broken
+        retry_at = _iso(_now() + datetime.timedelta(seconds=self._backoff(attempts)))
+        return ('queued', attempts, retry_at, message, None, None, row['id']), broken
+
+    def process_batch(self):
+        """Claim and deliver one batch; returns the number of messages handled."""
+        with self.pool.connection() as conn:
+            rows = self._claim(conn, _now())
+        if not rows:
+            return 0
+        results, broken = [], None
+        try:
+            for row in rows:
+                result, broken = self._deliver(row, broken)
+                results.append(result)
+        finally:
+            # also when the loop is cut short: messages already sent must not be sent again
+            # after CLAIM_TIMEOUT; the rest stay claimed and are picked up then
+            if results:
+                with self.pool.connection() as conn:
+                    conn.executemany(
+                        "UPDATE email_outbox SET status=?, attempts=?, next_attempt_at=COALESCE(?, next_attempt_at), "
+                        "last_error=?, sent_at=?, latency_ms=?, claimed_at=NULL WHERE id=?", results)
+                    conn.commit()
+            with self._lock:
+                self._stats['batches'] += 1
+                for status, *_ in results:
+                    self._stats[{'sent': 'sent', 'failed': 'failed', 'queued': 'retried'}[status]] += 1
+        return len(rows)
+
+    def drain(self):
+        """Deliver everything that is due now (CLI and tests); returns messages handled."""
+        total = 0
+        while True:
+            n = self.process_batch()
+            total += n
+            if n < self.batch_size:
+                break
+        self._close()
+        return total
+
+    # ----- worker thread -----
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.process_batch() >= self.batch_size:
+                    pass
+            except Exception:  # never let the sender thread die
+                log.exception('email outbox sender')
+            if self._smtp is not None and time.monotonic() - self._smtp_used > self.idle_timeout:
+                self._close()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        self._close()
+
+    def ensure_started(self):
+        """Start this process's sender thread (again, after a fork)."""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._smtp = None
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='alumni-outbox', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self.ensure_started()
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self, conn=None):
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        stats['send_time'] = round(stats['send_time'], 3)
+        if latencies:
+            stats['latency_s'] = {p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))], 3)
+                                  for p in (50, 95, 99)}
+        if conn is not None:
+            stats['queue'] = dict(conn.execute("SELECT status, COUNT(*) FROM email_outbox "
+                                               "WHERE status IN ('queued','sending') GROUP BY status").fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM email_outbox WHERE status='queued'").fetchone()[0]
+            stats['oldest_queued'] = oldest
+        return stats
+
+
+def settings_from_env(environ=os.environ):
+    return {
+        'batch_size': int(environ.get('EMAIL_BATCH_SIZE', 50)),
+        'max_attempts': int(environ.get('EMAIL_MAX_ATTEMPTS', 6)),
+        'retry_base': float(environ.get('EMAIL_RETRY_BASE', 30)),
+        'idle_timeout': float(environ.get('EMAIL_SMTP_IDLE', 30)),
+        'poll_interval': float(environ.get('EMAIL_POLL_INTERVAL', 5)),
+    }
+
+
+def init_app(app, pool, host, port, sender):
+    """Install the outbox; the sender thread starts with the first request of each worker."""
+    box = Outbox(pool, host, port, sender, **settings_from_env())
+    app.extensions[EXTENSION_KEY] = box
+    if os.environ.get('EMAIL_OUTBOX_WORKER', '1') != '0':
+        app.before_request(box.ensure_started)
+    return box
+
+
+def get_outbox(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
+
+
+def main(argv=None):
+    import argparse, json
+    from alumni_core.db import ConnectionPool, pragmas_from_env
+    parser = argparse.ArgumentParser(prog='python -m alumni_core.outbox', description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--drain', action='store_true', help='deliver all due messages and exit')
+    parser.add_argument('--status', action='store_true', help='print queue depth and delivery counters')
+    args = parser.parse_args(argv)
+    pool = ConnectionPool(args.database, size=2, pragmas=pragmas_from_env())
+    box = Outbox(pool, os.environ.get('EMAIL_HOST', 'localhost'), int(os.environ.get('EMAIL_PORT', 25)),
+                 os.environ.get('EMAIL_FROM', 'no-reply@alumniconnect.local'), **settings_from_env())
+    if args.drain:
+        print(f'{box.drain()} messages processed')
+    if args.status or not args.drain:
+        with pool.connection() as conn:
+            print(json.dumps(box.stats(conn), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Keyset (cursor) pagination for the list pages and JSON API.
+
+Listings are ordered newest first on ``(sort column, id)``. A cursor is an
+opaque token holding the key of the first or last row of a page; the next
+page is read with ``WHERE (sort, id) < (?, ?)`` so every page costs the same
+index range scan no matter how deep the client pages. The sort columns are
+NOT NULL (migration 15): a NULL key would compare as NULL and the row would
+drop out of every page after the first.
+
+Query arguments understood by ``page_from_args``:
+
+* ``after=<cursor>``  - rows that come after the cursor (next page)
+* ``before=<cursor>`` - rows that come before the cursor (previous page)
+* ``limit=<n>``       - page size, capped at ``max_limit``
+* one argument per filter column declared on the listing (exact match)
+
+The JSON API also passes ``fields=<col>,<col>`` through ``parse_fields``:
+only those columns are selected (plus the sort key and id, which the
+cursor needs) and ``Page.records()`` returns just them.
+"""
+import base64, json
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+class Listing:
+    def __init__(self, table, sort, filters=(), columns=()):
+        self.table = table
+        self.sort = sort
+        self.filters = tuple(filters)
+        self.columns = tuple(columns)
+
+
+ALUMNI = Listing('alumni', 'created_at', filters=('batch', 'company'),
+                 columns=('id', 'name', 'batch', 'email', 'phone', 'company', 'bio', 'created_at'))
+EVENTS = Listing('events', 'date', columns=('id', 'title', 'date', 'venue', 'description', 'created_at'))
+MENTORSHIPS = Listing('mentorships', 'created_at', filters=('field',),
+                      columns=('id', 'title', 'alumni_id', 'student_name', 'field', 'note', 'approved', 'created_at'))
+
+
+def parse_fields(listing, value):
+    """Columns named in a ``fields=a,b`` argument, or None for all of them."""
+    if not value:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in listing.columns]
+    if unknown:
+        raise InvalidFields(f"unknown field(s) {', '.join(unknown)}; {listing.table} has {', '.join(listing.columns)}")
+    return fields or None
+
+
+def select_list(listing, fields=None):
+    if fields is None:
+        return '*'
+    # requested columns first, so records() can zip them; then what the cursor needs
+    return ', '.join(dict.fromkeys(list(fields) + [listing.sort, 'id']))
+
+
+def encode_cursor(row, listing):
+    raw = json.dumps([row[listing.sort], row['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key, row_id = json.loads(raw)
+        return key, int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'invalid cursor {token!r}') from e
+
+
+class Page:
+    def __init__(self, items, listing, limit, filters, next_cursor=None, prev_cursor=None, fields=None):
+        self.items = items
+        self.listing = listing
+        self.limit = limit
+        self.filters = filters
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.fields = fields
+
+    def link_args(self, direction):
+        """Query arguments for the next/previous page link (None if there is none)."""
+        cursor = self.next_cursor if direction == 'next' else self.prev_cursor
+        if not cursor:
+            return None
+        args = dict(self.filters, limit=self.limit)
+        args['after' if direction == 'next' else 'before'] = cursor
+        return args
+
+    def records(self):
+        """The rows as dicts, holding only the requested fields if there were any."""
+        if self.fields is None:
+            return [dict(r) for r in self.items]
+        return [dict(zip(self.fields, r)) for r in self.items]
+
+    def to_dict(self, items=None):
+        return {'items': self.items if items is None else items, 'limit': self.limit,
+                'filters': self.filters, 'next_cursor': self.next_cursor, 'prev_cursor': self.prev_cursor}
+
+
+def fetch_page(conn, listing, after=None, before=None, limit=50, filters=None, fields=None):
+    filters = {k: v for k, v in (filters or {}).items() if k in listing.filters and v not in (None, '')}
+    where = [f"{col}=?" for col in filters]
+    params = list(filters.values())
+    sort = listing.sort
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+    if cursor is not None:
+        key, row_id = decode_cursor(cursor)
+        where.append(f"({sort}, id) {'>' if backwards else '<'} (?, ?)")
+        params += [key, row_id]
+    order = 'ASC' if backwards else 'DESC'
+    sql = f"SELECT {select_list(listing, fields)} FROM {listing.table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {sort} {order}, id {order} LIMIT ?"
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            prev_cursor = encode_cursor(rows[0], listing) if has_more else None
+            next_cursor = encode_cursor(rows[-1], listing)
+        else:
+            prev_cursor = encode_cursor(rows[0], listing) if cursor is not None else None
+            next_cursor = encode_cursor(rows[-1], listing) if has_more else None
+    return Page(rows, listing, limit, filters, next_cursor, prev_cursor, fields)
+
+
+def page_from_args(conn, listing, args, default_limit=50, max_limit=500, fields=None):
+    """Read cursor, limit and filters from request args and fetch that page."""
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        limit = default_limit
+    limit = max(1, min(limit, max_limit))
+    filters = {col: args.get(col) for col in listing.filters}
+    return fetch_page(conn, listing, after=args.get('after'), before=args.get('before'),
+                      limit=limit, filters=filters, fields=fields)
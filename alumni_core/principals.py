@@ -0,0 +1,125 @@
+"""Per-request and per-worker caching of the logged-in user.
+
+``current_principal()`` resolves the session's user at most once per request
+(memoised on ``flask.g``) and otherwise serves it from a bounded LRU cache
+with a TTL, so rendering a page no longer costs a ``users`` query for the
+layout plus another one for the role check.
+
+Writes that change a user's role or password must call ``invalidate`` so
+this worker drops the cached entry at once; other workers pick the change up
+when their entry expires (``PRINCIPAL_CACHE_TTL`` seconds).
+"""
+import os, threading, time
+from collections import OrderedDict
+from flask import current_app, g, session
+from alumni_core.db import get_db
+
+EXTENSION_KEY = 'alumni_principals'
+_MISSING = object()
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > self._clock():
+                    self._data.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._data[key]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            stale = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            for k in stale:
+                del self._data[k]
+            self._stats['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._stats['invalidations'] += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._data), maxsize=self.maxsize, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class PrincipalCache(TTLCache):
+    """Caches ``loader(conn, key)`` results keyed by the session value."""
+
+    def __init__(self, loader, session_key, maxsize=1024, ttl=30.0):
+        super().__init__(maxsize, ttl)
+        self.loader = loader
+        self.session_key = session_key
+
+    def load(self, conn, key):
+        principal = self.get(key)
+        if principal is _MISSING:
+            row = self.loader(conn, key)
+            principal = dict(row) if row is not None else None
+            self.set(key, principal)
+        return principal
+
+
+def init_app(app, loader, session_key):
+    """Install a principal cache; ``loader(conn, key)`` returns a users row or None."""
+    maxsize = int(app.config.get('PRINCIPAL_CACHE_SIZE') or os.environ.get('PRINCIPAL_CACHE_SIZE', 1024))
+    ttl = float(app.config.get('PRINCIPAL_CACHE_TTL') or os.environ.get('PRINCIPAL_CACHE_TTL', 30))
+    cache = PrincipalCache(loader, session_key, maxsize, ttl)
+    app.extensions[EXTENSION_KEY] = cache
+    return cache
+
+
+def get_cache(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
+
+
+def current_principal():
+    """The logged-in user as a dict (id, username, role), or None."""
+    if '_principal' not in g:
+        cache = get_cache()
+        key = session.get(cache.session_key)
+        g._principal = cache.load(get_db(), key) if key is not None else None
+    return g._principal
+
+
+def invalidate(key=None, user_id=None):
+    """Forget a cached user by session key and/or users.id (role or password changed)."""
+    cache = get_cache()
+    if key is not None:
+        cache.invalidate(key)
+    if user_id is not None:
+        cache.invalidate_where(lambda k, v: v is not None and v.get('id') == user_id)
+    g.pop('_principal', None)
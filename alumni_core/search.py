@@ -0,0 +1,101 @@
+"""Full-text search over the alumni directory.
+
+Backed by the ``alumni_fts`` FTS5 table (migration 3), which triggers on
+``alumni`` keep in sync with every insert, update and delete. User input is
+split into words and each word is matched as a prefix, so ``"ann goo"``
+finds "Anna ... Google". Results are ranked with bm25, name and company
+weighing more than the bio. Callers that are not signed in get results
+without ``CONTACT_COLUMNS`` (``contact=False``).
+"""
+import re
+from markupsafe import escape
+from alumni_core.ingest import KEY_COLUMN
+
+# bm25 column weights, in alumni_fts column order: name, company, bio, batch
+WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+CONTACT_COLUMNS = ('email', 'phone')
+_OPEN, _CLOSE = '\x02', '\x03'
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match(query):
+    """Turn free text into an FTS5 MATCH expression (all words, prefix match)."""
+    words = _WORD.findall(query or '')
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def _marked(text):
+    """HTML-escape an FTS snippet and turn the match sentinels into <mark> tags."""
+    if text is None:
+        return None
+    return str(escape(text)).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+class SearchPage:
+    def __init__(self, items, query, limit, offset, has_more):
+        self.items = items
+        self.query = query
+        self.limit = limit
+        self.offset = offset
+        self.has_more = has_more
+        self.filters = {}
+
+    def link_args(self, direction):
+        if direction == 'next':
+            if not self.has_more:
+                return None
+            offset = self.offset + self.limit
+        else:
+            if self.offset <= 0:
+                return None
+            offset = max(0, self.offset - self.limit)
+        return {'q': self.query, 'limit': self.limit, 'offset': offset}
+
+    def to_dict(self):
+        return {'items': self.items, 'query': self.query, 'limit': self.limit, 'offset': self.offset,
+                'next_offset': self.offset + self.limit if self.has_more else None}
+
+
+def search_alumni(conn, query, limit=20, offset=0, contact=True):
+    """Ranked alumni matching ``query``; rows are dicts with ``*_html`` highlights."""
+    match = build_match(query)
+    if not match:
+        return SearchPage([], query, limit, offset, False)
+    sql = f"""
+        SELECT a.*,
+               bm25(alumni_fts, {', '.join(map(str, WEIGHTS))}) AS rank,
+               highlight(alumni_fts, 0, ?, ?) AS name_hl,
+               highlight(alumni_fts, 1, ?, ?) AS company_hl,
+               snippet(alumni_fts, 2, ?, ?, '…', 16) AS bio_hl
+        FROM alumni_fts JOIN alumni a ON a.id = alumni_fts.rowid
+        WHERE alumni_fts MATCH ?
+        ORDER BY rank LIMIT ? OFFSET ?"""
+    marks = (_OPEN, _CLOSE) * 3
+    rows = conn.execute(sql, marks + (match, limit + 1, offset)).fetchall()
+    items = []
+    for row in rows[:limit]:
+        item = dict(row)
+        item.pop(KEY_COLUMN, None)
+        if not contact:
+            for col in CONTACT_COLUMNS:
+                del item[col]
+        for col in ('name', 'company', 'bio'):
+            item[col + '_html'] = _marked(item.pop(col + '_hl'))
+        item['rank'] = round(item['rank'], 4)
+        items.append(item)
+    return SearchPage(items, query, limit, offset, len(rows) > limit)
+
+
+def search_from_args(conn, args, default_limit=20, max_limit=100, contact=True):
+    try:
+        limit = max(1, min(int(args.get('limit', default_limit)), max_limit))
+        offset = max(0, int(args.get('offset', 0)))
+    except ValueError:
+        limit, offset = default_limit, 0
+    return search_alumni(conn, args.get('q', ''), limit, offset, contact)
+
+
+def rebuild(conn):
+    """Rebuild the index from the alumni table (repair after manual edits)."""
+    conn.execute("INSERT INTO alumni_fts(alumni_fts) VALUES ('rebuild')")
+    conn.commit()
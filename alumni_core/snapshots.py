@@ -0,0 +1,255 @@
+"""Consistent snapshot reads for exports and reports.
+
+An export reads table after table and keeps reading for as long as the
+client takes to download. Each query used to be its own implicit read, so a
+write landing between two tables showed up in one and not the other, and
+the export held one of the request pool's connections the whole time.
+
+``SnapshotReader.open()`` returns a ``Snapshot``: a connection from a pool
+of its own (``SNAPSHOT_POOL_SIZE``, default 2 per worker) inside one read
+transaction, so every query sees the database as of the first one and page
+views and writes never wait for a download to finish. ``SNAPSHOT_MAX_AGE``
+picks what the snapshot reads:
+
+- ``0`` (the default): the live database. Under WAL a reader never blocks
+  a writer, but while it is open a checkpoint cannot get past it, so the
+  WAL file keeps growing until the export ends.
+- ``N > 0``: a private copy made with the ``sqlite3`` backup API, at most
+  ``N`` seconds old when the snapshot is taken. An export that starts with
+  an older copy first refreshes it; a backup holds a read transaction on
+  the live file only while it copies. Old copies are deleted once the last
+  export reading them is done. Each worker keeps its own copy (in
+  ``SNAPSHOT_DIR``, by default the temp directory).
+
+``read_transaction(conn)`` is the same guarantee for a few quick queries on
+a request's own connection (the insights summary).
+"""
+import atexit, os, sqlite3, tempfile, threading, time
+from contextlib import contextmanager
+from flask import current_app
+from alumni_core import db, metrics
+
+EXTENSION_KEY = 'alumni_snapshots'
+
+
+class SnapshotsBusy(RuntimeError):
+    """Every snapshot connection stayed in use for longer than the timeout."""
+
+
+def _begin(conn):
+    conn.execute("BEGIN DEFERRED")
+    # a deferred transaction takes its snapshot at the first read, so read now
+    conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+
+@contextmanager
+def read_transaction(conn):
+    """Run the block's queries in one read transaction on ``conn``."""
+    if conn.in_transaction:  # already consistent
+        yield conn
+        return
+    _begin(conn)
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+class _Source:
+    """A database file and the read connections open on it."""
+
+    def __init__(self, path, pool, taken_at, copy):
+        self.path = path
+        self.pool = pool
+        self.taken_at = taken_at
+        self.copy = copy
+        self.users = 0
+        self.retired = False
+
+    def remove(self):
+        self.pool.close_all()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class Snapshot:
+    """One consistent read; ``conn`` sees the database as of ``taken_at``."""
+
+    def __init__(self, reader, source, conn):
+        self._reader = reader
+        self._source = source
+        self.conn = conn
+        self.taken_at = time.time() if not source.copy else source.taken_at
+        self._closed = False
+
+    @property
+    def age(self):
+        return time.time() - self.taken_at
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._reader._release(self._source, self.conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SnapshotReader:
+    """Per-worker source of snapshots, on the live database or on a backup copy."""
+
+    def __init__(self, path, size=2, timeout=10.0, max_age=0.0, directory=None, pragmas=None,
+                 factory=sqlite3.Connection):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.directory = directory or tempfile.gettempdir()
+        self.pragmas = dict(pragmas or db.DEFAULT_PRAGMAS, query_only=1)
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._pid = None
+        self._live = self._current = None
+        self._generation = 0
+        self._stats = {'snapshots': 0, 'busy': 0, 'refreshes': 0, 'refresh_seconds': 0.0}
+        atexit.register(self.close)
+
+    def _pool(self, path, pragmas):
+        return db.ConnectionPool(path, size=self.size, timeout=self.timeout, pragmas=pragmas, factory=self.factory)
+
+    def _check_pid(self):
+        if self._pid != os.getpid():  # a forked child makes its own copies
+            self._pid = os.getpid()
+            self._live = _Source(self.path, self._pool(self.path, self.pragmas), None, copy=False)
+            self._current = None
+
+    def _refresh(self):
+        """Back the live database up to a new copy and make it current."""
+        with self._lock:
+            self._generation += 1
+            name = f'{os.path.basename(self.path)}.snapshot-{os.getpid()}-{self._generation}'
+        path = os.path.join(self.directory, name)
+        start = time.perf_counter()
+        try:
+            with self._live.pool.connection() as src:
+                dst = sqlite3.connect(path)
+                try:
+                    src.backup(dst)  # in one step, so the copy is one consistent state
+                    # the copy is never written: no -wal and -shm files next to it
+                    dst.execute("PRAGMA journal_mode=DELETE")
+                finally:
+                    dst.close()
+        except BaseException:
+            if os.path.exists(path):
+                os.unlink(path)
+            raise
+        elapsed = time.perf_counter() - start
+        pragmas = {k: v for k, v in self.pragmas.items() if k not in ('journal_mode', 'journal_size_limit')}
+        fresh = _Source(path, self._pool(path, pragmas), time.time() - elapsed, copy=True)
+        with self._lock:
+            old, self._current = self._current, fresh
+            self._stats['refreshes'] += 1
+            self._stats['refresh_seconds'] += elapsed
+            if old is not None:
+                old.retired = True
+                if not old.users:
+                    old.remove()
+
+    def _ensure_fresh(self):
+        if not self.max_age:
+            return
+        current = self._current
+        if current is None or time.time() - current.taken_at > self.max_age:
+            with self._refresh_lock:  # one backup at a time; the others then use it
+                current = self._current
+                if current is None or time.time() - current.taken_at > self.max_age:
+                    self._refresh()
+
+    def open(self):
+        """Take a snapshot; close it (or use it as a context manager) when done."""
+        self._check_pid()
+        self._ensure_fresh()
+        with self._lock:  # counted before a refresh could retire it
+            source = self._current if self.max_age else self._live
+            source.users += 1
+        try:
+            conn = source.pool.acquire()
+        except db.PoolTimeout as e:
+            self._done(source, busy=True)
+            raise SnapshotsBusy(f'all {self.size} snapshot connections are in use') from e
+        try:
+            _begin(conn)
+        except BaseException:
+            source.pool.release(conn, discard=True)
+            self._done(source)
+            raise
+        with self._lock:
+            self._stats['snapshots'] += 1
+        return Snapshot(self, source, conn)
+
+    def _release(self, source, conn):
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        source.pool.release(conn)
+        self._done(source)
+
+    def _done(self, source, busy=False):
+        with self._lock:
+            source.users -= 1
+            if busy:
+                self._stats['busy'] += 1
+            remove = source.retired and not source.users
+        if remove:
+            source.remove()
+
+    def close(self):
+        """Delete this worker's copy (also run at exit)."""
+        if self._pid == os.getpid() and self._current is not None:
+            self._current.remove()
+
+    def stats(self):
+        self._check_pid()
+        with self._lock:
+            current = self._current if self.max_age else self._live
+            stats = dict(self._stats, mode='copy' if self.max_age else 'live', max_age=self.max_age,
+                         in_use=current.users if current else 0, size=self.size)
+            stats['copy_age'] = round(time.time() - current.taken_at, 1) if self.max_age and current else None
+        stats['refresh_seconds'] = round(stats['refresh_seconds'], 3)
+        return stats
+
+
+def _metric_families(app):
+    s = get_reader(app).stats()
+    return [
+        ('alumni_snapshots_total', 'counter', 'Snapshot reads taken for exports.', [((), s['snapshots'])]),
+        ('alumni_snapshots_busy_total', 'counter', 'Snapshot reads refused as all connections were in use.',
+         [((), s['busy'])]),
+        ('alumni_snapshot_refresh_seconds_total', 'counter', 'Time spent copying the database for snapshots.',
+         [((), s['refresh_seconds'])]),
+    ]
+
+
+def init_app(app, pool):
+    """Snapshot reads on ``pool``'s database, with its pragmas and (timed) connection class."""
+    reader = SnapshotReader(
+        pool.path,
+        size=int(app.config.get('SNAPSHOT_POOL_SIZE') or os.environ.get('SNAPSHOT_POOL_SIZE', 2)),
+        timeout=pool.timeout,
+        max_age=float(app.config.get('SNAPSHOT_MAX_AGE') or os.environ.get('SNAPSHOT_MAX_AGE', 0)),
+        directory=app.config.get('SNAPSHOT_DIR') or os.environ.get('SNAPSHOT_DIR'),
+        pragmas=pool.pragmas, factory=pool.factory)
+    app.extensions[EXTENSION_KEY] = reader
+    metrics.register_collector(app, lambda: _metric_families(app))
+    return reader
+
+
+def get_reader(app=None):
+    return (app or current_app).extensions[EXTENSION_KEY]
@@ -0,0 +1,5 @@
+"""Benchmarks for the AlumniConnect apps.
+
+Run a module with ``python -m benchmarks.<name> --help`` from the repository
+root. Each one writes its results as JSON (``--out``) so runs can be compared.
+"""
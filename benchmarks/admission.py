@@ -0,0 +1,111 @@
+"""What an anonymous write flood does to a signed-in user's saves, with and without admission control.
+
+In-process against the console app on a generated database: ``--flood``
+threads post alumni to ``POST /api/alumni`` as fast as they can, each from
+its own address, while one signed-in user saves through ``/alumni/add``
+(not rate limited, and not capped) every ``--interval`` ms. For each
+scenario, ``alumni_core.admission`` is set up as:
+
+- ``off``: no rate limit and no cap, as before;
+- ``rate``: ``--rate`` per address only;
+- ``cap``: ``--max-writers`` running writes and ``--max-queue`` waiting only;
+- ``both``: the two together, the default setup.
+
+Reports the user's save latency, and the flood's responses by status
+(errors such as ``PoolTimeout`` by name)::
+
+    python -m benchmarks.admission --scale 100k --seconds 10 --out admission.json
+"""
+import argparse, os, tempfile, threading, time
+from alumni_core import admission
+from benchmarks.common import admin_client, load_app, percentiles, write_results
+from benchmarks.datagen import generate, parse_scale
+
+SCENARIOS = ('off', 'rate', 'cap', 'both')
+
+
+def configure(module, scenario, args):
+    rate = admission.parse_rate(args.rate) if scenario in ('rate', 'both') else None
+    writers = args.max_writers if scenario in ('cap', 'both') else 0
+    module.app.extensions[admission.EXTENSION_KEY] = admission.Admission(
+        rate=rate, max_writers=writers, max_queue=args.max_queue, queue_timeout=args.queue_timeout)
+
+
+def run(module, scenario, args):
+    configure(module, scenario, args)
+    stop = threading.Event()
+    statuses, saves = {}, []
+    lock = threading.Lock()
+
+    def flood(n):
+        client = module.app.test_client()
+        i = 0
+        while not stop.is_set():
+            try:
+                status = client.post('/api/alumni', json={'name': f'Flood {scenario} {n} {i}', 'batch': '2020'},
+                                     environ_base={'REMOTE_ADDR': f'10.0.{n // 250}.{n % 250 + 1}'}).status_code
+            except Exception as e:  # TESTING propagates errors; a server would answer 500
+                status = type(e).__name__
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+            i += 1
+
+    signed_in = admin_client(module)
+
+    def user():
+        i = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                status = signed_in.post('/alumni/add', data={'name': f'Saved {scenario} {i}', 'batch': '2021',
+                                                             'email': f'saved.{scenario}.{i}@example.org'}).status_code
+            except Exception as e:
+                status = type(e).__name__
+            saves.append((time.perf_counter() - start, status))
+            i += 1
+            time.sleep(args.interval / 1000)
+
+    threads = [threading.Thread(target=flood, args=(n,)) for n in range(args.flood)] + [threading.Thread(target=user)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    ms = [s * 1000 for s, _ in saves]
+    row = {'scenario': scenario, 'saves': len(saves), 'failed_saves': sum(1 for _, code in saves if code != 302),
+           'save_ms': {k: round(v, 1) for k, v in percentiles(ms).items()}, 'save_max_ms': round(max(ms, default=0), 1),
+           'flood': {str(k): v for k, v in sorted(statuses.items(), key=str)},
+           'flood_written_per_s': round(statuses.get(201, 0) / args.seconds, 1)}
+    print(f"{scenario:5} saves {row['saves']:4} (failed {row['failed_saves']})  p50 {row['save_ms']['p50']:7} ms  "
+          f"p99 {row['save_ms']['p99']:7} ms  max {row['save_max_ms']:7} ms  flood {row['flood']}", flush=True)
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', default='100k', help='alumni in the generated database')
+    parser.add_argument('--flood', type=int, default=16, help='flooding threads, one address each')
+    parser.add_argument('--seconds', type=float, default=10.0, help='length of each scenario')
+    parser.add_argument('--interval', type=float, default=50.0, help='ms between the user\'s saves')
+    parser.add_argument('--rate', default='60/60')
+    parser.add_argument('--max-writers', type=int, default=2)
+    parser.add_argument('--max-queue', type=int, default=16)
+    parser.add_argument('--queue-timeout', type=float, default=2.0)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--dir', help='where to put the database (default: a temp directory)')
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = tempfile.TemporaryDirectory(dir=args.dir)
+    path = os.path.join(tmp.name, 'admission.db')
+    generate(path, parse_scale(args.scale))
+    os.environ.setdefault('EMAIL_OUTBOX_WORKER', '0')
+    module = load_app('console', path)
+    rows = [run(module, scenario, args) for scenario in args.scenarios.split(',')]
+    write_results('admission', {'scale': args.scale, 'flood': args.flood, 'seconds': args.seconds,
+                                'interval_ms': args.interval, 'rate': args.rate, 'max_writers': args.max_writers,
+                                'max_queue': args.max_queue, 'queue_timeout': args.queue_timeout, 'scenarios': rows}, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""What a sync script pays for the JSON API, one row at a time vs batched.
+
+Through the console's test client: inserts ``--rows`` alumni as single
+POSTs and then as JSON arrays of ``--batch`` items, and pages through all
+of ``/api/alumni`` with every column and with ``?fields=``::
+
+    python -m benchmarks.api --scale 100k --rows 5000 --batch 500 --out api.json
+"""
+import argparse, os, tempfile, time
+from benchmarks.common import admin_client, load_app, write_results
+from benchmarks.datagen import generate, parse_scale
+
+FIELDS = 'id,name,email'
+
+
+def _item(i):
+    return {'name': f'Sync {i}', 'batch': '2020', 'email': f'sync{i}@example.org', 'company': 'Bench',
+            'bio': 'Synced from the registrar. Skills: python, sql, go, rust.'}
+
+
+def writes(client, rows, size):
+    out = {}
+    start = time.perf_counter()
+    for i in range(rows):
+        resp = client.post('/api/alumni', json=_item(i))
+        if resp.status_code != 201:
+            raise RuntimeError(f'POST /api/alumni returned {resp.status_code}')
+    out['single'] = {'requests': rows, 'seconds': round(time.perf_counter() - start, 3)}
+    start = time.perf_counter()
+    requests = 0
+    for offset in range(0, rows, size):
+        resp = client.post('/api/alumni', json=[_item(i) for i in range(offset, min(rows, offset + size))])
+        requests += 1
+        if resp.status_code != 201 or resp.get_json()['errors']:
+            raise RuntimeError(f'batch POST /api/alumni returned {resp.status_code}')
+    out['batch'] = {'requests': requests, 'batch': size, 'seconds': round(time.perf_counter() - start, 3)}
+    for side in out.values():
+        side['rows_per_s'] = round(rows / side['seconds'], 1)
+    out['speedup'] = round(out['single']['seconds'] / out['batch']['seconds'], 1)
+    return out
+
+
+def reads(client, limit, fields):
+    path = f'/api/alumni?limit={limit}' + (f'&fields={fields}' if fields else '')
+    pages = rows = size = 0
+    cursor = None
+    start = time.perf_counter()
+    while True:
+        resp = client.get(path + (f'&after={cursor}' if cursor else ''))
+        body = resp.get_json()
+        pages += 1
+        rows += len(body['items'])
+        size += len(resp.get_data())
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    elapsed = time.perf_counter() - start
+    return {'fields': fields or '*', 'pages': pages, 'rows': rows, 'mb': round(size / 1e6, 2),
+            'seconds': round(elapsed, 3), 'rows_per_s': round(rows / elapsed, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing database from benchmarks.datagen (it is modified)')
+    parser.add_argument('--scale', default='10k', help='alumni to generate when --db is not given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rows', type=int, default=5000, help='alumni to insert each way')
+    parser.add_argument('--batch', type=int, default=500, help='items per batch POST')
+    parser.add_argument('--limit', type=int, default=500, help='page size for the reads')
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = None
+    if not args.db:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, 'bench.db')
+        generate(args.db, parse_scale(args.scale), args.seed)
+    os.environ.setdefault('EMAIL_OUTBOX_WORKER', '0')
+    module = load_app('console', args.db)
+    module.app.config['RESPONSE_CACHE_SIZE'] = 0
+    module.app.config['MAX_PAGE_SIZE'] = max(args.limit, module.app.config['MAX_PAGE_SIZE'])
+    client = admin_client(module)
+    result = {'scale': args.scale if tmp else None, 'writes': writes(client, args.rows, args.batch)}
+    print(f"writes: {result['writes']}", flush=True)
+    result['reads'] = [reads(client, args.limit, None), reads(client, args.limit, FIELDS)]
+    for r in result['reads']:
+        print(f"reads: {r}", flush=True)
+    write_results('api', result, args.out)
+
+
+if __name__ == '__main__':
+    main()
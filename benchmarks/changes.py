@@ -0,0 +1,129 @@
+"""Keeping a client's copy of ``/api/alumni`` current: full refetch vs the change feed.
+
+Through the console's test client, for ``--ticks`` rounds: writes ``--writes``
+changes (inserts, updates and deletes in equal parts), then brings a client
+up to date once by paging through all of ``/api/alumni`` and once with
+``GET /api/changes?since=``. Reports bytes and server time per round for
+each, and what the change-log triggers add to an insert::
+
+    python -m benchmarks.changes --scale 100k --writes 10 --out changes.json
+"""
+import argparse, os, tempfile, time
+from alumni_core import db
+from benchmarks.common import admin_client, load_app, percentiles, write_results
+from benchmarks.datagen import generate, parse_scale
+
+ROW = ('Bench Change', '2020', 'change@example.org', '', 'Bench', 'Synced. Skills: python, sql.', '')
+
+
+def _ms(values):
+    return {k: round(v * 1000, 2) if v is not None else None for k, v in percentiles(values).items()}
+
+
+def write_round(client, n, existing):
+    """``n`` writes to rows the client already has: inserts, edits and deletes in turn."""
+    for i in range(n):
+        if i % 3 == 0:
+            client.post('/api/alumni', json={'name': f'Change {i}', 'batch': '2020'})
+        elif i % 3 == 1:
+            client.post(f'/alumni/edit/{existing[-1]}', data={'name': f'Changed {i}', 'batch': '2021'})
+        else:
+            client.post(f'/alumni/delete/{existing.pop()}')
+
+
+def refetch(client, limit):
+    size, cursor = 0, None
+    start = time.perf_counter()
+    while True:
+        resp = client.get(f'/api/alumni?limit={limit}' + (f'&after={cursor}' if cursor else ''))
+        size += len(resp.get_data())
+        cursor = resp.get_json()['next_cursor']
+        if not cursor:
+            return time.perf_counter() - start, size
+
+
+def catch_up(client, since):
+    size, received = 0, 0
+    start = time.perf_counter()
+    while True:
+        resp = client.get(f'/api/changes?since={since}&tables=alumni')
+        size += len(resp.get_data())
+        body = resp.get_json()
+        since, received = body['cursor'], received + len(body['changes'])
+        if not body['has_more']:
+            return time.perf_counter() - start, size, since, received
+
+
+def sync(client, ticks, writes, limit):
+    since = client.get('/api/changes').get_json()['cursor']
+    existing = [a['id'] for a in client.get(f'/api/alumni?fields=id&limit={limit}').get_json()['items']]
+    full, delta = {'s': [], 'bytes': []}, {'s': [], 'bytes': [], 'changes': []}
+    for _ in range(ticks):
+        write_round(client, writes, existing)
+        seconds, size = refetch(client, limit)
+        full['s'].append(seconds)
+        full['bytes'].append(size)
+        seconds, size, since, received = catch_up(client, since)
+        delta['s'].append(seconds)
+        delta['bytes'].append(size)
+        delta['changes'].append(received)
+    out = {}
+    for name, side in (('refetch', full), ('changes', delta)):
+        out[name] = {'ms': _ms(side['s']), 'kb_per_round': round(sum(side['bytes']) / len(side['bytes']) / 1e3, 1)}
+    out['changes']['changes_per_round'] = round(sum(delta['changes']) / ticks, 1)
+    out['speedup'] = round(sum(full['s']) / sum(delta['s']), 1)
+    out['bytes_ratio'] = round(sum(full['bytes']) / sum(delta['bytes']), 1)
+    return out
+
+
+def trigger_cost(conn, n):
+    """Per-insert cost of the change-log trigger, in transactions that are rolled back."""
+    def insert(drop_trigger):
+        conn.execute("BEGIN")
+        if drop_trigger:
+            conn.execute("DROP TRIGGER alumni_change_insert")
+        start = time.perf_counter()
+        conn.executemany("INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)", [ROW] * n)
+        elapsed = time.perf_counter() - start
+        conn.rollback()
+        return elapsed
+
+    with_log, without_log = insert(False), insert(True)
+    return {'rows': n, 'insert_us': round(with_log / n * 1e6, 1),
+            'insert_without_log_us': round(without_log / n * 1e6, 1),
+            'log_overhead_us': round((with_log - without_log) / n * 1e6, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing database from benchmarks.datagen (it is modified)')
+    parser.add_argument('--scale', default='10k', help='alumni to generate when --db is not given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--ticks', type=int, default=20, help='rounds of writes followed by a sync')
+    parser.add_argument('--writes', type=int, default=10, help='changes per round')
+    parser.add_argument('--limit', type=int, default=500, help='page size for the full refetch')
+    parser.add_argument('--rows', type=int, default=5000, help='inserts for the trigger cost')
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = None
+    if not args.db:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, 'bench.db')
+        generate(args.db, parse_scale(args.scale), args.seed)
+    os.environ.setdefault('EMAIL_OUTBOX_WORKER', '0')
+    module = load_app('console', args.db)
+    module.app.config['RESPONSE_CACHE_SIZE'] = 0
+    module.app.config['MAX_PAGE_SIZE'] = max(args.limit, module.app.config['MAX_PAGE_SIZE'])
+    client = admin_client(module)
+    result = {'scale': args.scale if tmp else None, 'writes_per_round': args.writes, 'sync': sync(client, args.ticks, args.writes, args.limit)}
+    print(f"sync: {result['sync']}", flush=True)
+    conn = db.connect(args.db)
+    conn.isolation_level = None  # explicit BEGIN/ROLLBACK in trigger_cost()
+    result['trigger'] = trigger_cost(conn, args.rows)
+    print(f"trigger: {result['trigger']}", flush=True)
+    conn.close()
+    write_results('changes', result, args.out)
+
+
+if __name__ == '__main__':
+    main()
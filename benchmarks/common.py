@@ -0,0 +1,65 @@
+"""Helpers shared by the benchmark scripts."""
+import importlib.util, json, os, platform, resource, sqlite3, sys, time
+from benchmarks.datagen import PASSWORD
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = {
+    'community': os.path.join(ROOT, 'app.py'),
+    'console': os.path.join(ROOT, 'alumni_connect_flask', 'app.py'),
+}
+ADMIN = {'username': 'admin', 'password': PASSWORD}  # as seeded by benchmarks.datagen
+
+
+def load_app(which, db_path):
+    """Import one of the apps against ``db_path`` and run its init_db()."""
+    os.environ['ALUMNI_DB'] = db_path
+    os.environ.setdefault('MAINTENANCE_WORKER', '0')  # no ANALYZE or vacuum in the middle of a measurement
+    os.environ.setdefault('ADMISSION_RATE', '0')  # every simulated client posts from the same address
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    name = f'bench_{which}_app'
+    spec = importlib.util.spec_from_file_location(name, APPS[which])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    module.init_db()
+    module.app.config['TESTING'] = True
+    return module
+
+
+def admin_client(module):
+    client = module.app.test_client()
+    resp = client.post('/login', data=ADMIN)
+    if resp.status_code != 302:
+        raise RuntimeError(f'admin login failed ({resp.status_code})')
+    return client
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    if not samples:
+        return {f'p{p}': None for p in points}
+    ordered = sorted(samples)
+    return {f'p{p}': ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] for p in points}
+
+
+def environment():
+    return {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def write_results(name, results, out=None):
+    """Print results and, if ``out`` is given, save them as JSON with run metadata."""
+    doc = {'benchmark': name, 'environment': environment(), 'results': results}
+    text = json.dumps(doc, indent=2, default=str)
+    if out:
+        with open(out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return doc
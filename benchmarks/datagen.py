@@ -0,0 +1,137 @@
+"""Seeded synthetic data for benchmarks.
+
+Fills every table both apps use with realistic-looking rows. The same seed
+and scale always produce the same database::
+
+    python -m benchmarks.datagen bench.db --scale 100k --seed 1
+
+``--scale`` is the number of alumni (``1k``, ``100k``, ``1M`` or a plain
+number); the other tables are sized relative to it (see ``RATIOS``). Every
+user's password is ``benchpass``; ``admin`` is an administrator.
+"""
+import argparse, datetime, os, random, sys, time
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+# rows per alumnus
+RATIOS = {'users': 0.1, 'events': 0.05, 'mentorships': 0.1, 'mentor_applications': 0.05, 'pw_reset_tokens': 0.02}
+PASSWORD = 'benchpass'
+BATCH = 5000
+
+FIRST = ('Aarav', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Meera', 'Karan', 'Isha', 'Rohan', 'Divya',
+         'Amit', 'Neha', 'Siddharth', 'Pooja', 'José', 'Zoë', 'Chloé', 'Noah', 'Emma', 'Liam', 'Olivia', 'Mateo')
+LAST = ('Sharma', 'Patel', 'Iyer', 'Reddy', 'Gupta', 'Nair', 'Singh', 'Khan', 'Das', 'Mehta', 'Rao', 'Joshi',
+        'García', 'Müller', 'Smith', 'Chen', 'Kim', 'Okafor', 'Silva', 'Rossi')
+COMPANIES = ('Google', 'Microsoft', 'Amazon', 'Infosys', 'TCS', 'Wipro', 'Flipkart', 'Zomato', 'Razorpay', 'Atlassian',
+             'Adobe', 'Oracle', 'Deloitte', 'Accenture', 'Goldman Sachs', 'Startup', 'ISRO', 'DRDO', 'Freelance', '')
+FIELDS = ('data science', 'web development', 'cloud', 'product management', 'machine learning', 'cyber security',
+          'embedded systems', 'finance', 'design', 'research', 'entrepreneurship', 'devops')
+SKILLS = ('python', 'sql', 'react', 'kubernetes', 'aws', 'go', 'java', 'spark', 'figma', 'rust', 'c++', 'excel',
+          'tableau', 'pytorch', 'flask', 'django', 'terraform', 'linux')
+VENUES = ('Main auditorium', 'Seminar hall 2', 'Online', 'Library lawn', 'Convention centre', 'Alumni house')
+EVENT_KINDS = ('Reunion', 'Career fair', 'Tech talk', 'Hackathon', 'Workshop', 'Panel', 'Meetup')
+
+
+def parse_scale(value):
+    value = str(value).lower().replace('_', '')
+    if value in SCALES:
+        return SCALES[value]
+    if value.endswith('k'):
+        return int(float(value[:-1]) * 1000)
+    if value.endswith('m'):
+        return int(float(value[:-1]) * 1000000)
+    return int(value)
+
+
+def _stamp(rnd, start, span_days):
+    return (start + datetime.timedelta(seconds=rnd.randrange(span_days * 86400))).isoformat()
+
+
+def alumni_rows(rnd, n):
+    start = datetime.datetime(2015, 1, 1)
+    for i in range(n):
+        first, last = rnd.choice(FIRST), rnd.choice(LAST)
+        company = rnd.choice(COMPANIES)
+        bio = f"{rnd.choice(FIELDS).capitalize()} at {company or 'a small firm'}. Skills: {', '.join(rnd.sample(SKILLS, 4))}."
+        yield (f'{first} {last}', str(rnd.randrange(1995, 2025)), f'{first}.{last}.{i}@example.org'.lower(),
+               f'+91{rnd.randrange(7000000000, 9999999999)}', company, bio, _stamp(rnd, start, 3650))
+
+
+def _batched(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(db_path, alumni=1000, seed=1, progress=None):
+    """Create (or extend) ``db_path`` with ``alumni`` alumni and proportional other tables."""
+    from alumni_core import db, hashing, ingest, migrations
+    rnd = random.Random(seed)
+    conn = db.connect(db_path)
+    migrations.migrate(conn)
+    pw = hashing.generate(PASSWORD)  # one hash for everybody: hashing 100k passwords is not the point
+    counts = {t: max(1, int(alumni * r)) for t, r in RATIOS.items()}
+    counts['alumni'] = alumni
+    start = time.perf_counter()
+    now = datetime.datetime(2025, 6, 1)
+
+    def insert(table, sql, rows):
+        for batch in _batched(rows):
+            conn.execute("BEGIN")
+            conn.executemany(sql, batch)
+            conn.commit()
+        if progress:
+            progress(f'{table}: {counts[table]} rows ({time.perf_counter() - start:.1f}s)')
+
+    conn.execute("INSERT OR IGNORE INTO users (username,password_hash,role,email) VALUES ('admin',?,'admin','admin@local')", (pw,))
+    conn.commit()
+    insert('users', "INSERT OR IGNORE INTO users (username,password_hash,role,email) VALUES (?,?,?,?)",
+           ((f'user{i}', pw, 'editor' if i % 50 == 0 else 'user', f'user{i}@example.org') for i in range(counts['users'])))
+    insert('alumni', "INSERT INTO alumni (name,batch,email,phone,company,bio,created_at,dedup_key) VALUES (?,?,?,?,?,?,?,?)",
+           (row + (ingest.dedup_key(*row[:4]),) for row in alumni_rows(rnd, alumni)))
+    insert('events', "INSERT INTO events (title,date,venue,description,created_at) VALUES (?,?,?,?,?)",
+           ((f'{rnd.choice(EVENT_KINDS)} {i}', _stamp(rnd, datetime.datetime(2018, 1, 1), 3000)[:10], rnd.choice(VENUES),
+             f'{rnd.choice(FIELDS).capitalize()} for batches {rnd.randrange(1995, 2025)}+', _stamp(rnd, datetime.datetime(2018, 1, 1), 2500))
+            for i in range(counts['events'])))
+    insert('mentorships', "INSERT INTO mentorships (title,alumni_id,student_name,field,note,approved,created_at) VALUES (?,?,?,?,?,?,?)",
+           ((f'Guidance on {f}', rnd.randrange(1, alumni + 1), f'{rnd.choice(FIRST)} {rnd.choice(LAST)}', f,
+             f"Looking for help with {', '.join(rnd.sample(SKILLS, 2))}", int(rnd.random() > 0.2),
+             _stamp(rnd, datetime.datetime(2020, 1, 1), 1800)) for f in (rnd.choice(FIELDS) for _ in range(counts['mentorships']))))
+    insert('mentor_applications', "INSERT INTO mentor_applications (user_id,name,email,field,note,status,created_at) VALUES (?,?,?,?,?,?,?)",
+           ((rnd.randrange(1, counts['users'] + 1), f'{rnd.choice(FIRST)} {rnd.choice(LAST)}', f'mentor{i}@example.org',
+             rnd.choice(FIELDS), 'Happy to help juniors', rnd.choice(('pending', 'pending', 'approved', 'rejected')),
+             _stamp(rnd, datetime.datetime(2020, 1, 1), 1800)) for i in range(counts['mentor_applications'])))
+    insert('pw_reset_tokens', "INSERT INTO pw_reset_tokens (user_id,token,expires_at) VALUES (?,?,?)",
+           ((rnd.randrange(1, counts['users'] + 1), f'bench-token-{i}-{rnd.getrandbits(64):016x}',
+             (now + datetime.timedelta(hours=rnd.randrange(-48, 48))).isoformat()) for i in range(counts['pw_reset_tokens'])))
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.datagen', description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--scale', default='1k', help='number of alumni: 1k, 100k, 1M or a number')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--force', action='store_true', help='delete the database first if it exists')
+    args = parser.parse_args(argv)
+    if os.path.exists(args.database):
+        if not args.force:
+            parser.error(f'{args.database} exists (use --force to replace it)')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.database + suffix):
+                os.remove(args.database + suffix)
+    start = time.perf_counter()
+    counts = generate(args.database, parse_scale(args.scale), args.seed, progress=print)
+    print(f'{sum(counts.values())} rows in {time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
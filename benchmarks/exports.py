@@ -0,0 +1,83 @@
+"""Peak RSS and time to first byte for each export format.
+
+Each format runs in a fresh child process against the same database so the
+peak RSS figures do not contaminate each other::
+
+    python -m benchmarks.exports --rows 200000 --out exports.json
+
+``legacy-json`` reproduces the pre-streaming export (fetchall, one
+``json.dumps(indent=2)`` and a BytesIO copy) for comparison. Run with
+``SQLITE_MMAP_SIZE=0`` to keep memory-mapped database pages, which are
+file-backed and shared between workers, out of the RSS figures.
+"""
+import argparse, io, json, os, subprocess, sys, tempfile, time
+from benchmarks.common import admin_client, load_app, peak_rss_mb, write_results
+from benchmarks.datagen import generate
+
+FORMATS = {
+    'json': '/export/json',
+    'json.gz': '/export/json?gzip=1',
+    'ndjson': '/export/json?format=ndjson',
+    'ndjson.gz': '/export/json?format=ndjson&gzip=1',
+    'csv': '/export/csv?table=alumni',
+    'csv.gz': '/export/csv?table=alumni&gzip=1',
+    'excel': '/export/excel',
+    'legacy-json': None,
+}
+
+
+def legacy_json(conn):
+    data = {t: [dict(r) for r in conn.execute(f"SELECT * FROM {t}").fetchall()]
+            for t in ('alumni', 'events', 'mentorships')}
+    buf = io.BytesIO(); buf.write(json.dumps(data, indent=2).encode('utf-8')); buf.seek(0)
+    return [buf.getvalue()]
+
+
+def run_child(fmt, db_path):
+    module = load_app('console', db_path)
+    client = admin_client(module)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if fmt == 'legacy-json':
+        with module.app.app_context():
+            chunks = iter(legacy_json(module.db.get_pool().acquire()))
+    else:
+        resp = client.get(FORMATS[fmt], buffered=False)
+        assert resp.status_code == 200, resp.status_code
+        chunks = iter(resp.response)
+    first = next(chunks, b'')
+    ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(c) for c in chunks)
+    total = time.perf_counter() - start
+    return {'format': fmt, 'mmap_size': module.db.get_pool(module.app).pragmas['mmap_size'], 'bytes': size, 'ttfb_ms': round(ttfb * 1000, 1), 'total_s': round(total, 3),
+            'baseline_rss_mb': baseline, 'peak_rss_mb': peak_rss_mb(),
+            'export_rss_mb': round(peak_rss_mb() - baseline, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='alumni rows (see benchmarks.datagen for the rest)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--db', help='reuse an existing database instead of generating one')
+    parser.add_argument('--out')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print(json.dumps(run_child(args.child, args.db)))
+        return
+    tmp = None
+    if not args.db:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, 'bench.db')
+        generate(args.db, args.rows, args.seed)
+    results = []
+    for fmt in args.formats.split(','):
+        out = subprocess.run([sys.executable, '-m', 'benchmarks.exports', '--child', fmt, '--db', args.db],
+                             check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    write_results('exports', {'rows': args.rows, 'formats': results}, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Password verifications per second per core for each hash cost setting.
+
+A login costs one verify (plus one hash when the stored hash is upgraded),
+so verifies/s on one core is the login ceiling per core::
+
+    python -m benchmarks.hashing --out hashing.json
+    python -m benchmarks.hashing --methods scrypt:32768:8:1,pbkdf2:sha256:600000 --workers 4
+
+With ``--workers N`` the same verifies also go through ``HashingService``
+with N pool workers, to show how throughput scales across cores.
+"""
+import argparse, threading, time
+from werkzeug.security import check_password_hash, generate_password_hash
+from alumni_core.hashing import HashingService
+from benchmarks.common import percentiles, write_results
+
+METHODS = (
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+)
+
+
+def single_core(stored, seconds):
+    samples = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end or len(samples) < 3:
+        start = time.perf_counter()
+        check_password_hash(stored, 'correct horse battery staple')
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def through_service(method, stored, workers, seconds, pool):
+    service = HashingService(method, workers=workers, max_pending=workers * 4, timeout=60, pool=pool)
+    done = []
+    end = time.perf_counter() + seconds
+
+    def client():
+        n = 0
+        while time.perf_counter() < end:
+            service.verify(stored, 'correct horse battery staple')
+            n += 1
+        done.append(n)
+    service.verify(stored, 'correct horse battery staple')  # start the pool outside the timing
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(workers * 2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    service.shutdown()
+    return round(sum(done) / elapsed, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', default=','.join(METHODS))
+    parser.add_argument('--seconds', type=float, default=3.0, help='measuring time per method')
+    parser.add_argument('--workers', type=int, default=0, help='also measure HashingService with N workers')
+    parser.add_argument('--pool', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    results = []
+    for method in args.methods.split(','):
+        stored = generate_password_hash('correct horse battery staple', method)
+        samples = single_core(stored, args.seconds)
+        row = {'method': method, 'verifies': len(samples),
+               'logins_per_s_per_core': round(len(samples) / sum(samples), 1),
+               'ms': {k: round(v * 1000, 1) for k, v in percentiles(samples).items()}}
+        if args.workers:
+            row[f'logins_per_s_{args.workers}_workers'] = through_service(method, stored, args.workers, args.seconds, args.pool)
+        results.append(row)
+        print(f"{method:24} {row['logins_per_s_per_core']:8.1f}/s per core", flush=True)
+    write_results('hashing', {'seconds': args.seconds, 'workers': args.workers, 'pool': args.pool, 'methods': results}, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Re-ingesting the same alumni: blind inserts vs the dedup upsert (``alumni_core.ingest``).
+
+Streams ``--rows`` generated alumni (the same seed every pass, so a pass
+is a nightly re-upload of the registrar's file) in transactions of
+``--chunk`` rows, as the CSV import does:
+
+- ``blind``: the old ``INSERT``, twice; the second pass doubles the table;
+- ``upsert``: the first load, then the same file again, then a file where
+  ``--changed`` of the people have a new company and ``--new`` are new;
+- ``dedupe``: the one-off job on the blind table, unkeyed as a database
+  from before migration 12 would be.
+
+Reports rows per second, the counts and the table size after each pass::
+
+    python -m benchmarks.ingest --rows 1000000 --out ingest.json
+"""
+import argparse, os, random, tempfile, time
+from alumni_core import db, ingest, migrations
+from benchmarks.common import write_results
+from benchmarks.datagen import alumni_rows, parse_scale
+
+INSERT = "INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)"
+
+
+def records(n, seed, changed=0.0, new=0.0):
+    """``n`` generated alumni as dicts; a share of them edited or replaced by new people."""
+    rnd = random.Random(seed + 1)
+    for i, row in enumerate(alumni_rows(random.Random(seed), n)):
+        rec = dict(zip(ingest.COLUMNS, row[:6]))
+        draw = rnd.random()
+        if draw < new:
+            rec['email'] = f'new.{i}@example.org'
+        elif draw < new + changed:
+            rec['company'] = f'Moved {i}'
+        yield rec
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def fresh(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = db.connect(path)
+    migrations.migrate(conn)
+    return conn
+
+
+def _count(conn):
+    return conn.execute("SELECT count(*) FROM alumni").fetchone()[0]
+
+
+def blind(conn, rows, chunk):
+    start = time.perf_counter()
+    for part in chunked(rows, chunk):
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(INSERT, [tuple(r[c] for c in ingest.COLUMNS) + ('',) for r in part])
+        conn.commit()
+    return time.perf_counter() - start, {}
+
+
+def upsert(conn, rows, chunk):
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0}
+    start = time.perf_counter()
+    for part in chunked(rows, chunk):
+        conn.execute("BEGIN IMMEDIATE")
+        result = ingest.upsert(conn, part, batch=chunk)
+        conn.commit()
+        for name in counts:
+            counts[name] += result[name]
+    return time.perf_counter() - start, counts
+
+
+def measure(name, conn, fn, rows, n, chunk):
+    seconds, counts = fn(conn, rows, chunk)
+    out = {'pass': name, 'seconds': round(seconds, 2), 'rows_per_second': round(n / seconds), 'table_rows': _count(conn)}
+    out.update(counts)
+    print(f"{name:22} {seconds:8.2f} s  {out['rows_per_second']:8} rows/s  table {out['table_rows']:9}  {counts}", flush=True)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='1M', help='alumni per pass: 100k, 1M or a number')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--chunk', type=int, default=ingest.BATCH, help='rows per transaction')
+    parser.add_argument('--changed', type=float, default=0.1, help='share of people edited in the last pass')
+    parser.add_argument('--new', type=float, default=0.05, help='share of new people in the last pass')
+    parser.add_argument('--dir', help='where to put the databases (default: a temp directory)')
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    n = parse_scale(args.rows)
+    tmp = tempfile.TemporaryDirectory(dir=args.dir)
+    passes = []
+
+    conn = fresh(os.path.join(tmp.name, 'blind.db'))
+    passes.append(measure('blind first load', conn, blind, records(n, args.seed), n, args.chunk))
+    passes.append(measure('blind re-ingest', conn, blind, records(n, args.seed), n, args.chunk))
+    start = time.perf_counter()
+    result = ingest.dedupe(conn, batch=args.chunk, pause=0)
+    seconds = time.perf_counter() - start
+    passes.append(dict(result, **{'pass': 'dedupe job', 'seconds': round(seconds, 2),
+                                  'rows_per_second': round(result['scanned'] / seconds), 'table_rows': _count(conn)}))
+    print(f"{'dedupe job':22} {seconds:8.2f} s  table {_count(conn):9}  {result}", flush=True)
+    conn.close()
+
+    conn = fresh(os.path.join(tmp.name, 'upsert.db'))
+    passes.append(measure('upsert first load', conn, upsert, records(n, args.seed), n, args.chunk))
+    passes.append(measure('upsert re-ingest', conn, upsert, records(n, args.seed), n, args.chunk))
+    passes.append(measure('upsert with changes', conn, upsert, records(n, args.seed, args.changed, args.new), n, args.chunk))
+    conn.close()
+    write_results('ingest', {'rows': n, 'chunk': args.chunk, 'changed': args.changed, 'new': args.new, 'passes': passes}, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""Concurrent mixed read/write load against a local server.
+
+Starts gunicorn (``gunicorn.conf.py``, or the app's dev server with
+``--server dev``) for one of the apps on a generated database, logs in a
+number of keep-alive HTTP clients and drives a weighted mix of reads and
+writes for a fixed duration, then reports requests per second and
+p50/p95/p99 latency overall and per operation::
+
+    python -m benchmarks.load --app console --scale 100k --clients 32 --duration 30 --out load.json
+    python -m benchmarks.load --app community --db bench.db --mix write-heavy --workers 4 --threads 8
+
+Requires gunicorn (``pip install gunicorn``). The client runs in this
+process, so keep an eye on its CPU use: on a small machine the driver can be
+the bottleneck, in which case run it from another host with ``--url``.
+"""
+import argparse, http.client, json, os, random, signal, socket, subprocess, sys, tempfile, threading, time, urllib.parse
+from benchmarks.common import ADMIN, APPS, ROOT, percentiles, write_results
+from benchmarks.datagen import COMPANIES, FIELDS, SKILLS, generate, parse_scale
+
+MIXES = {'read': 1.0, 'mixed': 0.9, 'write-heavy': 0.5}  # share of reads
+
+
+def _words(rnd):
+    return urllib.parse.quote(f'{rnd.choice(COMPANIES) or "python"} {rnd.choice(SKILLS)[:3]}')
+
+
+def _form(data):
+    return 'application/x-www-form-urlencoded', urllib.parse.urlencode(data).encode()
+
+
+def _json(data):
+    return 'application/json', json.dumps(data).encode()
+
+
+# (name, weight among reads/writes, method, path(rnd), body(rnd) -> (content type, bytes) or None)
+OPERATIONS = {
+    'community': {
+        'read': [
+            ('alumni_page', 4, 'GET', lambda r: '/alumni', None),
+            ('alumni_batch', 2, 'GET', lambda r: f'/alumni?batch={r.randrange(1995, 2025)}', None),
+            ('alumni_search', 2, 'GET', lambda r: f'/alumni?q={_words(r)}', None),
+            ('events_page', 2, 'GET', lambda r: '/events', None),
+            ('mentorship_page', 2, 'GET', lambda r: f'/mentorship?field={urllib.parse.quote(r.choice(FIELDS))}', None),
+        ],
+        'write': [
+            ('alumni_add', 4, 'POST', lambda r: '/alumni/add',
+             lambda r: _form({'name': 'Load Test', 'batch': str(r.randrange(1995, 2025)), 'email': 'load@example.org',
+                              'company': r.choice(COMPANIES), 'bio': 'load test'})),
+            ('event_add', 1, 'POST', lambda r: '/events/add',
+             lambda r: _form({'title': 'Load event', 'date': '2030-01-01', 'venue': 'Hall', 'description': 'x'})),
+            ('mentorship_add', 2, 'POST', lambda r: '/mentorship/add',
+             lambda r: _form({'title': 'Load', 'student_name': 'S', 'field': r.choice(FIELDS), 'note': 'x'})),
+            ('apply_mentor', 1, 'POST', lambda r: '/apply-mentor',
+             lambda r: _form({'name': 'Load', 'email': 'load@example.org', 'field': r.choice(FIELDS), 'note': 'x'})),
+        ],
+    },
+    'console': {
+        'read': [
+            ('api_alumni', 4, 'GET', lambda r: '/api/alumni', None),
+            ('api_alumni_batch', 2, 'GET', lambda r: f'/api/alumni?batch={r.randrange(1995, 2025)}', None),
+            ('api_search', 3, 'GET', lambda r: f'/api/alumni/search?q={_words(r)}', None),
+            ('api_events', 2, 'GET', lambda r: '/api/events', None),
+            ('api_mentorships', 2, 'GET', lambda r: '/api/mentorships', None),
+            ('alumni_page', 2, 'GET', lambda r: '/alumni', None),
+            ('api_insights', 1, 'GET', lambda r: '/api/insights', None),
+        ],
+        'write': [
+            ('api_alumni_post', 4, 'POST', lambda r: '/api/alumni',
+             lambda r: _json({'name': 'Load Test', 'batch': str(r.randrange(1995, 2025)), 'email': 'load@example.org',
+                              'company': r.choice(COMPANIES), 'bio': 'load test'})),
+            ('api_events_post', 1, 'POST', lambda r: '/api/events',
+             lambda r: _json({'title': 'Load event', 'date': '2030-01-01', 'venue': 'Hall'})),
+            ('api_mentorships_post', 2, 'POST', lambda r: '/api/mentorships',
+             lambda r: _json({'title': 'Load', 'student_name': 'S', 'field': r.choice(FIELDS)})),
+        ],
+    },
+}
+
+
+class Client:
+    """One keep-alive HTTP connection with a session cookie."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, path, body=None):
+        headers = {'Accept': 'application/json, text/html'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        if body is not None:
+            headers['Content-Type'], body = body
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()  # reconnect on the next request
+            raise
+        resp.read()
+        cookie = resp.getheader('Set-Cookie')
+        if cookie and cookie.startswith('session='):
+            self.cookie = cookie.split(';', 1)[0]
+        return resp.status
+
+    def login(self):
+        status = self.request('POST', '/login', _form(ADMIN))
+        if status != 302 or not self.cookie:
+            raise RuntimeError(f'login failed with status {status}')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+SERVERS = ('gunicorn', 'dev')
+
+
+def start_server(which, db_path, port, workers=2, threads=4, server='gunicorn', extra_env=None):
+    """Start ``which`` on ``port``: gunicorn with gunicorn.conf.py, or the app's own dev server."""
+    env = dict(os.environ, ALUMNI_DB=db_path, ALUMNI_APP=which, PORT=str(port), EMAIL_OUTBOX_WORKER='0', MAINTENANCE_WORKER='0', **(extra_env or {}))
+    env.setdefault('ADMISSION_RATE', '0')  # the load generator is one address
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (ROOT, env.get('PYTHONPATH')) if p)
+    if server == 'gunicorn':
+        # preload_app runs init_db() once in the master (see wsgi.py)
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), '--chdir', ROOT,
+               '-b', f'127.0.0.1:{port}', '-w', str(workers), '--threads', str(threads), '--log-level', 'warning']
+    else:
+        cmd = [sys.executable, APPS[which]]  # `python app.py`, as the Dockerfile used to
+    # own process group: the dev server's reloader forks a child that must go too
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(APPS[which]), env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL if server == 'dev' else None, stderr=subprocess.DEVNULL if server == 'dev' else None)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{server} exited with {proc.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f'{server} did not start within 60s')
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(15)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+
+
+def drive(host, port, operations, read_share, clients, duration, warmup, seed):
+    reads, writes = operations['read'], operations['write']
+    samples = {name: [] for name, *_ in reads + writes}
+    errors = {name: 0 for name in samples}
+    lock = threading.Lock()
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+    sessions = []
+    for _ in range(clients):
+        c = Client(host, port)
+        c.login()
+        sessions.append(c)
+
+    def worker(n, client):
+        rnd = random.Random(seed + n)
+        local = {name: [] for name in samples}
+        local_errors = dict.fromkeys(samples, 0)
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            pool = reads if rnd.random() < read_share or not writes else writes
+            name, _, method, path, body = rnd.choices(pool, weights=[op[1] for op in pool])[0]
+            t0 = time.perf_counter()
+            try:
+                status = client.request(method, path(rnd), body(rnd) if body else None)
+                ok = status < 400
+            except (http.client.HTTPException, OSError):
+                ok = False
+            elapsed = time.perf_counter() - t0
+            if t0 >= start_at:  # discard warm-up requests
+                local[name].append(elapsed)
+                if not ok:
+                    local_errors[name] += 1
+        with lock:
+            for name in samples:
+                samples[name] += local[name]
+                errors[name] += local_errors[name]
+    threads = [threading.Thread(target=worker, args=(n, c)) for n, c in enumerate(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    def summary(values, errs):
+        return {'requests': len(values), 'errors': errs, 'rps': round(len(values) / duration, 1),
+                'ms': {k: round(v * 1000, 2) if v is not None else None for k, v in percentiles(values).items()}}
+    everything = [v for values in samples.values() for v in values]
+    return {'overall': summary(everything, sum(errors.values())),
+            'operations': {name: summary(values, errors[name]) for name, values in samples.items() if values}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', choices=sorted(APPS), default='console')
+    parser.add_argument('--db', help='existing database from benchmarks.datagen (it is modified)')
+    parser.add_argument('--scale', default='100k', help='alumni to generate when --db is not given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--server', choices=SERVERS, default='gunicorn', help="'dev' runs `python app.py` instead")
+    parser.add_argument('--url', help='drive an already running server instead of starting one')
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = proc = None
+    if args.url:
+        parsed = urllib.parse.urlsplit(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        if not args.db:
+            tmp = tempfile.TemporaryDirectory()
+            args.db = os.path.join(tmp.name, 'bench.db')
+            print(f'generating {args.scale} alumni ...', flush=True)
+            generate(args.db, parse_scale(args.scale), args.seed)
+        host, port = '127.0.0.1', _free_port()
+        proc = start_server(args.app, args.db, port, args.workers, args.threads, args.server)
+    try:
+        result = drive(host, port, OPERATIONS[args.app], MIXES[args.mix], args.clients, args.duration, args.warmup, args.seed)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+    config = {k: getattr(args, k) for k in ('app', 'server', 'mix', 'clients', 'duration', 'warmup', 'workers', 'threads', 'seed')}
+    config['scale'] = args.scale if tmp else None
+    write_results('load', {'config': config, **result}, args.out)
+
+
+if __name__ == '__main__':
+    main()
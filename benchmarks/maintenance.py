@@ -0,0 +1,129 @@
+"""What the maintenance jobs (``alumni_core.maintenance``) cost, and what writers notice.
+
+On a copy of a generated database: the one-off ``VACUUM`` that turns on
+incremental auto-vacuum, then ``--tokens`` expired reset tokens purged by
+the job (in batches) and by one ``DELETE``, then half the alumni deleted
+(as a replace import would) and the free pages handed back by the job,
+then ``optimize`` and ``checkpoint``. A probe thread commits one insert
+every ``--interval`` ms throughout; the slowest probe write during each
+step shows how long the step held the write lock::
+
+    python -m benchmarks.maintenance --scale 100k --tokens 200000 --out maintenance.json
+"""
+import argparse, datetime, os, tempfile, threading, time
+from alumni_core import db, maintenance
+from benchmarks.common import write_results
+from benchmarks.datagen import generate, parse_scale
+
+PROBE = ('Probe', '2020', 'probe@example.org', '', 'Bench', 'probe', '')
+
+
+class Probe:
+    """Commits an insert every ``interval`` seconds; ``step`` reports the slowest one that overlapped it."""
+
+    def __init__(self, path, interval):
+        self.conn = db.connect(path)
+        self.interval = interval
+        self.writes = []  # (start, end)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            self.conn.execute("INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)", PROBE)
+            self.conn.commit()
+            self.writes.append((start, time.perf_counter()))
+            time.sleep(self.interval)
+
+    def _settle(self):
+        """Wait for a write that started after now, so no earlier wait spills into the next step."""
+        mark = time.perf_counter()
+        while not any(start > mark for start, _ in self.writes[-3:]):
+            time.sleep(self.interval)
+
+    def step(self, fn, *args):
+        self._settle()
+        start = time.perf_counter()
+        result = fn(*args)
+        end = time.perf_counter()
+        self._settle()
+        worst = max((e - s for s, e in self.writes if e > start and s < end), default=0.0)
+        return {'seconds': round(end - start, 3), 'worst_write_ms': round(worst * 1000, 1), 'result': result}
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.conn.close()
+
+
+def _size_mb(path):
+    return round(os.path.getsize(path) / 1e6, 1)
+
+
+def add_tokens(conn, n):
+    expired = (datetime.datetime.utcnow() - datetime.timedelta(days=1)).isoformat()
+    conn.executemany("INSERT INTO pw_reset_tokens (user_id,token,expires_at) VALUES (1,?,?)",
+                     ((f'bench-{i}', expired) for i in range(n)))
+    conn.commit()
+
+
+def delete_all_expired(conn):
+    n = conn.execute("DELETE FROM pw_reset_tokens WHERE expires_at < ?", (datetime.datetime.utcnow().isoformat(),)).rowcount
+    conn.commit()
+    return {'deleted': n}
+
+
+def delete_half(conn):
+    n = conn.execute("DELETE FROM alumni WHERE id % 2 = 0").rowcount
+    conn.commit()
+    return {'deleted': n}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing database from benchmarks.datagen (it is modified)')
+    parser.add_argument('--scale', default='100k', help='alumni to generate when --db is not given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--tokens', type=int, default=200000, help='expired reset tokens to purge each way')
+    parser.add_argument('--interval', type=float, default=5, help='ms between probe writes')
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = None
+    if not args.db:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, 'bench.db')
+        print(f'generating {args.scale} alumni ...', flush=True)
+        generate(args.db, parse_scale(args.scale), args.seed)
+    conn = db.connect(args.db)
+    result = {'scale': args.scale if tmp else None, 'size_mb': _size_mb(args.db)}
+    result['full_vacuum'] = maintenance.full_vacuum(conn)
+    print(f"full VACUUM (once): {result['full_vacuum']}", flush=True)
+    probe = Probe(args.db, args.interval / 1000)
+    steps = result['steps'] = {}
+    try:
+        add_tokens(conn, args.tokens)
+        steps['purge_tokens'] = probe.step(maintenance.purge_tokens, conn)
+        add_tokens(conn, args.tokens)
+        steps['purge_tokens_one_delete'] = probe.step(delete_all_expired, conn)
+        steps['delete_half_alumni'] = probe.step(delete_half, conn)
+        maintenance.checkpoint(conn)
+        before = _size_mb(args.db)
+        steps['incremental_vacuum'] = probe.step(maintenance.incremental_vacuum, conn)
+        maintenance.checkpoint(conn)
+        steps['incremental_vacuum']['file_mb'] = [before, _size_mb(args.db)]
+        conn.execute("DELETE FROM sqlite_stat1")  # as on a database that was never analyzed
+        conn.commit()
+        steps['optimize'] = probe.step(maintenance.optimize, conn)
+        steps['checkpoint'] = probe.step(maintenance.checkpoint, conn)
+    finally:
+        probe.stop()
+    for name, step in steps.items():
+        print(f"{name:24} {step['seconds']:8.3f} s  worst write {step['worst_write_ms']:8.1f} ms", flush=True)
+    conn.close()
+    write_results('maintenance', result, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Mentor matching (``alumni_core.matching``) at 100k mentors.
+
+Generates a database (every alumnus is a potential mentor, plus the
+approved mentor applications), then reports:
+
+- the time to build ``mentor_index`` from scratch and its size;
+- p50/p95/p99 of ``matches()`` for randomly chosen requests, and of
+  ``GET /api/mentorships/<id>/matches`` with the response cache off;
+- what the index triggers add to an alumni insert and to an approval;
+- one ``propose()`` run over every open request::
+
+    python -m benchmarks.matching --scale 100k --requests 500 --out matching.json
+"""
+import argparse, os, random, tempfile, time
+from alumni_core import db, matching
+from benchmarks.common import admin_client, load_app, percentiles, write_results
+from benchmarks.datagen import generate, parse_scale
+
+
+def _ms(values):
+    return {k: round(v * 1000, 3) if v is not None else None for k, v in percentiles(values).items()}
+
+
+def build(conn):
+    start = time.perf_counter()
+    matching.rebuild(conn)
+    elapsed = time.perf_counter() - start
+    docs = conn.execute("SELECT count(*) FROM mentor_index").fetchone()[0]
+    blocks = conn.execute("SELECT count(*) FROM mentor_index_data").fetchone()[0]
+    return {'mentors': docs, 'seconds': round(elapsed, 2), 'data_blocks': blocks}
+
+
+def lookups(conn, ids, k):
+    samples, empty = [], 0
+    for mid in ids:
+        start = time.perf_counter()
+        result = matching.matches(conn, mid, k)
+        samples.append(time.perf_counter() - start)
+        empty += not result['matches']
+    return {'requests': len(ids), 'k': k, 'empty': empty, 'ms': _ms(samples)}
+
+
+def api(db_path, ids, k):
+    module = load_app('console', db_path)
+    module.app.config['RESPONSE_CACHE_SIZE'] = 0
+    client = admin_client(module)
+    samples = []
+    for mid in ids:
+        start = time.perf_counter()
+        resp = client.get(f'/api/mentorships/{mid}/matches?k={k}')
+        resp.get_data()
+        samples.append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            raise RuntimeError(f'/api/mentorships/{mid}/matches returned {resp.status_code}')
+    return {'requests': len(ids), 'ms': _ms(samples)}
+
+
+def writes(conn, n):
+    """Per-row cost of the mentor_index triggers, measured in transactions that are rolled back."""
+    row = ('Bench Mentor', '2020', 'bench@example.org', '', 'Bench', 'Data science at Bench. Skills: python, sql, go, rust.', '')
+
+    def insert_alumni(drop_trigger):
+        conn.execute("BEGIN")
+        if drop_trigger:
+            conn.execute("DROP TRIGGER mentor_index_alumni_ai")
+        start = time.perf_counter()
+        conn.executemany("INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)", [row] * n)
+        elapsed = time.perf_counter() - start
+        conn.rollback()
+        return elapsed
+
+    with_index, without_index = insert_alumni(False), insert_alumni(True)
+
+    pending = [r[0] for r in conn.execute("SELECT id FROM mentor_applications WHERE status = 'pending' LIMIT ?", (n,))]
+    conn.execute("BEGIN")
+    start = time.perf_counter()
+    conn.executemany("UPDATE mentor_applications SET status = 'approved' WHERE id = ?", [(i,) for i in pending])
+    approve = (time.perf_counter() - start) / max(1, len(pending))
+    visible = all(conn.execute("SELECT 1 FROM mentor_index WHERE rowid = ?", (i * 2 + 1,)).fetchone() for i in pending)
+    conn.rollback()
+    return {'rows': n, 'alumni_insert_us': round(with_index / n * 1e6, 1),
+            'alumni_insert_without_index_us': round(without_index / n * 1e6, 1),
+            'index_overhead_us': round((with_index - without_index) / n * 1e6, 1),
+            'approve_us': round(approve * 1e6, 1), 'approved_searchable': visible}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing database from benchmarks.datagen (it is modified)')
+    parser.add_argument('--scale', default='100k', help='alumni to generate when --db is not given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=300, help='random requests to match')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--capacity', type=int, default=2)
+    parser.add_argument('--writes', type=int, default=2000)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = None
+    if not args.db:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, 'bench.db')
+        print(f'generating {args.scale} alumni ...', flush=True)
+        generate(args.db, parse_scale(args.scale), args.seed)
+    os.environ.setdefault('EMAIL_OUTBOX_WORKER', '0')
+    conn = db.connect(args.db)
+    conn.isolation_level = None  # explicit BEGIN/ROLLBACK in writes()
+    result = {'scale': args.scale if tmp else None, 'index': build(conn)}
+    print(f"index: {result['index']['mentors']} mentors built in {result['index']['seconds']}s", flush=True)
+    ids = [r[0] for r in conn.execute("SELECT id FROM mentorships")]
+    ids = random.Random(args.seed).sample(ids, min(args.requests, len(ids)))
+    result['matches'] = lookups(conn, ids, args.k)
+    print(f"matches(): {result['matches']['ms']}", flush=True)
+    result['api'] = api(args.db, ids, args.k)
+    print(f"GET /api/mentorships/<id>/matches: {result['api']['ms']}", flush=True)
+    result['writes'] = writes(conn, args.writes)
+    print(f"writes: {result['writes']}", flush=True)
+    result['propose'] = matching.propose(conn, 3, args.capacity)['stats']
+    print(f"propose(): {result['propose']}", flush=True)
+    conn.close()
+    write_results('matching', result, args.out)
+
+
+if __name__ == '__main__':
+    main()
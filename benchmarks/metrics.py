@@ -0,0 +1,82 @@
+"""Overhead of the instrumentation in ``alumni_core.metrics``.
+
+Loads the console app twice, with ``METRICS_ENABLED=0`` and ``=1``, and
+requests the same routes from both in alternation so that drift (CPU
+frequency, page cache) affects both sides equally. A second part times a
+single-row SELECT on a plain and on a timed connection to show the cost
+per statement::
+
+    python -m benchmarks.metrics --scale 10k --iterations 500 --out metrics.json
+"""
+import argparse, os, tempfile, time
+from alumni_core import db, metrics
+from benchmarks.common import admin_client, load_app, percentiles, write_results
+from benchmarks.datagen import generate, parse_scale
+
+ROUTES = ('/', '/alumni', '/events', '/api/alumni', '/api/alumni/search?q=goo', '/api/insights')
+
+
+def load(db_path, enabled):
+    os.environ['METRICS_ENABLED'] = '1' if enabled else '0'
+    try:
+        module = load_app('console', db_path)
+    finally:
+        os.environ.pop('METRICS_ENABLED', None)
+    module.app.config['RESPONSE_CACHE_SIZE'] = 0
+    return admin_client(module)
+
+
+def routes(db_path, iterations):
+    clients = {'off': load(db_path, False), 'on': load(db_path, True)}
+    results = []
+    for path in ROUTES:
+        samples = {'off': [], 'on': []}
+        for i in range(iterations):
+            for side in (('off', 'on') if i % 2 else ('on', 'off')):
+                start = time.perf_counter()
+                resp = clients[side].get(path)
+                resp.get_data()
+                samples[side].append(time.perf_counter() - start)
+        off, on = percentiles(samples['off'])['p50'], percentiles(samples['on'])['p50']
+        results.append({'route': path, 'p50_ms_off': round(off * 1000, 3), 'p50_ms_on': round(on * 1000, 3),
+                        'overhead_us': round((on - off) * 1e6, 1), 'overhead_pct': round((on - off) / off * 100, 1)})
+        print(f"{path:32} off {off * 1000:8.3f} ms  on {on * 1000:8.3f} ms  {results[-1]['overhead_pct']:+6.1f}%", flush=True)
+    return results
+
+
+def statements(db_path, n):
+    out = {}
+    for name, factory in (('plain', None), ('timed', metrics.connection_factory(metrics.Metrics()))):
+        conn = db.connect(db_path, factory=factory) if factory else db.connect(db_path)
+        start = time.perf_counter()
+        for i in range(n):
+            conn.execute("SELECT id, name FROM alumni WHERE id = ?", (i % 1000 + 1,)).fetchone()
+        out[name] = (time.perf_counter() - start) / n
+        conn.close()
+    return {'statements': n, 'us_per_statement_plain': round(out['plain'] * 1e6, 2),
+            'us_per_statement_timed': round(out['timed'] * 1e6, 2),
+            'overhead_us_per_statement': round((out['timed'] - out['plain']) * 1e6, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing database from benchmarks.datagen')
+    parser.add_argument('--scale', default='10k', help='alumni to generate when --db is not given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=300, help='requests per route and side')
+    parser.add_argument('--statements', type=int, default=50000)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = None
+    if not args.db:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, 'bench.db')
+        generate(args.db, parse_scale(args.scale), args.seed)
+    os.environ.setdefault('EMAIL_OUTBOX_WORKER', '0')
+    result = {'scale': args.scale if tmp else None, 'iterations': args.iterations,
+              'routes': routes(args.db, args.iterations), 'sql': statements(args.db, args.statements)}
+    write_results('metrics', result, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""Per-route latency of both apps through the Flask test client.
+
+Every route of ``app.py`` (community) and ``alumni_connect_flask/app.py``
+(console) is requested repeatedly against a generated database (see
+``benchmarks.datagen``) and reported as p50/p95/p99 latency and requests per
+second. No network or server is involved, so this isolates the cost of the
+view code, its queries and template rendering::
+
+    python -m benchmarks.routes --scale 100k --out routes.json
+    python -m benchmarks.routes --db bench.db --apps console --only 'api_.*'
+
+Each case runs for at least ``--min-iterations`` and then until ``--seconds``
+have passed or ``--max-iterations`` is reached. Routes that change data get
+fresh rows from a setup step that is not timed. Endpoints without a case are
+listed under ``uncovered``.
+"""
+import argparse, datetime, io, itertools, json, os, re, tempfile, time
+from benchmarks.common import admin_client, load_app, percentiles, write_results
+from benchmarks.datagen import PASSWORD, generate, parse_scale
+
+
+class Case:
+    def __init__(self, endpoint, method, path, data=None, json=None, setup=None, client='admin', label=None):
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.data = data
+        self.json = json
+        self.setup = setup
+        self.client = client
+        self.name = label or f'{method} {path}'
+
+
+class Fixtures:
+    """Rows for routes that need an id, created outside the timed section."""
+
+    def __init__(self, db_path):
+        from alumni_core import db
+        self.conn = db.connect(db_path)
+        self.counter = itertools.count()
+
+    def now(self):
+        return datetime.datetime.utcnow().isoformat()
+
+    def first(self, table):
+        return self.conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 1
+
+    def _insert(self, sql, params):
+        cur = self.conn.execute(sql, params)
+        self.conn.commit()
+        return cur.lastrowid
+
+    def alumnus(self):
+        return self._insert("INSERT INTO alumni (name,batch,email,company,bio,created_at) VALUES (?,?,?,?,?,?)",
+                            ('Bench Delete', '2020', f'del{next(self.counter)}@example.org', 'Bench', 'bench', self.now()))
+
+    def event(self):
+        return self._insert("INSERT INTO events (title,date,venue,created_at) VALUES (?,?,?,?)",
+                            ('Bench event', '2030-01-01', 'Hall', self.now()))
+
+    def mentorship(self):
+        return self._insert("INSERT INTO mentorships (title,student_name,field,approved,created_at) VALUES (?,?,?,?,?)",
+                            ('Bench request', 'Student', 'cloud', 1, self.now()))
+
+    def application(self):
+        return self._insert("INSERT INTO mentor_applications (user_id,name,email,field,note,status,created_at) VALUES (?,?,?,?,?,?,?)",
+                            (1, 'Bench Mentor', 'mentor@example.org', 'cloud', 'bench', 'pending', self.now()))
+
+    def token(self):
+        token = f'bench-{next(self.counter)}-{time.time_ns()}'
+        user_id = self.conn.execute("SELECT id FROM users WHERE username='user1'").fetchone()[0]
+        expires = (datetime.datetime.utcnow() + datetime.timedelta(hours=1)).isoformat()
+        self._insert("INSERT INTO pw_reset_tokens (user_id,token,expires_at) VALUES (?,?,?)", (user_id, token, expires))
+        return token
+
+    def change_cursor(self, back=100):
+        head = self.conn.execute("SELECT max(seq) FROM changes").fetchone()[0] or 0
+        return max(0, head - back)
+
+    def import_job(self):
+        from alumni_core import imports
+        return imports.create_job(self.conn, 'alumni_csv', 'bench.csv', 'bench')
+
+
+def _unique(prefix):
+    counter = itertools.count()
+    return lambda: f'{prefix}{next(counter)}-{time.time_ns()}'
+
+
+def community_cases(fx):
+    alumnus, event, mentorship = fx.first('alumni'), fx.first('events'), fx.first('mentorships')
+    username = _unique('bench')
+    return [
+        Case('index', 'GET', '/'),
+        Case('register', 'GET', '/register', client='anon'),
+        Case('register', 'POST', '/register', client='anon',
+             data=lambda v: {'username': username(), 'password': 'pw', 'email': 'b@example.org'}),
+        Case('login', 'GET', '/login', client='anon'),
+        Case('login', 'POST', '/login', client='anon', data={'username': 'admin', 'password': PASSWORD}),
+        Case('logout', 'GET', '/logout', client='anon'),
+        Case('alumni_list', 'GET', '/alumni'),
+        Case('alumni_list', 'GET', '/alumni?limit=50&batch=2010', label='GET /alumni?batch='),
+        Case('alumni_list', 'GET', '/alumni?q=google%20pyth', label='GET /alumni?q='),
+        Case('alumni_add', 'GET', '/alumni/add'),
+        Case('alumni_add', 'POST', '/alumni/add', data={'name': 'Bench Add', 'batch': '2020', 'email': 'a@example.org',
+                                                        'company': 'Bench', 'bio': 'bench'}),
+        Case('alumni_edit', 'GET', f'/alumni/edit/{alumnus}'),
+        Case('alumni_edit', 'POST', f'/alumni/edit/{alumnus}', data={'name': 'Bench Edit', 'batch': '2020',
+                                                                     'email': 'e@example.org', 'company': 'Bench', 'bio': 'x'}),
+        Case('alumni_delete', 'POST', '/alumni/delete/{id}', setup=lambda: {'id': fx.alumnus()}),
+        Case('events_list', 'GET', '/events'),
+        Case('event_add', 'GET', '/events/add'),
+        Case('event_add', 'POST', '/events/add', data={'title': 'Bench', 'date': '2030-01-01', 'venue': 'Hall', 'description': 'x'}),
+        Case('event_edit', 'GET', f'/events/edit/{event}'),
+        Case('event_edit', 'POST', f'/events/edit/{event}', data={'title': 'Bench', 'date': '2030-01-02', 'venue': 'Hall', 'description': 'x'}),
+        Case('event_delete', 'POST', '/events/delete/{id}', setup=lambda: {'id': fx.event()}),
+        Case('mentorship_list', 'GET', '/mentorship'),
+        Case('mentorship_list', 'GET', '/mentorship?field=cloud', label='GET /mentorship?field='),
+        Case('mentorship_add', 'GET', '/mentorship/add'),
+        Case('mentorship_add', 'POST', '/mentorship/add', data={'title': 'Bench', 'student_name': 'S', 'field': 'cloud', 'note': 'x'}),
+        Case('mentorship_edit', 'GET', f'/mentorship/edit/{mentorship}'),
+        Case('mentorship_edit', 'POST', f'/mentorship/edit/{mentorship}', data={'title': 'Bench', 'field': 'cloud', 'note': 'y'}),
+        Case('mentorship_delete', 'POST', '/mentorship/delete/{id}', setup=lambda: {'id': fx.mentorship()}),
+        Case('apply_mentor', 'GET', '/apply-mentor'),
+        Case('apply_mentor', 'POST', '/apply-mentor', data={'name': 'M', 'email': 'm@example.org', 'field': 'cloud', 'note': 'x'}),
+        Case('admin_mentor_applications', 'GET', '/admin/mentor-applications'),
+        Case('approve_mentor', 'POST', '/admin/approve-mentor/{id}', setup=lambda: {'id': fx.application()}),
+        Case('reject_mentor', 'POST', '/admin/reject-mentor/{id}', setup=lambda: {'id': fx.application()}),
+        Case('admin_stats', 'GET', '/admin/stats'),
+        Case('metrics', 'GET', '/metrics'),
+        Case('static', 'GET', '/static/style.css'),
+    ]
+
+
+def console_cases(fx):
+    alumnus, mentorship = fx.first('alumni'), fx.first('mentorships')
+    username = _unique('editor')
+    small_json = json.dumps({'events': [{'title': 'Bench merge', 'date': '2030-01-01', 'venue': 'Hall'}]})
+    return [
+        Case('index', 'GET', '/'),
+        Case('login', 'GET', '/login', client='anon'),
+        Case('login', 'POST', '/login', client='anon', data={'username': 'admin', 'password': PASSWORD}),
+        Case('logout', 'GET', '/logout', client='anon'),
+        Case('register_user', 'GET', '/register'),
+        Case('register_user', 'POST', '/register', data=lambda v: {'username': username(), 'password': 'pw', 'role': 'editor'}),
+        Case('forgot_password', 'GET', '/forgot-password', client='anon'),
+        Case('forgot_password', 'POST', '/forgot-password', client='anon', data={'email': 'user1'}),
+        Case('reset_password', 'GET', '/reset-password/{token}', client='anon', setup=lambda: {'token': fx.token()}),
+        Case('reset_password', 'POST', '/reset-password/{token}', client='anon', data={'password': PASSWORD},
+             setup=lambda: {'token': fx.token()}),
+        Case('alumni_list', 'GET', '/alumni'),
+        Case('alumni_list', 'GET', '/alumni?company=Google', label='GET /alumni?company='),
+        Case('alumni_list', 'GET', '/alumni?q=google%20pyth', label='GET /alumni?q='),
+        Case('alumni_add', 'GET', '/alumni/add'),
+        Case('alumni_add', 'POST', '/alumni/add', data={'name': 'Bench Add', 'batch': '2020', 'email': 'a@example.org',
+                                                        'company': 'Bench', 'bio': 'bench'}),
+        Case('alumni_edit', 'GET', f'/alumni/edit/{alumnus}'),
+        Case('alumni_edit', 'POST', f'/alumni/edit/{alumnus}', data={'name': 'Bench Edit', 'batch': '2020',
+                                                                     'email': 'e@example.org', 'company': 'Bench', 'bio': 'x'}),
+        Case('alumni_delete', 'POST', '/alumni/delete/{id}', setup=lambda: {'id': fx.alumnus()}),
+        Case('alumni_upload_csv', 'POST', '/alumni/upload-csv',
+             data=lambda v: {'file': (io.BytesIO(b'name,batch,email\nBench CSV,2020,csv@example.org\n'), 'bench.csv')}),
+        Case('api_import_status', 'GET', '/api/imports/{job}', setup=lambda: {'job': fx.import_job()}),
+        Case('events_list', 'GET', '/events'),
+        Case('event_add', 'GET', '/events/add'),
+        Case('event_add', 'POST', '/events/add', data={'title': 'Bench', 'date': '2030-01-01', 'venue': 'Hall', 'description': 'x'}),
+        Case('event_delete', 'POST', '/events/delete/{id}', setup=lambda: {'id': fx.event()}),
+        Case('mentorship_list', 'GET', '/mentorship'),
+        Case('mentorship_add', 'GET', '/mentorship/add'),
+        Case('mentorship_add', 'POST', '/mentorship/add', data={'title': 'Bench', 'student_name': 'S', 'field': 'cloud', 'note': 'x'}),
+        Case('mentorship_delete', 'POST', '/mentorship/delete/{id}', setup=lambda: {'id': fx.mentorship()}),
+        Case('insights', 'GET', '/insights'),
+        Case('api_insights', 'GET', '/api/insights'),
+        Case('export_json', 'GET', '/export/json'),
+        Case('export_json', 'GET', '/export/json?format=ndjson&gzip=1', label='GET /export/json?format=ndjson&gzip=1'),
+        Case('export_csv', 'GET', '/export/csv?table=alumni'),
+        Case('export_excel', 'GET', '/export/excel'),
+        Case('import_json', 'GET', '/import/json'),
+        Case('import_json', 'POST', '/import/json', data=lambda v: {'file': (io.BytesIO(small_json.encode()), 'bench.json'), 'mode': 'merge'}),
+        Case('api_alumni', 'GET', '/api/alumni'),
+        Case('api_alumni', 'GET', '/api/alumni?limit=200&batch=2010', label='GET /api/alumni?limit=200&batch='),
+        Case('api_alumni', 'POST', '/api/alumni', json={'name': 'Bench API', 'batch': '2020', 'email': 'api@example.org'}),
+        Case('api_alumni', 'GET', '/api/alumni?limit=200&fields=id,name,email', label='GET /api/alumni?limit=200&fields='),
+        Case('api_alumni', 'POST', '/api/alumni', label='POST /api/alumni [100 items]',
+             json=[{'name': f'Bench Batch {i}', 'batch': '2020', 'email': 'batch@example.org'} for i in range(100)]),
+        Case('api_alumni_search', 'GET', '/api/alumni/search?q=goo'),
+        Case('api_events', 'GET', '/api/events'),
+        Case('api_events', 'POST', '/api/events', json={'title': 'Bench API', 'date': '2030-01-01', 'venue': 'Hall'}),
+        Case('api_mentorships', 'GET', '/api/mentorships'),
+        Case('api_mentorships', 'POST', '/api/mentorships', json={'title': 'Bench API', 'student_name': 'S', 'field': 'cloud'}),
+        Case('api_mentorship_matches', 'GET', f'/api/mentorships/{mentorship}/matches'),
+        Case('api_mentorship_proposals', 'GET', '/api/mentorships/proposals'),
+        Case('api_changes', 'GET', '/api/changes?since={since}', label='GET /api/changes?since= [last 100]',
+             setup=lambda: {'since': fx.change_cursor(100)}),
+        # a cursor past the head ends the stream at once with a "reset" event
+        Case('api_changes_stream', 'GET', '/api/changes/stream?since=999999999', label='GET /api/changes/stream [reset]'),
+        Case('admin_stats', 'GET', '/admin/stats'),
+        Case('metrics', 'GET', '/metrics'),
+        Case('static', 'GET', '/static/style.css'),
+    ]
+
+
+CASES = {'community': community_cases, 'console': console_cases}
+
+
+def run_case(case, clients, min_iterations, max_iterations, seconds):
+    client = clients[case.client]
+    samples, statuses = [], {}
+    deadline = time.perf_counter() + seconds
+    while len(samples) < min_iterations or (time.perf_counter() < deadline and len(samples) < max_iterations):
+        values = case.setup() if case.setup else {}
+        path = case.path.format(**values)
+        kwargs = {}
+        if case.data is not None:
+            kwargs['data'] = case.data(values) if callable(case.data) else case.data
+        if case.json is not None:
+            kwargs['json'] = case.json
+        start = time.perf_counter()
+        resp = client.open(path, method=case.method, **kwargs)
+        resp.get_data()  # streamed responses are produced while being read
+        samples.append(time.perf_counter() - start)
+        resp.close()
+        statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+    total = sum(samples)
+    return {'endpoint': case.endpoint, 'route': case.name, 'n': len(samples),
+            'rps': round(len(samples) / total, 1) if total else None,
+            'ms': {k: round(v * 1000, 2) for k, v in percentiles(samples).items()},
+            'status': statuses}
+
+
+def run_app(which, db_path, only=None, **limits):
+    os.environ.setdefault('EMAIL_OUTBOX_WORKER', '0')  # no background SMTP attempts during the run
+    module = load_app(which, db_path)
+    fx = Fixtures(db_path)
+    clients = {'admin': admin_client(module), 'anon': module.app.test_client()}
+    cases = CASES[which](fx)
+    results = []
+    for case in cases:
+        if only and not re.search(only, case.endpoint) and not re.search(only, case.name):
+            continue
+        result = run_case(case, clients, **limits)
+        results.append(result)
+        print(f"{which:9} {result['route'][:58]:58} p50 {result['ms']['p50']:9.2f} ms  {result['rps']:8.1f}/s", flush=True)
+    covered = {c.endpoint for c in cases}
+    uncovered = sorted(r.endpoint for r in module.app.url_map.iter_rules() if r.endpoint not in covered)
+    return {'app': which, 'routes': results, 'uncovered': uncovered}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing database from benchmarks.datagen (it is modified)')
+    parser.add_argument('--scale', default='10k', help='alumni to generate when --db is not given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--apps', default='community,console')
+    parser.add_argument('--only', help='regex on endpoint or route')
+    parser.add_argument('--seconds', type=float, default=1.0, help='time budget per route')
+    parser.add_argument('--min-iterations', type=int, default=5)
+    parser.add_argument('--max-iterations', type=int, default=500)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = None
+    if not args.db:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, 'bench.db')
+        generate(args.db, parse_scale(args.scale), args.seed)
+    limits = {'min_iterations': args.min_iterations, 'max_iterations': args.max_iterations, 'seconds': args.seconds}
+    apps = [run_app(which, args.db, args.only, **limits) for which in args.apps.split(',')]
+    write_results('routes', {'scale': args.scale if tmp else None, 'seed': args.seed, 'apps': apps}, args.out)
+
+
+if __name__ == '__main__':
+    main()
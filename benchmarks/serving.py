@@ -0,0 +1,57 @@
+"""Throughput of the dev server against gunicorn under the same load.
+
+Runs ``benchmarks.load`` once against ``python app.py`` (Flask's
+development server, one process; debug mode for the console, as the old
+Dockerfile ran it) and once per gunicorn worker/thread layout, each on a
+fresh copy of the same generated database::
+
+    python -m benchmarks.serving --app console --scale 100k --layouts 1x4,2x4,4x8 --out serving.json
+"""
+import argparse, os, shutil, tempfile
+from benchmarks.common import write_results
+from benchmarks.datagen import generate, parse_scale
+from benchmarks.load import MIXES, OPERATIONS, _free_port, drive, start_server, stop_server
+
+
+def run(app, db_path, server, workers, threads, args):
+    port = _free_port()
+    proc = start_server(app, db_path, port, workers, threads, server)
+    try:
+        result = drive('127.0.0.1', port, OPERATIONS[app], MIXES[args.mix], args.clients, args.duration, args.warmup, args.seed)
+    finally:
+        stop_server(proc)
+    overall = result['overall']
+    label = 'dev server' if server == 'dev' else f'gunicorn {workers}x{threads}'
+    print(f"{label:20} {overall['rps']:8.1f} req/s  p50 {overall['ms']['p50']:7.2f}  p95 {overall['ms']['p95']:7.2f}  "
+          f"p99 {overall['ms']['p99']:7.2f} ms  errors {overall['errors']}", flush=True)
+    return {'server': server, 'workers': workers if server == 'gunicorn' else 1,
+            'threads': threads if server == 'gunicorn' else None, **result}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', choices=sorted(OPERATIONS), default='console')
+    parser.add_argument('--scale', default='10k')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--layouts', default=f'1x4,{os.cpu_count() or 2}x4', help='gunicorn WORKERSxTHREADS, comma separated')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.db')
+        generate(source, parse_scale(args.scale), args.seed)
+        runs = [('dev', 1, 1)] + [('gunicorn', *map(int, layout.split('x'))) for layout in args.layouts.split(',')]
+        results = []
+        for n, (server, workers, threads) in enumerate(runs):
+            db_path = os.path.join(tmp, f'run{n}.db')
+            shutil.copy(source, db_path)
+            results.append(run(args.app, db_path, server, workers, threads, args))
+    config = {k: getattr(args, k) for k in ('app', 'scale', 'seed', 'mix', 'clients', 'duration', 'warmup')}
+    write_results('serving', {'config': config, 'runs': results}, args.out)
+
+
+if __name__ == '__main__':
+    main()
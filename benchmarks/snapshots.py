@@ -0,0 +1,128 @@
+"""Write latency while a large export streams to a slow client.
+
+A writer thread commits one alumni insert every ``--interval`` ms on its
+own connection, like a busy admin session, while ``/export/json`` streams
+the whole database to a client that pauses ``--chunk-delay`` ms after every
+64 KB chunk. Each scenario runs on its own copy of the database:
+
+- ``idle``: no export, for reference;
+- ``rollback-journal``: ``SQLITE_JOURNAL_MODE=DELETE``, where a reader
+  locks writers out for as long as it reads;
+- ``wal-live``: WAL with a read transaction on the live database (the default);
+- ``wal-copy``: WAL with ``SNAPSHOT_MAX_AGE`` set, reading a backup copy.
+
+Reports p50/p95/p99/max write latency, failed writes (``database is
+locked``), the export time and the largest WAL size seen::
+
+    python -m benchmarks.snapshots --scale 100k --out snapshots.json
+"""
+import argparse, os, sqlite3, tempfile, threading, time
+from alumni_core import db
+from benchmarks.common import admin_client, load_app, percentiles, write_results
+from benchmarks.datagen import generate, parse_scale
+
+SCENARIOS = {
+    'idle': {'SQLITE_JOURNAL_MODE': 'WAL', 'SNAPSHOT_MAX_AGE': '0', 'export': False},
+    'rollback-journal': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SNAPSHOT_MAX_AGE': '0', 'export': True},
+    'wal-live': {'SQLITE_JOURNAL_MODE': 'WAL', 'SNAPSHOT_MAX_AGE': '0', 'export': True},
+    'wal-copy': {'SQLITE_JOURNAL_MODE': 'WAL', 'SNAPSHOT_MAX_AGE': '300', 'export': True},
+}
+ROW = ('Write Probe', '2020', 'probe@example.org', '', 'Bench', 'Written during an export.', '')
+
+
+def _copy(src, dst):
+    with sqlite3.connect(src) as a, sqlite3.connect(dst) as b:
+        a.backup(b)
+
+
+def _size_mb(path):
+    return os.path.getsize(path) / 1e6 if os.path.exists(path) else 0.0
+
+
+def writer(path, stop, interval, out):
+    conn = db.connect(path, db.pragmas_from_env())
+    samples, errors, wal = [], 0, 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            conn.execute("INSERT INTO alumni (name,batch,email,phone,company,bio,created_at) VALUES (?,?,?,?,?,?,?)", ROW)
+            conn.commit()
+        except sqlite3.OperationalError:  # database is locked, after busy_timeout
+            conn.rollback()
+            errors += 1
+        samples.append(time.perf_counter() - start)
+        wal = max(wal, _size_mb(path + '-wal'))
+        time.sleep(max(0.0, interval - (time.perf_counter() - start)))
+    conn.close()
+    out.update(samples=samples, errors=errors, wal_mb=wal)
+
+
+def export(client, chunk_delay, out):
+    start = time.perf_counter()
+    resp = client.get('/export/json?format=ndjson', buffered=False)
+    size = 0
+    for chunk in resp.response:
+        size += len(chunk)
+        time.sleep(chunk_delay)
+    resp.close()
+    out.update(status=resp.status_code, mb=round(size / 1e6, 1), seconds=round(time.perf_counter() - start, 2))
+
+
+def scenario(name, source, workdir, interval, chunk_delay, idle_seconds):
+    spec = SCENARIOS[name]
+    path = os.path.join(workdir, f'{name}.db')
+    _copy(source, path)
+    os.environ.update({k: v for k, v in spec.items() if k != 'export'})
+    os.environ['SNAPSHOT_DIR'] = workdir
+    module = load_app('console', path)
+    client = admin_client(module)
+    stop, written, exported = threading.Event(), {}, {}
+    thread = threading.Thread(target=writer, args=(path, stop, interval, written))
+    thread.start()
+    time.sleep(0.5)
+    if spec['export']:
+        export(client, chunk_delay, exported)
+    else:
+        time.sleep(idle_seconds)
+    time.sleep(0.5)
+    stop.set()
+    thread.join()
+    reader = module.snapshots.get_reader(module.app)
+    copy_seconds = reader.stats()['refresh_seconds']
+    reader.close()
+    ms = {k: round(v * 1000, 2) for k, v in percentiles(written['samples']).items()}
+    ms['max'] = round(max(written['samples']) * 1000, 2)
+    return {'scenario': name, 'writes': len(written['samples']), 'failed': written['errors'], 'write_ms': ms,
+            'wal_mb': round(written['wal_mb'], 1), 'copy_seconds': copy_seconds, 'export': exported or None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing database from benchmarks.datagen (it is copied, not modified)')
+    parser.add_argument('--scale', default='100k', help='alumni to generate when --db is not given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--interval', type=float, default=10, help='ms between writes')
+    parser.add_argument('--chunk-delay', type=float, default=5, help='ms the client waits after each chunk')
+    parser.add_argument('--idle-seconds', type=float, default=5, help='length of the idle scenario')
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+    tmp = tempfile.TemporaryDirectory()
+    if not args.db:
+        args.db = os.path.join(tmp.name, 'bench.db')
+        print(f'generating {args.scale} alumni ...', flush=True)
+        generate(args.db, parse_scale(args.scale), args.seed)
+    os.environ.setdefault('EMAIL_OUTBOX_WORKER', '0')
+    results = []
+    for name in args.scenarios.split(','):
+        result = scenario(name, args.db, tmp.name, args.interval / 1000, args.chunk_delay / 1000, args.idle_seconds)
+        results.append(result)
+        print(f"{name:17} writes p50 {result['write_ms']['p50']:8.2f} ms  p99 {result['write_ms']['p99']:8.2f} ms  "
+              f"max {result['write_ms']['max']:8.2f} ms  failed {result['failed']:4}  wal {result['wal_mb']} MB  "
+              f"export {result['export']}", flush=True)
+    write_results('snapshots', {'scale': args.scale, 'interval_ms': args.interval, 'chunk_delay_ms': args.chunk_delay,
+                                'scenarios': results}, args.out)
+
+
+if __name__ == '__main__':
+    main()
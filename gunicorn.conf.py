@@ -0,0 +1,34 @@
+"""gunicorn settings for both apps (``gunicorn -c gunicorn.conf.py``).
+
+Workers are processes and each runs ``GUNICORN_THREADS`` request threads
+(gthread). SQLite allows one writer at a time across all of them; the
+connections wait for the write lock (``SQLITE_BUSY_TIMEOUT``, see
+``alumni_core.db``) rather than failing. Keep ``DB_POOL_SIZE`` at least as
+large as the thread count. Every setting below can be set from the
+environment; gunicorn's own ``GUNICORN_CMD_ARGS`` works too.
+"""
+import multiprocessing, os
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('BIND') or f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# import the app, and so run init_db(), once in the master before forking
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))  # large exports stream for a while
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # '-' for stdout
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def post_worker_init(worker):
+    # start the mail sender now rather than on the worker's first request
+    box = worker.wsgi.extensions.get('alumni_outbox')
+    if box is not None and os.environ.get('EMAIL_OUTBOX_WORKER', '1') != '0':
+        box.ensure_started()
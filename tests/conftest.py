@@ -0,0 +1,49 @@
+"""Fixtures shared by the tests: a migrated database and the two apps on one."""
+import importlib.util, itertools, sys
+import pytest
+from alumni_core import db, factory, migrations
+
+ADMIN = {'username': 'admin', 'password': 'adminpass'}  # as created by the apps' init_db()
+_loaded = itertools.count()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'alumni.db')
+
+
+@pytest.fixture
+def conn(db_path):
+    """A standalone connection on a database migrated to the latest version."""
+    conn = db.connect(db_path)
+    migrations.migrate(conn)
+    yield conn
+    conn.close()
+
+
+def load_app(name, db_path, monkeypatch):
+    """A fresh import of app ``name`` (see alumni_core.factory.APPS) on ``db_path``, without workers."""
+    for var, value in (('ALUMNI_DB', db_path), ('EMAIL_OUTBOX_WORKER', '0'), ('MAINTENANCE_WORKER', '0'),
+                       ('ADMISSION_RATE', '0')):
+        monkeypatch.setenv(var, value)
+    spec = importlib.util.spec_from_file_location(f'test_{name}_app_{next(_loaded)}', factory.APPS[name])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # Flask finds the templates through it
+    spec.loader.exec_module(module)
+    module.init_db()
+    module.app.config['TESTING'] = True
+    return module
+
+
+@pytest.fixture
+def console(db_path, monkeypatch):
+    module = load_app('console', db_path, monkeypatch)
+    yield module.app
+    db.get_pool(module.app).close_all()
+
+
+@pytest.fixture
+def admin(console):
+    client = console.test_client()
+    assert client.post('/login', data=ADMIN).status_code == 302
+    return client
@@ -0,0 +1,49 @@
+import threading, time
+import pytest
+from alumni_core.admission import Admission, Overloaded, RateLimited, parse_rate
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_rate():
+    assert parse_rate('30/60') == (30, 60.0)
+    assert parse_rate('5') == (5, 1.0)
+    assert parse_rate('0') is None and parse_rate('') is None
+
+
+def test_token_bucket_refills_evenly():
+    clock = Clock()
+    admission = Admission(rate=(2, 10.0), max_writers=0, clock=clock)
+    admission.take('api', '10.0.0.1')
+    admission.take('api', '10.0.0.1')
+    with pytest.raises(RateLimited) as refused:
+        admission.take('api', '10.0.0.1')
+    assert refused.value.headers() == {'Retry-After': '5'}
+    admission.take('api', '10.0.0.2')  # another client has its own bucket
+    admission.take('api', None)  # signed-in users are not limited
+    clock.now = 5.0
+    admission.take('api', '10.0.0.1')
+    assert admission.stats()['endpoints']['api']['rate_limited'] == 1
+
+
+def test_writers_are_capped():
+    admission = Admission(rate=None, max_writers=1, max_queue=1, queue_timeout=5)
+    admission.acquire('api')
+    waiting = threading.Thread(target=admission.acquire, args=('api',))
+    waiting.start()
+    while admission.stats()['waiting'] != 1:
+        time.sleep(0.001)
+    with pytest.raises(Overloaded):  # the line is full
+        admission.acquire('api')
+    admission.release()
+    waiting.join(5)
+    assert admission.stats()['running'] == 1
+    admission.release()
+    stats = admission.stats()
+    assert (stats['running'], stats['waiting'], stats['peak_waiting']) == (0, 0, 1)
+    assert stats['endpoints']['api']['queue_full'] == 1
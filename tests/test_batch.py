@@ -0,0 +1,52 @@
+import pytest
+from alumni_core import batch
+
+
+def test_check():
+    assert batch.check('events', {'title': 'Meetup', 'venue': 'Hall'}) == (('Meetup', '', 'Hall', None), None)
+    assert batch.check('events', ['Meetup']) == (None, 'item is not an object')
+    assert batch.check('events', {'title': ''}) == (None, 'missing title')
+    assert batch.check('events', {'title': 'Meetup', 'venue': {'x': 1}}) == (None, 'venue must be a string or a number')
+    assert batch.check('events', {'title': 'x' * (batch.MAX_LENGTH + 1)}) == \
+        (None, f'title longer than {batch.MAX_LENGTH} characters')
+
+
+def test_ids_follow_the_input_order(conn):
+    items = [{'title': 'A', 'date': '2024-01-01'}, {'venue': 'no title'}, {'title': 'B'}, {'title': 'C'}]
+    result = batch.insert_many(conn, 'events', items, created_at='2024-01-01')
+    assert result['created'] == 3
+    assert result['errors'] == [{'index': 1, 'error': 'missing title'}]
+    stored = {r['id']: r['title'] for r in conn.execute("SELECT id, title FROM events")}
+    assert [stored.get(i) for i in result['ids']] == ['A', None, 'B', 'C']
+    assert conn.execute("SELECT date FROM events WHERE title='B'").fetchone()[0] == ''
+
+
+def test_alumni_are_upserted(conn):
+    first = batch.insert_many(conn, 'alumni', [{'name': 'Ana', 'email': 'ana@example.org'}])
+    result = batch.insert_many(conn, 'alumni', [{'name': 'Ana Silva', 'email': 'ana@example.org'},
+                                                {'name': 'Ben', 'email': 'ben@example.org'},
+                                                {'name': 'Ben', 'email': 'BEN@example.org'}])
+    assert (result['created'], result['updated'], result['duplicates']) == (1, 1, 1)
+    assert result['ids'][0] == first['ids'][0]
+    assert result['ids'][1] == result['ids'][2]
+
+
+def test_too_many_items(conn):
+    with pytest.raises(batch.TooManyItems):
+        batch.insert_many(conn, 'events', [{'title': 'x'}] * 3, max_items=2)
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 0
+
+
+def test_api(admin):
+    resp = admin.post('/api/events', json=[{'title': 'A'}, {'title': 'B', 'venue': ['x']}])
+    assert resp.status_code == 201
+    assert resp.get_json()['errors'] == [{'index': 1, 'error': 'venue must be a string or a number'}]
+    assert admin.post('/api/events', json=[{'venue': 'x'}]).status_code == 400
+    # one object gets the same checks and defaults as an array item
+    assert admin.post('/api/mentorships', json={'title': 'Help', 'note': {'x': 1}}).status_code == 400
+    assert admin.post('/api/events', json={'venue': 'no title'}).get_json() == {'error': 'missing title'}
+    assert admin.post('/api/events', json={'title': 'C'}).status_code == 201
+    items = admin.get('/api/events?fields=title,date').get_json()['items']
+    assert sorted(i['title'] for i in items) == ['A', 'C']
+    assert all(set(i) == {'title', 'date'} and i['date'] == '' for i in items)
+    assert admin.get('/api/events?fields=password').status_code == 400
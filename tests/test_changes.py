@@ -0,0 +1,39 @@
+import pytest
+from alumni_core import changes
+
+
+@pytest.fixture
+def editor(console, admin):
+    admin.post('/register', data={'username': 'ed', 'password': 'edpass', 'role': 'editor'})
+    client = console.test_client()
+    assert client.post('/login', data={'username': 'ed', 'password': 'edpass'}).status_code == 302
+    return client
+
+
+def test_feed_needs_a_login(console):
+    assert console.test_client().get('/api/changes?since=0').status_code == 401
+    assert console.test_client().get('/api/changes/stream').status_code == 401
+
+
+def test_mentor_applications_are_for_admins(editor, admin):
+    assert editor.get('/api/changes?since=0&tables=alumni,events').status_code == 200
+    assert editor.get('/api/changes?since=0&tables=mentor_applications').status_code == 403
+    assert admin.get('/api/changes?since=0&tables=mentor_applications').status_code == 200
+
+
+def test_feed_reports_writes(admin):
+    cursor = admin.get('/api/changes').get_json()['cursor']
+    assert admin.post('/api/alumni', json={'name': 'Ana', 'batch': '2015', 'email': 'ana@example.org'}).status_code == 201
+    feed = admin.get(f'/api/changes?since={cursor}&tables=alumni').get_json()
+    assert [(c['table'], c['op']) for c in feed['changes']] == [('alumni', 'insert')]
+    assert feed['cursor'] > cursor
+
+
+def test_allowed_tables():
+    assert changes.allowed_tables(None) == ()
+    assert 'mentor_applications' in changes.allowed_tables({'role': 'admin'})
+    assert 'mentor_applications' not in changes.allowed_tables({'role': 'editor'})
+    with pytest.raises(changes.UnknownTable):
+        changes.parse_tables('users')
+    with pytest.raises(changes.TableForbidden):
+        changes.parse_tables('mentor_applications', changes.allowed_tables({'role': 'editor'}))
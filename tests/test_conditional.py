@@ -0,0 +1,56 @@
+import datetime
+from alumni_core import conditional
+
+
+def add(client, name):
+    resp = client.post('/api/alumni', json={'name': name, 'batch': '2015', 'email': f'{name.lower()}@example.org'})
+    assert resp.status_code == 201
+
+
+def test_if_none_match(console):
+    client = console.test_client()
+    add(client, 'Ana')
+    first = client.get('/api/alumni')
+    etag = first.headers['ETag']
+    assert first.headers['Last-Modified']
+    again = client.get('/api/alumni', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert not again.data
+
+
+def test_a_write_changes_the_etag(console):
+    client = console.test_client()
+    add(client, 'Ana')
+    etag = client.get('/api/alumni').headers['ETag']
+    add(client, 'Ben')
+    resp = client.get('/api/alumni', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+    assert [r['name'] for r in resp.get_json()['items']] == ['Ben', 'Ana']
+
+
+def test_the_query_string_is_part_of_the_etag(console):
+    client = console.test_client()
+    add(client, 'Ana')
+    etag = client.get('/api/alumni').headers['ETag']
+    assert client.get('/api/alumni?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_if_modified_since_alone_is_never_enough(console):
+    client = console.test_client()
+    add(client, 'Ana')
+    last_modified = client.get('/api/alumni').headers['Last-Modified']
+    add(client, 'Ben')  # most likely within the same second
+    resp = client.get('/api/alumni', headers={'If-Modified-Since': last_modified})
+    assert resp.status_code == 200
+    assert len(resp.get_json()['items']) == 2
+
+
+def test_last_modified_rounds_up():
+    utc = datetime.timezone.utc
+    assert conditional._last_modified({'alumni': (3, '2024-05-01T10:00:00.250000')}) == \
+        datetime.datetime(2024, 5, 1, 10, 0, 1, tzinfo=utc)
+    assert conditional._last_modified({'alumni': (3, '2024-05-01T10:00:00'), 'events': (1, None)}) == \
+        datetime.datetime(2024, 5, 1, 10, 0, 0, tzinfo=utc)
+    assert conditional._last_modified({'alumni': (0, None)}) is None
@@ -0,0 +1,97 @@
+import threading
+import pytest
+from alumni_core import db
+from alumni_core.db import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(db_path):
+    pool = ConnectionPool(db_path, size=2, timeout=0.2)
+    yield pool
+    pool.close_all()
+
+
+def test_connections_are_configured(db_path):
+    conn = db.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.isolation_level == 'IMMEDIATE'
+    conn.close()
+
+
+def test_pragmas_from_env():
+    pragmas = db.pragmas_from_env({'SQLITE_BUSY_TIMEOUT': '100', 'SQLITE_UNKNOWN': '1'})
+    assert pragmas['busy_timeout'] == '100'
+    assert 'unknown' not in pragmas
+    assert pragmas['journal_mode'] == db.DEFAULT_PRAGMAS['journal_mode']
+
+
+def test_connections_are_opened_lazily_and_reused(pool):
+    assert pool.stats()['open'] == 0
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    second = pool.acquire()
+    assert second is not first
+    stats = pool.stats()
+    assert (stats['open'], stats['in_use'], stats['created'], stats['peak_in_use']) == (2, 2, 2, 2)
+
+
+def test_acquire_times_out_when_every_connection_is_borrowed(pool):
+    pool.acquire(), pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_acquire_waits_for_a_release(pool):
+    pool.timeout = 5
+    held = [pool.acquire(), pool.acquire()]
+    timer = threading.Timer(0.05, pool.release, (held[0],))
+    timer.start()
+    assert pool.acquire() is held[0]
+    timer.join()
+    stats = pool.stats()
+    assert stats['waits'] == 1 and stats['avg_wait_ms'] > 0
+
+
+def test_release_rolls_back_an_open_transaction(pool, conn):
+    borrowed = pool.acquire()
+    borrowed.execute("INSERT INTO alumni (name, created_at) VALUES ('Ana', '2024-01-01')")
+    assert borrowed.in_transaction
+    pool.release(borrowed)
+    assert not borrowed.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM alumni").fetchone()[0] == 0
+
+
+def test_discarded_connections_are_closed(pool):
+    borrowed = pool.acquire()
+    pool.release(borrowed, discard=True)
+    stats = pool.stats()
+    assert (stats['open'], stats['in_use'], stats['discarded']) == (0, 0, 1)
+    assert pool.acquire() is not borrowed
+
+
+def test_a_forked_child_starts_a_new_pool(pool):
+    parent = pool.acquire()
+    pool._pid = -1  # as if this process were a fork of another
+    assert pool.stats()['open'] == 0
+    assert pool.acquire() is not parent
+
+
+def test_a_request_borrows_one_connection_and_returns_it(console):
+    pool = db.get_pool(console)
+    seen = []
+
+    @console.route('/test-db')
+    def test_db():
+        seen.append((db.get_db(), db.get_db(), pool.stats()['in_use']))
+        return 'ok'
+
+    before = pool.stats()['in_use']
+    assert console.test_client().get('/test-db').status_code == 200
+    first, again, in_use = seen[0]
+    assert first is again
+    assert in_use == before + 1
+    assert pool.stats()['in_use'] == before
@@ -0,0 +1,73 @@
+import csv, gzip, io, json
+import pytest
+from alumni_core import exports, imports
+
+
+@pytest.fixture
+def filled(conn):
+    conn.executemany("INSERT INTO alumni (name, email, bio, created_at, dedup_key) VALUES (?,?,?,?,?)",
+                     [(f'Person {i}', f'p{i}@example.org', 'é' * 100, '2024-01-01', f'e:p{i}@example.org')
+                      for i in range(2000)])
+    conn.execute("INSERT INTO events (title, date, created_at) VALUES ('Meetup', '2024-05-01', '2024-01-01')")
+    conn.commit()
+
+
+def joined(chunks):
+    return b''.join(chunks).decode('utf-8')
+
+
+def test_json_document_comes_in_chunks(conn, filled):
+    chunks = list(exports.json_document(conn))
+    assert len(chunks) > 1
+    assert all(len(c) < 2 * exports.CHUNK_SIZE for c in chunks)
+    doc = json.loads(joined(chunks))
+    assert sorted(doc) == sorted(exports.TABLES)
+    assert len(doc['alumni']) == 2000 and doc['mentorships'] == []
+    assert doc['alumni'][0]['bio'] == 'é' * 100
+    assert exports.KEY_COLUMN not in doc['alumni'][0]
+
+
+def test_empty_documents_are_valid(conn):
+    assert json.loads(joined(exports.json_document(conn))) == {t: [] for t in exports.TABLES}
+    assert json.loads(joined(exports.json_document(conn, ()))) == {}
+    assert joined(exports.ndjson_lines(conn)) == ''
+
+
+def test_json_document_imports_back(conn, filled):
+    text = joined(exports.json_document(conn))
+    conn.execute("DELETE FROM alumni")
+    conn.commit()
+    result = imports.import_json(conn, io.StringIO(text))
+    assert result['tables']['alumni']['inserted'] == 2000
+    assert conn.execute("SELECT COUNT(*) FROM alumni").fetchone()[0] == 2000
+
+
+def test_ndjson_has_one_row_per_line(conn, filled):
+    lines = joined(exports.ndjson_lines(conn)).splitlines()
+    assert len(lines) == 2001
+    last = json.loads(lines[-1])
+    assert (last['table'], last['row']['title']) == ('events', 'Meetup')
+
+
+def test_csv(conn, filled):
+    rows = list(csv.reader(io.StringIO(joined(exports.csv_lines(conn, 'alumni')))))
+    assert rows[0] == exports.table_columns(conn, 'alumni')
+    assert len(rows) == 2001
+    assert rows[1][rows[0].index('name')] == 'Person 0'
+    # an empty table still gets its header
+    assert joined(exports.csv_lines(conn, 'mentorships')).splitlines() == [','.join(exports.table_columns(conn, 'mentorships'))]
+
+
+def test_gzip(conn, filled):
+    plain = b''.join(exports.stream(conn, exports.csv_lines, 'alumni'))
+    assert gzip.decompress(b''.join(exports.stream(conn, exports.csv_lines, 'alumni', gzip=True))) == plain
+
+
+def test_export_routes(admin):
+    admin.post('/api/alumni', json={'name': 'Ana', 'email': 'ana@example.org'})
+    resp = admin.get('/export/json?format=ndjson&gzip=1')
+    assert resp.mimetype == 'application/gzip'
+    assert 'alumni_connect_export.ndjson.gz' in resp.headers['Content-Disposition']
+    assert json.loads(gzip.decompress(resp.data))['row']['name'] == 'Ana'
+    assert admin.get('/export/csv?table=users').status_code == 400
+    assert admin.get('/export/json?format=xml').status_code == 400
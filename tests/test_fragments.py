@@ -0,0 +1,62 @@
+import sqlite3, time
+import pytest
+from alumni_core import fragments
+from alumni_core.fragments import DiskStore, FragmentCache
+
+
+@pytest.fixture
+def disk(tmp_path):
+    return DiskStore(str(tmp_path / 'fragments.db'), maxsize=10, ttl=60)
+
+
+def test_disk_store(disk):
+    assert disk.get('k') is None
+    disk.set('k', '<tr>')
+    assert disk.get('k') == '<tr>'
+    disk._connection().execute("UPDATE fragments SET stored_at = ?", (time.time() - 61,))
+    assert disk.get('k') is None
+
+
+def test_workers_share_fragments_through_the_disk(disk):
+    FragmentCache(disk=disk).set('k', '<tr>')
+    other = FragmentCache(disk=DiskStore(disk.path))  # another worker on the same file
+    assert other.get('k') == '<tr>'
+    assert other.get('k') == '<tr>'
+    stats = other.stats()
+    assert (stats['disk_hits'], stats['hits'], stats['misses']) == (1, 1, 0)
+
+
+def test_a_broken_disk_store_is_a_miss(disk):
+    class Broken(DiskStore):
+        def get(self, key, *body):
+            raise sqlite3.OperationalError('database is locked')
+        set = get
+
+    cache = FragmentCache(disk=Broken(disk.path))
+    cache.set('k', '<tr>')
+    cache.memory.clear()
+    assert cache.get('k') is None
+    assert cache.stats()['disk_errors'] == 2
+
+
+def test_list_pages_render_rows_once_per_table_version(console, admin):
+    cache = fragments.get_cache(console)
+    admin.post('/api/alumni', json={'name': 'Ana'})
+    assert b'Ana' in admin.get('/alumni').data
+    assert b'Ana' in admin.get('/alumni').data
+    assert (cache.stats()['misses'], cache.stats()['hits']) == (1, 1)
+    # a write bumps the version, so the next page is rendered again
+    admin.post('/api/alumni', json={'name': 'Ben'})
+    assert b'Ben' in admin.get('/alumni').data
+    assert cache.stats()['misses'] == 2
+    # other query strings are other fragments
+    admin.get('/alumni?company=Acme')
+    assert cache.stats()['misses'] == 3
+
+
+def test_the_signature_follows_the_templates(console, tmp_path):
+    before = fragments.template_signature(console)
+    template = tmp_path / 'extra.html'
+    template.write_text('x')
+    console.jinja_loader.searchpath.append(str(tmp_path))
+    assert fragments.template_signature(console) != before
@@ -0,0 +1,68 @@
+import sqlite3, threading
+import pytest
+from werkzeug.security import generate_password_hash
+from alumni_core import hashing
+from alumni_core.hashing import HashingBusy, HashingService
+from tests.conftest import ADMIN
+
+OLD_METHOD = 'pbkdf2:sha256:1000'
+NEW_METHOD = 'pbkdf2:sha256:2000'
+
+
+@pytest.fixture
+def service():
+    service = HashingService(NEW_METHOD, workers=1, max_pending=1, timeout=0.2)
+    yield service
+    service.shutdown()
+
+
+def test_verify(service):
+    stored = service.hash('secret')
+    assert hashing.method_of(stored) == NEW_METHOD
+    assert service.verify(stored, 'secret') == (True, None)
+    assert service.verify(stored, 'wrong') == (False, None)
+    assert service.verify(None, 'secret') == (False, None)
+
+
+def test_outdated_hashes_come_back_with_a_new_one(service):
+    ok, new_hash = service.verify(generate_password_hash('secret', OLD_METHOD), 'secret')
+    assert ok and hashing.method_of(new_hash) == NEW_METHOD
+    assert service.verify(new_hash, 'secret') == (True, None)
+    # a wrong password never gets a new hash
+    assert service.verify(generate_password_hash('secret', OLD_METHOD), 'wrong') == (False, None)
+    assert service.stats()['rehashed'] == 1
+
+
+def test_busy_when_a_call_takes_too_long(service):
+    release = threading.Event()
+    with pytest.raises(HashingBusy):
+        service._call(release.wait)
+    # the slot stays taken until the work really finishes
+    with pytest.raises(HashingBusy):
+        service.hash('secret')
+    release.set()
+    assert service.verify(service.hash('secret'), 'secret')[0]
+    stats = service.stats()
+    assert (stats['timeouts'], stats['busy']) == (1, 1)
+
+
+def test_inline_when_there_are_no_workers():
+    service = HashingService(NEW_METHOD, workers=0)
+    assert service.verify(service.hash('secret'), 'secret') == (True, None)
+    assert service._pool is None
+
+
+def test_login_upgrades_an_outdated_hash(console, db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE users SET password_hash=? WHERE username=?",
+                 (generate_password_hash(ADMIN['password'], OLD_METHOD), ADMIN['username']))
+    conn.commit()
+    client = console.test_client()
+    assert client.post('/login', data=dict(ADMIN, password='wrong')).status_code == 200
+    stored = conn.execute("SELECT password_hash FROM users WHERE username=?", (ADMIN['username'],)).fetchone()[0]
+    assert hashing.method_of(stored) == OLD_METHOD
+    assert client.post('/login', data=ADMIN).status_code == 302
+    stored = conn.execute("SELECT password_hash FROM users WHERE username=?", (ADMIN['username'],)).fetchone()[0]
+    assert hashing.method_of(stored) == hashing.get_service(console).canonical
+    conn.close()
+    assert console.test_client().post('/login', data=ADMIN).status_code == 302
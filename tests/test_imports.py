@@ -0,0 +1,191 @@
+import io, json, os, sqlite3
+import pytest
+from alumni_core import db, imports
+from alumni_core.jsonstream import JSONStreamError
+
+CSV = """Full Name,E-mail,Class of,Employer
+Ana Silva,ANA@example.org,2010,Acme
+
+Ben Ode,not-an-email,2011,Initech
+,nobody@example.org,2012,
+Cara Lee,cara@example.org,2012,Globex
+"""
+
+
+@pytest.fixture
+def pool(db_path, conn):
+    pool = db.ConnectionPool(db_path, size=2)
+    yield pool
+    pool.close_all()
+
+
+def finish_jobs():
+    # the executor has one thread, so this runs after every job queued before it
+    imports._get_executor().submit(lambda: None).result()
+
+
+def test_headers_are_recognised_by_alias():
+    assert imports.column_mapping(['Full Name', 'E-mail', 'Class of', 'Notes']) == \
+        {0: 'name', 1: 'email', 2: 'batch', 3: 'bio'}
+    assert imports.column_mapping(['Ana', 'ana@example.org']) is None
+
+
+def test_parse_validates_rows():
+    rows = [row for chunk in imports.parse(io.StringIO(CSV), chunk_rows=2) for row in chunk]
+    assert [(line, rec and rec['name'], reason) for line, rec, reason in rows] == [
+        (2, 'Ana Silva', None), (4, None, "invalid email 'not-an-email'"), (5, None, 'missing name'), (6, 'Cara Lee', None)]
+    assert rows[0][1]['email'] == 'ana@example.org'
+
+
+def test_rows_without_a_header_are_read_in_column_order():
+    (line, rec, reason), = next(imports.parse(io.StringIO('Ana,2010,ana@example.org,555,Acme,Hi\n')))
+    assert (rec['name'], rec['batch'], rec['company'], rec['bio']) == ('Ana', '2010', 'Acme', 'Hi')
+
+
+def test_run_csv_job_records_progress_and_rejects(conn, tmp_path):
+    path = tmp_path / 'upload.csv'
+    path.write_text(CSV)
+    job_id = imports.create_job(conn, 'alumni_csv', 'upload.csv')
+    assert imports.run_csv_job(conn, job_id, str(path), chunk_rows=2) == 'done'
+    job = imports.job_status(conn, job_id)
+    assert (job['status'], job['rows_processed'], job['rows_inserted'], job['rows_rejected']) == ('done', 4, 2, 2)
+    assert job['rejects'] == [{'line_no': 4, 'reason': "invalid email 'not-an-email'"}, {'line_no': 5, 'reason': 'missing name'}]
+    # the same file again adds nobody
+    again = imports.create_job(conn, 'alumni_csv', 'upload.csv')
+    imports.run_csv_job(conn, again, str(path))
+    assert imports.job_status(conn, again)['rows_unchanged'] == 2
+    assert conn.execute("SELECT COUNT(*) FROM alumni").fetchone()[0] == 2
+
+
+def test_run_csv_job_reports_errors(conn, tmp_path):
+    job_id = imports.create_job(conn, 'alumni_csv', 'gone.csv')
+    assert imports.run_csv_job(conn, job_id, str(tmp_path / 'gone.csv')) == 'failed'
+    assert imports.job_status(conn, job_id)['error'].startswith('FileNotFoundError')
+
+
+@pytest.fixture
+def spooled(monkeypatch):
+    paths = []
+
+    def spool(stream):
+        paths.append(spool_upload(stream))
+        return paths[-1]
+
+    spool_upload = imports.spool_upload
+    monkeypatch.setattr(imports, 'spool_upload', spool)
+    return paths
+
+
+def test_start_csv_import_runs_in_the_background(conn, pool, spooled):
+    job_id = imports.start_csv_import(pool, io.BytesIO(CSV.encode()), 'upload.csv', 'admin')
+    finish_jobs()
+    job = imports.job_status(conn, job_id)
+    assert (job['status'], job['rows_inserted'], job['created_by']) == ('done', 2, 'admin')
+    assert not os.path.exists(spooled[0])
+
+
+def test_a_job_that_breaks_is_marked_failed(conn, pool, spooled, monkeypatch):
+    def broken(conn, job_id, path):
+        raise RuntimeError('disk on fire')
+
+    monkeypatch.setattr(imports, 'run_csv_job', broken)
+    job_id = imports.start_csv_import(pool, io.BytesIO(CSV.encode()), 'upload.csv')
+    finish_jobs()
+    job = imports.job_status(conn, job_id)
+    assert (job['status'], job['error']) == ('failed', 'RuntimeError: disk on fire')
+    assert not os.path.exists(spooled[0])
+
+
+def test_a_job_that_cannot_be_queued_is_marked_failed(conn, pool, spooled, monkeypatch):
+    def no_executor():
+        raise RuntimeError('cannot schedule new futures after shutdown')
+
+    monkeypatch.setattr(imports, '_get_executor', no_executor)
+    with pytest.raises(RuntimeError):
+        imports.start_csv_import(pool, io.BytesIO(CSV.encode()), 'upload.csv')
+    assert conn.execute("SELECT status FROM import_jobs").fetchone()[0] == 'failed'
+    assert not os.path.exists(spooled[0])
+
+
+# ----- JSON -----
+
+def document(**tables):
+    return io.StringIO(json.dumps(tables))
+
+
+def alumni(conn):
+    return [tuple(r) for r in conn.execute("SELECT name, email FROM alumni ORDER BY id")]
+
+
+@pytest.fixture
+def stored(conn):
+    conn.execute("INSERT INTO alumni (name, batch, email, created_at, dedup_key) "
+                 "VALUES ('Old', '2010', 'old@example.org', '2020-01-01', 'e:old@example.org')")
+    conn.commit()
+
+
+def test_replace(conn, stored):
+    result = imports.import_json(conn, document(alumni=[{'name': 'Ana', 'email': 'ana@example.org'},
+                                                        {'name': 'Ben', 'email': 'ben@example.org'}]))
+    assert result['tables']['alumni']['deleted'] == 1
+    assert result['tables']['alumni']['inserted'] == 2
+    assert alumni(conn) == [('Ana', 'ana@example.org'), ('Ben', 'ben@example.org')]
+
+
+def test_merge_matches_on_the_dedup_key(conn, stored):
+    result = imports.import_json(conn, document(alumni=[{'name': 'Old Timer', 'email': 'OLD@example.org'},
+                                                        {'name': 'Ana', 'email': 'ana@example.org'},
+                                                        {'name': 'Ana Silva', 'email': 'ana@example.org'}]), mode='merge')
+    assert (result['tables']['alumni']['updated'], result['tables']['alumni']['inserted']) == (1, 1)
+    assert alumni(conn) == [('Old Timer', 'OLD@example.org'), ('Ana Silva', 'ana@example.org')]
+
+
+def test_a_broken_document_changes_nothing(conn, stored):
+    events_before = conn.execute("SELECT count(*) FROM events").fetchone()[0]
+    text = '{"events": [{"title": "Reunion", "date": "2024-05-01"}], "alumni": [{"name": "Ana"}, {"name": '
+    with pytest.raises(JSONStreamError):
+        imports.import_json(conn, io.StringIO(text))
+    assert not conn.in_transaction
+    assert alumni(conn) == [('Old', 'old@example.org')]
+    assert conn.execute("SELECT count(*) FROM events").fetchone()[0] == events_before
+    # the staging tables are gone
+    assert not conn.execute("SELECT name FROM sqlite_temp_master WHERE name LIKE 'import_stage_%'").fetchall()
+
+
+class SlowUpload(io.StringIO):
+    """Hands out the document a few characters at a time, writing from another connection on the way."""
+
+    def __init__(self, text, write, at=20):
+        super().__init__(text)
+        self.write_other, self.at, self.reads, self.error = write, at, 0, None
+
+    def read(self, size=-1):
+        self.reads += 1
+        if self.reads == self.at:
+            try:
+                self.write_other()
+            except sqlite3.OperationalError as e:
+                self.error = e
+        return super().read(8)
+
+
+def test_staging_does_not_hold_the_write_lock(conn, db_path, stored):
+    other = db.connect(db_path, dict(db.DEFAULT_PRAGMAS, busy_timeout=0))
+
+    def write():
+        other.execute("INSERT INTO events (title, date, created_at) VALUES ('Meanwhile', '2024-01-01', '2024-01-01')")
+        other.commit()
+
+    upload = SlowUpload(json.dumps({'alumni': [{'name': f'P{i}', 'email': f'p{i}@example.org'} for i in range(20)]}), write)
+    # a connection that has already written, as a request's would have
+    conn.execute("UPDATE alumni SET company='x'")
+    imports.import_json(conn, upload)
+    other.close()
+    assert upload.reads > upload.at
+    assert upload.error is None
+    assert len(alumni(conn)) == 20
+
+
+def test_unknown_mode(conn):
+    with pytest.raises(ValueError):
+        imports.import_json(conn, document(alumni=[]), mode='append')
@@ -0,0 +1,72 @@
+from alumni_core import ingest
+from alumni_core.ingest import dedup_key, upsert
+
+
+def person(name, batch='2015', email='', phone='', company='', bio=''):
+    return {'name': name, 'batch': batch, 'email': email, 'phone': phone, 'company': company, 'bio': bio}
+
+
+def test_dedup_key():
+    assert dedup_key('Ana', '2015', ' Ana@Example.ORG ', '') == 'e:ana@example.org'
+    assert dedup_key('José  Pérez', '2015', '', '+91 98765-43210') == dedup_key('perez, jose', ' 2015', None, '9876543210')
+    # a name and batch alone may be two classmates
+    assert dedup_key('Ana Silva', '2015', '', '') is None
+
+
+def test_upload_twice_adds_nobody(conn):
+    rows = [person('Ana', email='ana@example.org', company='Acme'), person('Ben', phone='555 0101')]
+    first = upsert(conn, rows)
+    assert (first['inserted'], first['updated'], first['unchanged']) == (2, 0, 0)
+    second = upsert(conn, rows)
+    assert (second['inserted'], second['updated'], second['unchanged']) == (0, 0, 2)
+    assert second['ids'] == first['ids']
+    assert conn.execute("SELECT count(*) FROM alumni").fetchone()[0] == 2
+
+
+def test_blank_fields_do_not_erase(conn):
+    upsert(conn, [person('Ana', email='ana@example.org', company='Acme')])
+    result = upsert(conn, [person('Ana', email='ANA@example.org', bio='Runs the alumni club')])
+    assert ingest.outcome(result) == 'updated'
+    row = conn.execute("SELECT company, bio FROM alumni").fetchone()
+    assert tuple(row) == ('Acme', 'Runs the alumni club')
+
+
+def test_same_person_twice_in_one_upload_is_folded(conn):
+    result = upsert(conn, [person('Ana', email='ana@example.org', company='Acme'),
+                           person('Ana', email='ana@example.org', bio='Mentor')])
+    assert (result['inserted'], result['duplicates']) == (1, 1)
+    assert result['ids'][0] == result['ids'][1]
+    assert tuple(conn.execute("SELECT company, bio FROM alumni").fetchone()) == ('Acme', 'Mentor')
+
+
+def test_records_without_a_key_are_always_added(conn):
+    result = upsert(conn, [person('Ana Silva'), person('Ana Silva')])
+    assert (result['inserted'], result['duplicates']) == (2, 0)
+    assert len(set(result['ids'])) == 2
+
+
+def test_backfill_merges_into_the_older_row(conn):
+    conn.executemany("INSERT INTO alumni (name, batch, email, phone, company, created_at) VALUES (?,?,?,?,?,?)", [
+        ('Ana', '2015', 'ana@example.org', '', 'Acme', '2020-01-01'),
+        ('Ana S', '2015', 'Ana@Example.org', '', '', '2021-01-01'),
+        ('Ana Silva', '2015', '', '', '', '2022-01-01'),
+    ])
+    older, newer, unkeyable = [r[0] for r in conn.execute("SELECT id FROM alumni ORDER BY id")]
+    conn.execute("INSERT INTO mentorships (title, alumni_id, student_name, created_at) VALUES ('Career', ?, 'Sam', '2022-01-01')",
+                 (newer,))
+    result = ingest.backfill(conn, batch=2)
+    assert result == {'scanned': 3, 'keyed': 1, 'merged': 1, 'unkeyable': 1}
+    rows = conn.execute("SELECT id, name, company, created_at, dedup_key FROM alumni ORDER BY id").fetchall()
+    assert [tuple(r) for r in rows] == [(older, 'Ana S', 'Acme', '2020-01-01', 'e:ana@example.org'),
+                                       (unkeyable, 'Ana Silva', '', '2022-01-01', None)]
+    assert conn.execute("SELECT alumni_id FROM mentorships").fetchone()[0] == older
+
+
+def test_dedupe_commits_in_batches(conn):
+    conn.executemany("INSERT INTO alumni (name, batch, email, created_at) VALUES (?,?,?,?)",
+                     [(f'P{i}', '2015', f'p{i % 3}@example.org', '2020-01-01') for i in range(7)])
+    conn.commit()
+    result = ingest.dedupe(conn, batch=2, pause=0)
+    assert (result['keyed'], result['merged']) == (3, 4)
+    assert not conn.in_transaction
+    assert ingest.unkeyed(conn) == 0
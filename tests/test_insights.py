@@ -0,0 +1,55 @@
+from alumni_core import insights
+
+
+def counts(conn, metric):
+    return dict(conn.execute("SELECT key, cnt FROM insight_counts WHERE metric=?", (metric,)).fetchall())
+
+
+def test_inserts_updates_and_deletes_keep_counts(conn):
+    conn.executemany("INSERT INTO alumni (name, batch, company, created_at) VALUES (?,?,?,'')",
+                     [('Ana', '2010', 'Acme'), ('Ben', '2010', 'Initech'), ('Cara', '2011', None)])
+    conn.commit()
+    assert counts(conn, 'alumni') == {'': 3}
+    assert counts(conn, 'alumni_by_batch') == {'2010': 2, '2011': 1}
+    assert counts(conn, 'alumni_by_company') == {'Acme': 1, 'Initech': 1, '': 1}
+    conn.execute("UPDATE alumni SET batch='2011' WHERE name='Ben'")
+    conn.execute("UPDATE alumni SET bio='unrelated' WHERE name='Ana'")
+    conn.execute("DELETE FROM alumni WHERE name='Cara'")
+    conn.commit()
+    assert counts(conn, 'alumni') == {'': 2}
+    # counters that reach zero are removed
+    assert counts(conn, 'alumni_by_batch') == {'2010': 1, '2011': 1}
+    assert counts(conn, 'alumni_by_company') == {'Acme': 1, 'Initech': 1}
+    assert insights.check(conn) == []
+
+
+def test_events_by_month_and_mentorship_status(conn):
+    conn.executemany("INSERT INTO events (title, date, created_at) VALUES (?,?,'')",
+                     [('A', '2024-05-01'), ('B', '2024-05-20'), ('C', '2024-06-02')])
+    conn.execute("INSERT INTO mentorships (title, field, approved, created_at) VALUES ('M', 'Data', 0, '')")
+    conn.commit()
+    assert counts(conn, 'events_by_month') == {'2024-05': 2, '2024-06': 1}
+    assert counts(conn, 'mentorships_by_status') == {'pending': 1}
+    conn.execute("UPDATE mentorships SET approved=1")
+    conn.commit()
+    assert counts(conn, 'mentorships_by_status') == {'approved': 1}
+
+
+def test_summary(conn):
+    conn.executemany("INSERT INTO alumni (name, batch, created_at) VALUES (?,?,'')",
+                     [('Ana', '2010'), ('Ben', '2010'), ('Cara', '2011')])
+    conn.commit()
+    summary = insights.summary(conn, top=1)
+    assert summary['totals'] == {'alumni': 3, 'events': 0, 'mentorships': 0}
+    assert summary['alumni_by_batch'] == [{'key': '2010', 'count': 2}]
+
+
+def test_drift_is_reported_and_rebuilt(conn, db_path, capsys):
+    conn.execute("INSERT INTO alumni (name, batch, created_at) VALUES ('Ana', '2010', '')")
+    conn.execute("UPDATE insight_counts SET cnt = 5 WHERE metric='alumni'")
+    conn.commit()
+    assert insights.check(conn) == [('alumni', '', 5, 1)]
+    assert insights.main([db_path, '--check']) == 1
+    assert 'DRIFT  alumni' in capsys.readouterr().out
+    assert insights.main([db_path, '--rebuild', '--check']) == 0
+    assert insights.check(conn) == []
@@ -0,0 +1,112 @@
+import datetime
+import pytest
+from alumni_core import maintenance
+from alumni_core.db import ConnectionPool
+from alumni_core.maintenance import Scheduler
+
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    monkeypatch.setattr(maintenance, 'BATCH_PAUSE', 0)
+
+
+@pytest.fixture
+def pool(conn, db_path):
+    pool = ConnectionPool(db_path, size=2)
+    yield pool
+    pool.close_all()
+
+
+def tokens(conn, *expires):
+    conn.executemany("INSERT INTO pw_reset_tokens (user_id, token, expires_at) VALUES (1, ?, ?)",
+                     [(f't{i}', e) for i, e in enumerate(expires)])
+    conn.commit()
+
+
+def ago(seconds):
+    return (datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds)).isoformat()
+
+
+def job(conn, name):
+    return conn.execute("SELECT * FROM maintenance_jobs WHERE name=?", (name,)).fetchone()
+
+
+def test_purge_tokens_in_batches(conn):
+    tokens(conn, *[ago(60)] * 5, ago(-3600))
+    assert maintenance.purge_tokens(conn, batch=2) == {'deleted': 5, 'batches': 3}
+    assert conn.execute("SELECT COUNT(*) FROM pw_reset_tokens").fetchone()[0] == 1
+
+
+def test_a_job_runs_once_per_interval(conn, pool):
+    tokens(conn, ago(60))
+    scheduler = Scheduler(pool)
+    report = scheduler.run('purge_tokens')
+    assert (report['result'], report['error']) == ({'deleted': 1, 'batches': 1}, None)
+    assert scheduler.run('purge_tokens') is None  # not due again for an hour
+    row = job(conn, 'purge_tokens')
+    assert (row['runs'], row['lease_until']) == (1, None)
+    assert scheduler.run('purge_tokens', force=True) is not None
+
+
+def test_a_held_lease_is_respected_until_it_expires(conn, pool):
+    scheduler = Scheduler(pool)
+    conn.execute("INSERT INTO maintenance_jobs (name, owner, lease_until, started_at) VALUES ('checkpoint', 'gone:1', ?, ?)",
+                 (ago(-600), ago(300)))
+    conn.commit()
+    assert scheduler.run('checkpoint', force=True) is None
+    conn.execute("UPDATE maintenance_jobs SET lease_until=? WHERE name='checkpoint'", (ago(1),))
+    conn.commit()
+    # the worker holding it was killed mid-job: the lease is taken over
+    assert scheduler.run('checkpoint') is not None
+    assert job(conn, 'checkpoint')['owner'] == scheduler._owner()
+
+
+def test_only_one_worker_claims_a_due_job(conn, pool):
+    first, second = Scheduler(pool), Scheduler(pool)
+    second._owner = lambda: 'other-host:1'
+    assert first.run('optimize') is not None
+    assert second.run('optimize') is None
+    assert job(conn, 'optimize')['runs'] == 1
+
+
+def test_a_failing_job_is_recorded(conn, pool, monkeypatch):
+    def broken(conn):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setitem(maintenance.JOBS, 'purge_tokens', (broken, 3600))
+    scheduler = Scheduler(pool)
+    assert scheduler.run('purge_tokens')['error'] == 'RuntimeError: disk full'
+    row = job(conn, 'purge_tokens')
+    assert (row['error'], row['lease_until'], row['runs']) == ('RuntimeError: disk full', None, 1)
+    assert scheduler.stats()['worker']['purge_tokens']['errors'] == 1
+
+
+def test_run_due_skips_jobs_turned_off(pool):
+    scheduler = Scheduler(pool, intervals={'optimize': 0, 'incremental_vacuum': 0})
+    assert sorted(r['job'] for r in scheduler.run_due()) == ['checkpoint', 'purge_tokens']
+    assert scheduler.run_due() == []
+
+
+def test_checkpoint_truncates_the_wal(conn):
+    conn.executemany("INSERT INTO alumni (name, created_at) VALUES (?, '')", [(f'P{i}',) for i in range(500)])
+    conn.commit()
+    result = maintenance.checkpoint(conn)
+    assert (result['mode'], result['busy'], result['wal_mb_after']) == ('truncate', False, 0.0)
+
+
+def test_incremental_vacuum_frees_pages(conn):
+    conn.executemany("INSERT INTO alumni (name, bio, created_at) VALUES (?, ?, '')", [(f'P{i}', 'x' * 2000) for i in range(500)])
+    conn.commit()
+    conn.execute("DELETE FROM alumni")
+    conn.commit()
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    result = maintenance.incremental_vacuum(conn, step=50)
+    assert result['freed_pages'] == free and result['free_pages'] == 0
+
+
+def test_optimize_analyzes_changed_tables(conn):
+    conn.executemany("INSERT INTO alumni (name, created_at) VALUES (?, '')", [(f'P{i}',) for i in range(50)])
+    conn.commit()
+    assert 'alumni' not in maintenance.optimize(conn)['analyzed']  # too small to bother
+    assert maintenance.optimize(conn, min_rows=10)['analyzed']['alumni'] == 50
+    assert 'alumni' not in maintenance.optimize(conn, min_rows=10)['analyzed']
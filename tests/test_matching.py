@@ -0,0 +1,77 @@
+import pytest
+from alumni_core import matching
+
+
+@pytest.fixture
+def mentors(conn):
+    rows = [('Ana', 'Data Science', 'Machine learning and statistics.'),
+            ('Ben', 'Acme', 'Backend engineering and machine vision.'),
+            ('Cara', 'Globex', 'Product design.')]
+    ids = {}
+    for name, company, bio in rows:
+        ids[name] = conn.execute("INSERT INTO alumni (name, company, bio, created_at) VALUES (?,?,?,'')",
+                                 (name, company, bio)).lastrowid
+    conn.commit()
+    return ids
+
+
+def request(conn, title, field, note='', student='Sam'):
+    row_id = conn.execute("INSERT INTO mentorships (title, field, note, student_name, created_at) VALUES (?,?,?,?,'')",
+                          (title, field, note, student)).lastrowid
+    conn.commit()
+    return row_id
+
+
+def names(items):
+    return [m['name'] for m in items]
+
+
+def test_build_queries_go_from_narrow_to_broad():
+    assert matching.build_queries('Data Science', 'Looking for help with machine learning') == [
+        '"data science" AND "machine" AND "learning"',
+        f'"data science" AND ("machine" OR "learning" OR {matching.VOLUNTEER})',
+        '"data science" OR "machine" OR "learning"']
+    assert matching.build_queries('', 'I need a mentor') == []
+    assert matching.build_queries('Design', '') == ['"design"']
+
+
+def test_mentor_ref():
+    assert matching.mentor_ref(14) == ('alumni', 7)
+    assert matching.mentor_ref(15) == ('application', 7)
+
+
+def test_best_mentor_first(conn, mentors):
+    found = matching.matches(conn, request(conn, 'Machine learning', 'Data Science'), k=2)
+    assert names(found['matches']) == ['Ana', 'Ben']
+    assert found['matches'][0] == dict(found['matches'][0], kind='alumni', id=mentors['Ana'])
+    assert matching.matches(conn, 999) is None
+
+
+def test_only_approved_applications_are_mentors(conn, mentors):
+    app_id = conn.execute("INSERT INTO mentor_applications (name, field, note, status, created_at) "
+                          "VALUES ('Dee', 'Robotics', 'Robot arms.', 'pending', '')").lastrowid
+    conn.commit()
+    assert matching.candidates(conn, 'Robotics', '', '') == []
+    conn.execute("UPDATE mentor_applications SET status='approved' WHERE id=?", (app_id,))
+    conn.commit()
+    (dee,) = matching.candidates(conn, 'Robotics', '', '')
+    assert (dee['kind'], dee['id']) == ('application', app_id)
+    conn.execute("DELETE FROM mentor_applications WHERE id=?", (app_id,))
+    conn.commit()
+    assert matching.candidates(conn, 'Robotics', '', '') == []
+
+
+def test_propose_spreads_students(conn, mentors):
+    requests = [request(conn, 'Machine learning', 'Data Science', student=f'S{i}') for i in range(3)]
+    result = matching.propose(conn, k=2, capacity=2)
+    assert [p['mentorship_id'] for p in result['proposals']] == requests
+    assert names(p['mentor'] for p in result['proposals']) == ['Ana', 'Ana', 'Ben']
+    assert result['stats']['lookups'] == 1
+    assert result['unmatched'] == []
+
+
+def test_open_requests(conn, mentors):
+    own = request(conn, 'Mentor: Ana', 'Data Science', student='')  # filed by approve_mentor()
+    anonymous = request(conn, 'Machine learning', 'Data Science', student=None)
+    assert [r['id'] for r in matching.open_requests(conn)] == [anonymous]
+    assert own not in [p['mentorship_id'] for p in matching.propose(conn)['proposals']]
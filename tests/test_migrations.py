@@ -0,0 +1,91 @@
+import sqlite3
+import pytest
+from alumni_core import db, migrations
+
+
+def schema(conn):
+    return sorted(tuple(r) for r in conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+
+
+@pytest.fixture
+def empty(db_path):
+    conn = db.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def test_migrate_applies_every_version_once(empty):
+    applied = migrations.migrate(empty)
+    assert [v for v, _ in applied] == [v for v, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version(empty) == migrations.latest_version()
+    assert migrations.migrate(empty) == []
+
+
+def test_legacy_console_schema(empty):
+    # the admin console's original tables: no role column, every user an administrator
+    empty.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password_hash TEXT);
+        CREATE TABLE alumni (id INTEGER PRIMARY KEY, name TEXT, batch TEXT, email TEXT, phone TEXT,
+                             company TEXT, bio TEXT, created_at TEXT);
+        INSERT INTO users (username, password_hash) VALUES ('root', 'x');
+        INSERT INTO alumni (id, name) VALUES (7, 'Ana');
+    """)
+    migrations.migrate(empty)
+    assert empty.execute("SELECT role FROM users WHERE username='root'").fetchone()[0] == 'admin'
+    row = empty.execute("SELECT id, created_at FROM alumni").fetchone()
+    assert tuple(row) == (7, '')
+
+
+def test_a_failing_migration_is_rolled_back(empty, monkeypatch):
+    migrations.migrate(empty)
+    version = migrations.latest_version()
+
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS + [(version + 1, 'broken', broken)])
+    with pytest.raises(RuntimeError):
+        migrations.migrate(empty)
+    assert migrations.current_version(empty) == version
+    assert 'half_done' not in [name for _, name in schema(empty)]
+
+
+def test_not_null_sort_keys_keep_rows_indexes_and_triggers(empty):
+    migrations.migrate(empty, target=14)
+    empty.execute("INSERT INTO alumni (name, created_at) VALUES ('Ana', NULL)")
+    empty.execute("INSERT INTO events (title, date) VALUES ('Meetup', NULL)")
+    empty.commit()
+    before = schema(empty)
+    migrations.migrate(empty)
+    assert schema(empty) == before
+    assert empty.execute("SELECT created_at FROM alumni").fetchone()[0] == ''
+    assert empty.execute("SELECT date FROM events").fetchone()[0] == ''
+    empty.execute("INSERT INTO alumni (name, created_at) VALUES ('Ben', '2024-01-01')")
+    empty.commit()
+    # the full-text triggers survived the rebuild
+    assert empty.execute("SELECT COUNT(*) FROM alumni_fts WHERE alumni_fts MATCH 'ben'").fetchone()[0] == 1
+    assert empty.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+
+
+def test_hot_queries_use_indexes(conn):
+    assert migrations.check_query_plans(conn) == []
+    migrations.assert_query_plans(conn)
+
+
+def test_a_table_scan_is_reported(conn):
+    queries = {'by_bio': ("SELECT * FROM alumni WHERE bio = ?", ('',))}
+    assert migrations.check_query_plans(conn, queries) == [('by_bio', 'SCAN alumni')]
+    with pytest.raises(migrations.QueryPlanError):
+        migrations.assert_query_plans(conn, queries)
+
+
+def test_check_command(db_path, capsys):
+    assert migrations.main([db_path, '--check']) == 0
+    assert 'hot queries use indexes' in capsys.readouterr().out
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP INDEX idx_alumni_email")
+    conn.commit()
+    conn.close()
+    assert migrations.main([db_path, '--check']) == 1
+    assert 'TABLE SCAN  alumni_by_email' in capsys.readouterr().out
@@ -0,0 +1,109 @@
+import datetime, smtplib
+import pytest
+from alumni_core import db, outbox
+
+
+class FakeSMTP:
+    """Stands in for ``smtplib.SMTP``; ``fail`` maps a recipient to the exception its message raises."""
+    connections, sent, fail, refuse = 0, [], {}, None
+
+    def __init__(self, host, port, timeout=None):
+        if FakeSMTP.refuse is not None:
+            raise FakeSMTP.refuse
+        FakeSMTP.connections += 1
+
+    def send_message(self, msg):
+        error = FakeSMTP.fail.get(msg['To'])
+        if error is not None:
+            raise error
+        FakeSMTP.sent.append(msg['To'])
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    monkeypatch.setattr(FakeSMTP, 'connections', 0)
+    monkeypatch.setattr(FakeSMTP, 'sent', [])
+    monkeypatch.setattr(FakeSMTP, 'fail', {})
+    monkeypatch.setattr(FakeSMTP, 'refuse', None)
+    monkeypatch.setattr(outbox.smtplib, 'SMTP', FakeSMTP)
+    return FakeSMTP
+
+
+@pytest.fixture
+def box(conn, db_path):
+    pool = db.ConnectionPool(db_path, size=2)
+    yield outbox.Outbox(pool, batch_size=10, max_attempts=3, retry_base=30)
+    pool.close_all()
+
+
+def queue(conn, *recipients, subject='Reset your password'):
+    ids = [outbox.enqueue(conn, to, subject, 'Follow the link.') for to in recipients]
+    conn.commit()
+    return ids
+
+
+def status(conn, row_id):
+    return conn.execute("SELECT status, attempts, next_attempt_at, last_error FROM email_outbox WHERE id=?",
+                        (row_id,)).fetchone()
+
+
+def test_one_connection_for_a_batch(conn, box, smtp):
+    ids = queue(conn, 'a@example.org', 'b@example.org', 'c@example.org')
+    assert box.drain() == 3
+    assert smtp.sent == ['a@example.org', 'b@example.org', 'c@example.org']
+    assert smtp.connections == 1
+    assert [status(conn, i)['status'] for i in ids] == ['sent'] * 3
+    assert box.stats()['sent'] == 3
+
+
+def test_a_message_that_cannot_be_built_fails_alone(conn, box, smtp):
+    good, bad, other = queue(conn, 'a@example.org', 'b@example.org', 'c@example.org')
+    conn.execute("UPDATE email_outbox SET subject='Hi\nBcc: everyone@example.org' WHERE id=?", (bad,))
+    conn.commit()
+    box.drain()
+    assert smtp.sent == ['a@example.org', 'c@example.org']
+    assert status(conn, bad)['status'] == 'failed'
+    assert status(conn, bad)['last_error']
+    assert (status(conn, good)['status'], status(conn, other)['status']) == ('sent', 'sent')
+
+
+def test_temporary_rejection_is_retried_later(conn, box, smtp):
+    (row_id,) = queue(conn, 'a@example.org')
+    smtp.fail['a@example.org'] = smtplib.SMTPRecipientsRefused({'a@example.org': (451, b'try later')})
+    before = datetime.datetime.utcnow()
+    box.drain()
+    row = status(conn, row_id)
+    assert (row['status'], row['attempts']) == ('queued', 1)
+    assert datetime.datetime.fromisoformat(row['next_attempt_at']) >= before + datetime.timedelta(seconds=30)
+    # not due yet
+    assert box.drain() == 0
+
+
+def test_permanent_rejection_fails(conn, box, smtp):
+    (row_id,) = queue(conn, 'a@example.org')
+    smtp.fail['a@example.org'] = smtplib.SMTPRecipientsRefused({'a@example.org': (550, b'no such user')})
+    box.drain()
+    assert tuple(status(conn, row_id))[:2] == ('failed', 1)
+
+
+def test_unreachable_server_retries_the_whole_batch(conn, box, smtp):
+    ids = queue(conn, 'a@example.org', 'b@example.org')
+    smtp.refuse = ConnectionRefusedError('connection refused')
+    box.drain()
+    assert [tuple(status(conn, i))[:2] for i in ids] == [('queued', 1), ('queued', 1)]
+    assert box.stats()['retried'] == 2
+
+
+def test_out_of_attempts(conn, box, smtp):
+    (row_id,) = queue(conn, 'a@example.org')
+    conn.execute("UPDATE email_outbox SET attempts=2 WHERE id=?", (row_id,))
+    conn.commit()
+    smtp.refuse = ConnectionRefusedError('connection refused')
+    box.drain()
+    assert tuple(status(conn, row_id))[:2] == ('failed', 3)
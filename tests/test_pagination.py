@@ -0,0 +1,81 @@
+import sqlite3
+import pytest
+from alumni_core import pagination
+from alumni_core.pagination import ALUMNI, InvalidCursor, InvalidFields, fetch_page, page_from_args
+
+
+@pytest.fixture
+def alumni(conn):
+    # three rows per timestamp, so the id has to break ties
+    conn.executemany("INSERT INTO alumni (name, batch, company, created_at) VALUES (?,?,?,?)",
+                     [(f'Person {i}', str(2000 + i % 3), 'Acme' if i % 2 else 'Initech', f'2024-01-{1 + i // 3:02d}')
+                      for i in range(25)])
+    conn.commit()
+    return [r['id'] for r in conn.execute("SELECT id FROM alumni ORDER BY created_at DESC, id DESC")]
+
+
+def ids(page):
+    return [r['id'] for r in page.items]
+
+
+def test_pages_cover_every_row_once(conn, alumni):
+    seen, cursor = [], None
+    while True:
+        page = fetch_page(conn, ALUMNI, after=cursor, limit=4)
+        seen += ids(page)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == alumni
+
+
+def test_before_returns_the_previous_page(conn, alumni):
+    first = fetch_page(conn, ALUMNI, limit=5)
+    assert first.prev_cursor is None
+    second = fetch_page(conn, ALUMNI, after=first.next_cursor, limit=5)
+    assert ids(second) == alumni[5:10]
+    back = fetch_page(conn, ALUMNI, before=second.prev_cursor, limit=5)
+    assert ids(back) == alumni[:5]
+    assert back.prev_cursor is None
+
+
+def test_filters_are_exact_matches(conn, alumni):
+    page = fetch_page(conn, ALUMNI, limit=50, filters={'company': 'Acme', 'batch': '', 'name': 'ignored'})
+    assert page.filters == {'company': 'Acme'}
+    assert ids(page) == [i for i in alumni if conn.execute("SELECT company FROM alumni WHERE id=?", (i,)).fetchone()[0] == 'Acme']
+
+
+def test_fields_select_only_those_columns(conn, alumni):
+    fields = pagination.parse_fields(ALUMNI, 'name, id,name')
+    assert fields == ['name', 'id']
+    page = fetch_page(conn, ALUMNI, limit=2, fields=fields)
+    assert page.records() == [{'name': r['name'], 'id': r['id']} for r in page.items]
+    with pytest.raises(InvalidFields):
+        pagination.parse_fields(ALUMNI, 'name,password')
+
+
+def test_invalid_cursor(conn, alumni):
+    with pytest.raises(InvalidCursor):
+        fetch_page(conn, ALUMNI, after='not a cursor')
+
+
+def test_page_from_args_caps_the_limit(conn, alumni):
+    assert page_from_args(conn, ALUMNI, {'limit': '1000'}, max_limit=10).limit == 10
+    assert page_from_args(conn, ALUMNI, {'limit': 'x'}, default_limit=3).limit == 3
+    assert page_from_args(conn, ALUMNI, {'limit': '0'}).limit == 1
+
+
+def test_sort_keys_cannot_be_null(conn, alumni):
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO alumni (name, created_at) VALUES ('No date', NULL)")
+    conn.rollback()
+    undated = conn.execute("INSERT INTO alumni (name) VALUES ('No date')").lastrowid
+    conn.commit()
+    seen, cursor = [], None
+    while True:
+        page = fetch_page(conn, ALUMNI, after=cursor, limit=7)
+        seen += ids(page)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == alumni + [undated]  # created_at '' sorts last
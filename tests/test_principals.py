@@ -0,0 +1,90 @@
+import sqlite3
+from alumni_core import principals
+from alumni_core.principals import PrincipalCache, TTLCache
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire():
+    clock = Clock()
+    cache = TTLCache(ttl=30, clock=clock)
+    cache.set('ana', 1)
+    clock.now = 29
+    assert cache.get('ana') == 1
+    clock.now = 31
+    assert cache.get('ana', None) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['hit_rate']) == (1, 1, 1, 0.5)
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1), cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b', None) is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_invalidate_where():
+    cache = TTLCache()
+    cache.set('ana', {'id': 1}), cache.set('ben', {'id': 2}), cache.set('nobody', None)
+    cache.invalidate_where(lambda k, v: v is not None and v['id'] == 2)
+    assert cache.get('ben', None) is None
+    assert cache.get('ana') == {'id': 1}
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_loader_runs_once_per_key_including_unknown_users(conn):
+    calls = []
+
+    def loader(conn, key):
+        calls.append(key)
+        return conn.execute("SELECT id, username, role FROM users WHERE username = ?", (key,)).fetchone()
+
+    conn.execute("INSERT INTO users (username, role) VALUES ('ana', 'admin')")
+    cache = PrincipalCache(loader, 'user')
+    assert cache.load(conn, 'ana')['role'] == 'admin'
+    assert cache.load(conn, 'ana')['role'] == 'admin'
+    assert cache.load(conn, 'ghost') is None
+    assert cache.load(conn, 'ghost') is None
+    assert calls == ['ana', 'ghost']
+
+
+def demote(db_path):
+    other = sqlite3.connect(db_path)  # e.g. another worker
+    other.execute("UPDATE users SET role='user' WHERE username='admin'")
+    other.commit()
+    other.close()
+
+
+def test_a_role_change_shows_after_invalidation(console, admin, db_path):
+    assert admin.get('/api/mentorships/proposals').status_code == 200
+    demote(db_path)
+    # this worker still has the cached admin until the entry expires or is invalidated
+    assert admin.get('/api/mentorships/proposals').status_code == 200
+    with console.app_context():
+        principals.invalidate('admin')
+    assert admin.get('/api/mentorships/proposals').status_code == 403
+
+
+def test_the_cache_expires(console, admin, db_path):
+    principals.get_cache(console).ttl = 0  # every entry is stale at once
+    assert admin.get('/api/mentorships/proposals').status_code == 200
+    demote(db_path)
+    assert admin.get('/api/mentorships/proposals').status_code == 403
+
+
+def test_invalidate_by_user_id(console, admin, db_path):
+    admin.get('/api/mentorships/proposals')
+    demote(db_path)
+    with console.app_context():
+        user_id = principals.get_cache().get('admin')['id']
+        principals.invalidate(user_id=user_id)  # as after a password reset
+    assert admin.get('/api/mentorships/proposals').status_code == 403
@@ -0,0 +1,63 @@
+import pytest
+from alumni_core import search
+
+
+@pytest.fixture
+def people(conn):
+    conn.executemany("INSERT INTO alumni (name, batch, email, phone, company, bio, created_at) VALUES (?,?,?,?,?,?,?)", [
+        ('Anna Berg', '2010', 'anna@example.org', '555-1', 'Google', 'Works on search.', '2024-01-01'),
+        ('Ben Ode', '2011', 'ben@example.org', '555-2', 'Initech', 'Used to intern at Google.', '2024-01-02'),
+        ('Cara <b>Lee</b>', '2012', None, None, 'Acme', 'Annual meetup host.', '2024-01-03'),
+    ])
+    conn.commit()
+
+
+def names(page):
+    return [item['name'] for item in page.items]
+
+
+def test_build_match_prefixes_every_word():
+    assert search.build_match('ann  goo!') == '"ann"* "goo"*'
+    assert search.build_match('"; DROP') == '"DROP"*'
+    assert search.build_match('  ') == ''
+
+
+def test_every_word_must_match_as_a_prefix(conn, people):
+    assert names(search.search_alumni(conn, 'ann goo')) == ['Anna Berg']
+    assert names(search.search_alumni(conn, 'ann')) == ['Anna Berg', 'Cara <b>Lee</b>']
+    assert search.search_alumni(conn, '').items == []
+
+
+def test_name_and_company_rank_above_the_bio(conn, people):
+    assert names(search.search_alumni(conn, 'google')) == ['Anna Berg', 'Ben Ode']
+
+
+def test_highlights_are_escaped(conn, people):
+    item = search.search_alumni(conn, 'lee').items[0]
+    assert item['name_html'] == 'Cara &lt;b&gt;<mark>Lee</mark>&lt;/b&gt;'
+    assert search.KEY_COLUMN not in item
+
+
+def test_the_index_follows_updates_and_deletes(conn, people):
+    conn.execute("UPDATE alumni SET company='Globex' WHERE name='Anna Berg'")
+    conn.execute("DELETE FROM alumni WHERE name='Ben Ode'")
+    conn.commit()
+    assert search.search_alumni(conn, 'google').items == []
+    assert names(search.search_alumni(conn, 'globex')) == ['Anna Berg']
+
+
+def test_paging(conn, people):
+    first = search.search_from_args(conn, {'q': 'a', 'limit': '2'})
+    assert len(first.items) == 2 and first.link_args('prev') is None
+    second = search.search_from_args(conn, first.link_args('next'))
+    assert len(second.items) == 1 and second.link_args('next') is None
+    assert search.search_from_args(conn, {'q': 'a', 'limit': 'x'}).limit == 20
+
+
+def test_contact_details_only_for_signed_in_users(console, admin):
+    admin.post('/api/alumni', json={'name': 'Anna Berg', 'email': 'anna@example.org', 'phone': '555-1'})
+    signed_in = admin.get('/api/alumni/search?q=anna').get_json()['items'][0]
+    assert (signed_in['email'], signed_in['phone']) == ('anna@example.org', '555-1')
+    anonymous = console.test_client().get('/api/alumni/search?q=anna').get_json()['items'][0]
+    assert anonymous['name'] == 'Anna Berg'
+    assert 'email' not in anonymous and 'phone' not in anonymous
@@ -0,0 +1,94 @@
+import os, sqlite3
+import pytest
+from alumni_core import snapshots
+from alumni_core.snapshots import SnapshotReader, SnapshotsBusy
+
+
+def count(conn):
+    return conn.execute("SELECT COUNT(*) FROM alumni").fetchone()[0]
+
+
+def add(conn, name='Ana'):
+    conn.execute("INSERT INTO alumni (name, created_at) VALUES (?, '')", (name,))
+    conn.commit()
+
+
+@pytest.fixture
+def live(conn, db_path):
+    reader = SnapshotReader(db_path, size=1, timeout=0.1)
+    yield reader
+    reader.close()
+
+
+@pytest.fixture
+def copies(conn, db_path, tmp_path):
+    directory = tmp_path / 'snapshots'
+    directory.mkdir()
+    reader = SnapshotReader(db_path, max_age=60, directory=str(directory))
+    yield reader
+    reader.close()
+
+
+def files(reader):
+    return sorted(os.listdir(reader.directory))
+
+
+def test_a_snapshot_does_not_see_later_writes(conn, live):
+    add(conn)
+    with live.open() as snap:
+        add(conn, 'Ben')
+        assert count(snap.conn) == 1
+        with pytest.raises(sqlite3.OperationalError):
+            snap.conn.execute("DELETE FROM alumni")
+    with live.open() as snap:
+        assert count(snap.conn) == 2
+
+
+def test_busy_when_every_connection_is_taken(live):
+    with live.open():
+        with pytest.raises(SnapshotsBusy):
+            live.open()
+    assert live.stats()['busy'] == 1
+    live.open().close()
+
+
+def test_copies_are_reused_until_too_old(conn, copies):
+    add(conn)
+    with copies.open() as snap:
+        assert count(snap.conn) == 1
+    first = files(copies)
+    assert len(first) == 1
+    add(conn, 'Ben')
+    with copies.open() as snap:
+        assert count(snap.conn) == 1  # still the same copy
+    copies._current.taken_at -= 61
+    with copies.open() as snap:
+        assert count(snap.conn) == 2
+    assert files(copies) != first and len(files(copies)) == 1
+    assert copies.stats()['refreshes'] == 2
+
+
+def test_a_retired_copy_is_removed_by_its_last_reader(conn, copies):
+    old = copies.open()
+    copies._current.taken_at -= 61
+    with copies.open():
+        assert len(files(copies)) == 2  # the old copy is still being read
+    assert count(old.conn) == 0
+    old.close()
+    assert len(files(copies)) == 1
+    copies.close()
+    assert files(copies) == []
+
+
+def test_read_transaction(conn, db_path):
+    other = sqlite3.connect(db_path)
+    with snapshots.read_transaction(conn) as reading:
+        before = count(reading)
+        other.execute("INSERT INTO alumni (name, created_at) VALUES ('Ana', '')")
+        other.commit()
+        assert count(reading) == before
+        with snapshots.read_transaction(reading):
+            assert count(reading) == before
+    assert not conn.in_transaction
+    assert count(conn) == before + 1
+    other.close()
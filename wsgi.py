@@ -0,0 +1,11 @@
+"""WSGI entry point for both apps.
+
+    gunicorn -c gunicorn.conf.py               # community site
+    ALUMNI_APP=console gunicorn -c gunicorn.conf.py
+
+Importing this module migrates the app's database (``init_db``); with
+gunicorn's ``preload_app`` that happens once, in the master.
+"""
+from alumni_core.factory import create_app
+
+application = create_app()